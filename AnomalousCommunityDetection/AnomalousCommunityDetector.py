@@ -5,14 +5,48 @@ __email__ = 'lapidshay@gmail.com'
 # Imports
 ##################################
 
-from xgboost import XGBClassifier
+import os
+import shutil
+import time
+import warnings
+import tempfile
+import numpy as np
+from copy import copy
+from collections import Counter
+from math import ceil
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 from .BiPartiteCreator import BiPartiteCreator
 from .NetworkSampler import NetworkSampler
 from .FeatureExtractor import FeatureExtractor
 from .LinkPredictor import LinkPredictor
 from .MetaFeatureExtractor import MetaFeatureExtractor
+from .MetaFeatureAccumulator import MetaFeatureAccumulator
 from .MetaFeatureRanker import MetaFeatureRanker
-from .utils import checkpoint_paths, load_topological_features_df
+from .CommunityScreener import CommunityScreener
+from .ResourceManager import ResourceManager
+from .PipelineCache import PipelineCache, fingerprint
+from .PipelineMetrics import PipelineMetrics, max_rss
+from .StageProfiler import StageProfiler
+from .CostEstimator import calibrate, plan_within_time_budget
+from .lazy_imports import lazy_import
+from .utils import \
+	load_topological_features_df, save_topological_features_df, load_checkpoint_fingerprint, print_bipartite_properties, \
+	save_fitted_detector, load_fitted_detector, load_fitted_detector_train_df, incidence_arrays_to_partitions_map, \
+	save_delta_state, load_delta_state, literal_tuple_strings_to_tuples, save_features_checkpoint, \
+	load_features_checkpoint, geometric_sample_sizes
+
+pd = lazy_import('pandas')
+
+# rough footprint of an edge's topological features while extracted (features dict, DataFrame row and index)
+_FEATURES_BYTES_PER_EDGE = 4096
+
+# smallest training sample (positive edges) of an auto-sized training set - an eighth of the sampled edges, within
+# bounds, so that smaller train sets still have a learning curve - and the growth of the following samples
+_AUTO_SIZE_INITIAL_EDGES = 1000
+_AUTO_SIZE_MIN_INITIAL_EDGES = 50
+_AUTO_SIZE_INITIAL_FRACTION = 1 / 8
+_AUTO_SIZE_GROWTH = 2
 
 
 ##################################
@@ -22,19 +56,52 @@ from .utils import checkpoint_paths, load_topological_features_df
 class AnomalousCommunityDetector:
 	def __init__(
 			self,
-			train_partitions_map: dict, test_partitions_map: dict,
+			train_partitions_map: dict = None, test_partitions_map: dict = None,
 			community_partite_label: str = 'Community', vertex_partite_label: str = 'Vertex',
-			classifer_obj=XGBClassifier()):
+			classifer_obj=None,
+			n_jobs: int = None, max_threads: int = None,
+			metrics_callbacks: list = None, trace_memory: bool = False, profile: str = None,
+			memory_budget: int = None, scratch_dir_path: str = None, features: list = None):
 		"""
 		Parameters
 		----------
-		train_partitions_map: dict, Train set partition map indicating each community's belonging vertices.
-		test_partitions_map: dict, Test set partition map indicating each community's belonging vertices.
+		train_partitions_map: optional; default None (given to fit instead).
+			dict, Train set partition map indicating each community's belonging vertices.
+		test_partitions_map: optional; default None (given to score instead).
+			dict, Test set partition map indicating each community's belonging vertices.
 		community_partite_label: optional; default 'Community'.
 			string, community-representing-vertices partite's attribute value.
 		vertex_partite_label: optional; default 'Vertex'.
 			string, regular vertices partite's attribute value.
-		classifer_obj: an instantiated classifier object, with fit, predict and predict_proba methods.
+		classifer_obj: optional; default None (a new XGBClassifier(), per detector).
+			an instantiated classifier object, with fit, predict and predict_proba methods.
+		n_jobs: optional; default None (1 worker).
+			int, number of concurrent pipeline workers. -1 means one worker per available core.
+			With more than 1 worker, the test branch (BiPartite network, edge sampling and topological features)
+			runs in a worker process, concurrently with the train branch and the classifier's training.
+		max_threads: optional; default None (all available cores).
+			int, total number of threads the pipeline (classifier and native libraries included) may occupy.
+		metrics_callbacks: optional; default None.
+			list of functions, each called with a stage's metrics record (a dict, see PipelineMetrics) as soon as
+			the stage ends - e.g. to push the metrics to a monitoring system.
+		trace_memory: optional; default False.
+			bool, whether to measure each stage's peak Python allocations with tracemalloc (slows the pipeline).
+		profile: optional; default None (no profiling).
+			string, a directory to write a profile of each pipeline stage to - cProfile statistics ('.pstats') and
+			sampled call stacks in collapsed format ('.collapsed'), see StageProfiler.
+		memory_budget: optional; default None (in-memory execution).
+			int, number of bytes the pipeline's peak RSS should stay under, for networks larger than memory:
+			- test topological features are extracted in chunks (sized by the budget), each spilled to the scratch
+				directory, and prediction and meta-features extraction stream over the chunks,
+			- once the classifier is fitted, the train-side state is saved to the scratch directory and dropped from
+				memory - its incidence arrays are memory-mapped, as of a loaded detector (see load),
+			- test branches run in this process, not in worker processes.
+			A warning is issued if the peak RSS exceeds the budget.
+		scratch_dir_path: optional; default None (a temporary directory).
+			string, a directory for the spilled state of a memory-budgeted pipeline.
+		features: optional; default None (all features).
+			list, the edges' topological features to extract (see FeatureExtractor). May be picked to fit within a
+			time budget (see detect_anomalous_communities).
 		"""
 
 		self._train_partitions_map = train_partitions_map
@@ -43,7 +110,14 @@ class AnomalousCommunityDetector:
 		self._community_partite_label = community_partite_label
 		self._vertex_partite_label = vertex_partite_label
 
-		self._link_predictor = LinkPredictor(classifer_obj)
+		# xgboost is slow to import, so it is only imported for a default classifier
+		if classifer_obj is None:
+			from xgboost import XGBClassifier
+			classifer_obj = XGBClassifier()
+
+		self._resources = ResourceManager(n_jobs=n_jobs, max_threads=max_threads)
+		self._classifier_obj = classifer_obj
+		self._link_predictor = LinkPredictor(classifer_obj, n_jobs=n_jobs, max_threads=max_threads)
 
 		self._BPG_train = None
 		self._BPG_test = None
@@ -51,84 +125,613 @@ class AnomalousCommunityDetector:
 		self._test_topo_feat_df = None
 		self._sorted_ranked = None
 
+		# communities the link-prediction classifier was trained on, and a fingerprint of its training
+		self._train_communities = set()
+		self._model_fingerprint = None
+
+		# pipeline stages cache, and each stage's cache key
+		self._cache = None
+		self._stage_keys = {}
+
+		# metrics of the last run's stages
+		self._metrics = PipelineMetrics(
+			callbacks=metrics_callbacks, trace_memory=trace_memory,
+			profiler=StageProfiler(profile) if profile is not None else None)
+
+		# directory a fitted detector was loaded from, and its memory-mapped train-side incidence arrays
+		# (the train-side state is rebuilt from them only when needed)
+		self._saved_dir_path = None
+		self._train_incidence = None
+
+		# memory budget, scratch directory for spilled state, and the spilled test topological features chunks
+		self._memory_budget = memory_budget
+		self._scratch_dir_path = scratch_dir_path
+		self._test_feature_chunks = None
+
+		# topological features to extract, the features the classifier was trained on (the same, unless picked by a
+		# time budget), and the cost model's calibration (benchmarked when first needed)
+		self._features = features
+		self._fitted_features = features
+		self._calibration = None
+
+		# learning curve of the last auto-sized training set (see fit)
+		self._learning_curve = None
+
+	##################################
+	# Properties
+	##################################
+
+	@property
+	def community_partite_label(self):
+		return self._community_partite_label
+
+	@property
+	def vertex_partite_label(self):
+		return self._vertex_partite_label
+
+	@property
+	def learning_curve(self):
+		"""The learning curve of the last auto-sized training set - a DataFrame of edges and validation AUC."""
+		return pd.DataFrame(self._learning_curve) if self._learning_curve is not None else None
+
+	@property
+	def metrics(self):
+		"""Metrics records of the last run's stages (see PipelineMetrics)."""
+		return self._metrics.records
+
+	def cost_report(self, sort_by: str = 'total_time'):
+		"""
+		Returns the last run's costs attributed to communities, to find the communities dominating its runtime
+		(e.g. giant or highly overlapping communities, whose edges have large neighborhood products).
+
+		Parameters
+		----------
+		sort_by: Optional; default 'total_time'.
+			A string indicating the cost column to sort the communities by, descending.
+
+		Returns
+		---------
+		A DataFrame indexed by (branch, community), with columns:
+			- 'edges': number of the community's edges whose topological features were extracted,
+			- 'neighborhood_sizes': sum of these edges' vertices' neighborhood sizes,
+			- 'neighborhood_product' and 'max_neighborhood_product': sum and maximum of these edges' products of
+				neighborhood sizes (the number of vertex pairs the friends measure checks),
+			- 'features_time': seconds spent extracting the community's edges' topological features,
+			- 'scoring_time': seconds spent predicting and aggregating the community's edges (test branch only),
+				apportioned by the community's share of the edges since these stages are vectorized,
+			- 'total_time': features_time + scoring_time.
+		Topological features restored from the stages cache (or loaded from a checkpoint) have no costs, and costs of
+		same-named communities of several test sets (see score) are summed.
+		"""
+
+		cost_cols = [
+			'edges', 'neighborhood_sizes', 'neighborhood_product', 'max_neighborhood_product',
+			'features_time', 'scoring_time']
+		costs_df = self._metrics.community_costs_df().reindex(columns=cost_cols, fill_value=0).fillna(0)
+		costs_df[cost_cols[:4]] = costs_df[cost_cols[:4]].astype(int)
+		costs_df['total_time'] = costs_df['features_time'] + costs_df['scoring_time']
+
+		return costs_df.sort_values(by=sort_by, ascending=False)
+
 	##################################
 	# Utility methods
 	##################################
 
-	def _create_bi_partite_networks(self, verbose: bool):
-		"""Creates train and test BiPartite networks."""
+	def _stage_key(self, stage: str, *inputs):
+		"""
+		Computes (and records) a stage's cache key, the fingerprint of its inputs and upstream stages' keys.
 
-		# Create BiPartite network generators
-		BPG_train_generator = BiPartiteCreator(self._train_partitions_map)
-		BPG_test_generator = BiPartiteCreator(self._test_partitions_map)
+		Returns None if the pipeline is not cached.
+		"""
 
-		# Create train BiPartite network (nx.Graph() object)
-		self._BPG_train = BPG_train_generator.create_bipartite_graph(
-			list(self._train_partitions_map.keys()),
-			community_partite_label=self._community_partite_label,
-			vertex_partite_label=self._vertex_partite_label)
+		key = fingerprint(stage, *inputs) if self._cache is not None else None
+		self._stage_keys[stage] = key
+		return key
 
-		# Create test BiPartite network (nx.Graph() object)
-		self._BPG_test = BPG_test_generator.create_bipartite_graph(
-			list(self._test_partitions_map.keys()),
-			community_partite_label=self._community_partite_label,
-			vertex_partite_label=self._vertex_partite_label)
+	def _cached(self, stage: str, compute, counts=None):
+		"""
+		Returns a stage's output from the cache if its key is cached, and otherwise computes it.
 
-		if verbose:
-			BPG_train_generator.print_properties(network='Train')
-			BPG_test_generator.print_properties(network='Test')
+		The stage is measured, and counts (an optional function of the stage's output, returning a dict) are
+		added to its metrics record.
+		"""
+
+		with self._metrics.stage(stage) as record:
+			if self._cache is None:
+				record['from_cache'] = False
+				output = compute()
+			else:
+				record['from_cache'] = self._cache.contains(stage, self._stage_keys[stage])
+				output = self._cache.get_or_compute(stage, self._stage_keys[stage], compute)
+
+			if counts is not None:
+				record.update(counts(output))
+
+		return output
 
-	def _sample_edges(self, max_edges_to_sample):
+	def _bipartite_counts(self, BPG):
+		num_communities = sum(
+			1 for _, partite in BPG.nodes(data='partite') if partite == self._community_partite_label)
+		return {
+			'communities': num_communities,
+			'vertices': BPG.number_of_nodes() - num_communities,
+			'edges': BPG.number_of_edges()}
+
+	def _create_bi_partite_network(self, partitions_map: dict, branch: str):
+		"""Creates a branch's (train or test) BiPartite network (nx.Graph() object)."""
+
+		self._stage_key(
+			f'{branch}_bipartite', partitions_map, self._community_partite_label, self._vertex_partite_label)
+		return self._cached(f'{branch}_bipartite', lambda: BiPartiteCreator(partitions_map).create_bipartite_graph(
+			list(partitions_map.keys()),
+			community_partite_label=self._community_partite_label,
+			vertex_partite_label=self._vertex_partite_label), counts=self._bipartite_counts)
+
+	def _sample_edges(self, BPG, branch: str, max_edges_to_sample):
 		"""
 		Samples positive and negative edges.
 
 		Samples positive and negative edges for train set, from train BiPartite network.
 		Samples only positive edges for test set, from test BiPartite network.
 
-		Return 3 lists corresponding to the above description.
+		Return 2 lists corresponding to the above description.
 		"""
 
 		# Create network edge sampler
 		sampler = NetworkSampler(self._community_partite_label, self._vertex_partite_label)
 
-		# Create train positive and negative edges lists
-		train_pos_edges, train_neg_edge = sampler.sample_network_edges(
-			G=self._BPG_train,
+		self._stage_key(f'{branch}_sampling', self._stage_keys[f'{branch}_bipartite'], max_edges_to_sample)
+		return self._cached(f'{branch}_sampling', lambda: sampler.sample_network_edges(
+			G=BPG,
 			max_edges=max_edges_to_sample,
-			generate_negative_edges=True)
+			generate_negative_edges=branch == 'train'),
+			counts=lambda edges: {'positive_edges': len(edges[0]), 'negative_edges': len(edges[1])})
 
-		# Create test positive edges list
-		test_pos_edges, _ = sampler.sample_network_edges(
-			G=self._BPG_test,
-			max_edges=max_edges_to_sample,
-			generate_negative_edges=False)
+	def _extract_topological_features(self, BPG, branch: str, pos_edges, neg_edges):
+		"""Extracts a branch's (train or test) topological features DataFrame."""
+
+		feat_extractor = FeatureExtractor(BPG, features=self._fitted_features)
+
+		def extract():
+			topo_feat_df = feat_extractor.create_topological_features_df(
+				positive_edges=pos_edges, negative_edges=neg_edges)
+			self._metrics.add_community_costs(branch, feat_extractor.get_vertex_costs_df())
+			return topo_feat_df
+
+		self._stage_key(f'{branch}_topological_features', self._stage_keys[f'{branch}_sampling'], self._fitted_features)
+		return self._cached(
+			f'{branch}_topological_features', extract,
+			counts=lambda topo_feat_df: {'edges': len(topo_feat_df), 'features': topo_feat_df.shape[1] - 1})
+
+	def _iter_growing_train_topological_features(self, BPG, pos_edges: list, neg_edges: list, sample_sizes: list):
+		"""
+		Yields topological features DataFrames of growing train samples - each sample's first sample_size positive and
+		negative edges. Only each sample's new edges are extracted.
+		"""
+
+		feat_extractor = FeatureExtractor(BPG, features=self._fitted_features)
+		topo_feat_df = None
+		extracted_size = 0
+
+		for sample_size in sample_sizes:
+			new_topo_feat_df = feat_extractor.create_topological_features_df(
+				positive_edges=pos_edges[extracted_size:sample_size], negative_edges=neg_edges[extracted_size:sample_size])
+			self._metrics.add_community_costs('train', feat_extractor.get_vertex_costs_df())
+
+			topo_feat_df = new_topo_feat_df if topo_feat_df is None else pd.concat([topo_feat_df, new_topo_feat_df])
+			extracted_size = sample_size
+			yield topo_feat_df
+
+	def _auto_size_train_topological_features(self, BPG, max_edges_to_sample, auto_size_tol, val_size, verbose):
+		"""
+		Extracts the topological features of a train sample sized by the classifier's learning curve.
 
-		return train_pos_edges, train_neg_edge, test_pos_edges
+		Samples grow geometrically (up to max_edges_to_sample, or all edges), and stop growing once the validation AUC
+		gain falls below auto_size_tol (see LinkPredictor.learning_curve), so edges beyond are never extracted.
+		A train set too small to grow (a single-point learning curve) is used whole, with a warning.
+		"""
+
+		def auto_size():
+			pos_edges, neg_edges = NetworkSampler(
+				self._community_partite_label, self._vertex_partite_label).sample_network_edges_in_random_order(
+				BPG, max_edges=max_edges_to_sample)
+			initial_size = min(
+				_AUTO_SIZE_INITIAL_EDGES, max(_AUTO_SIZE_MIN_INITIAL_EDGES, int(_AUTO_SIZE_INITIAL_FRACTION * len(pos_edges))))
+			sample_sizes = geometric_sample_sizes(len(pos_edges), initial_size=initial_size, growth=_AUTO_SIZE_GROWTH)
+
+			return self._link_predictor.learning_curve(
+				self._iter_growing_train_topological_features(BPG, pos_edges, neg_edges, sample_sizes),
+				label_col_name='edge_exist', tol=auto_size_tol, val_size=val_size, verbose=verbose)
+
+		# the auto-sized sample replaces the sampling and topological features stages
+		key = self._stage_key(
+			'train_auto_sizing', self._stage_keys['train_bipartite'], max_edges_to_sample, auto_size_tol, val_size,
+			self._fitted_features, self._classifier_obj, _AUTO_SIZE_INITIAL_EDGES, _AUTO_SIZE_MIN_INITIAL_EDGES,
+			_AUTO_SIZE_INITIAL_FRACTION, _AUTO_SIZE_GROWTH)
+		self._stage_keys['train_sampling'] = key
+		self._stage_keys['train_topological_features'] = key
+
+		topo_feat_df, self._learning_curve = self._cached('train_auto_sizing', auto_size, counts=lambda output: {
+			'edges': len(output[0]), 'features': output[0].shape[1] - 1, 'samples': len(output[1])})
+
+		if len(self._learning_curve) < 2:
+			warnings.warn(
+				f'The train sample ({len(topo_feat_df)} edges) is too small to auto-size - its learning curve has a '
+				f'single point, so auto_size_tol has no effect.')
 
-	def _extract_topological_features(self, train_pos_edges, train_neg_edge, test_pos_edges, save, save_dir_path):
-		train_feat_extractor = FeatureExtractor(self._BPG_train)
-		test_feat_extractor = FeatureExtractor(self._BPG_test)
+		return topo_feat_df
 
-		train_path, test_path = checkpoint_paths(dir_path=save_dir_path, save=save)
+	def _run_branch(
+			self, branch: str, max_edges_to_sample, verbose, auto_size_tol: float = None, val_size: float = 0.1,
+			partitions_map: dict = None):
+		"""
+		Runs a branch (train or test) of the pipeline up to the classifier - constructs its BiPartite network,
+		samples its edges and extracts their topological features.
+		If auto_size_tol is given, the train sample is sized by the classifier's learning curve.
+		If partitions_map is given (e.g. the shortlisted test communities), it replaces the branch's map.
+
+		The branches are independent of each other, so this may run in a worker process.
+		Returns the BiPartite network, the topological features DataFrame and the branch's stages' cache keys.
+		"""
+
+		if partitions_map is None:
+			partitions_map = self._train_partitions_map if branch == 'train' else self._test_partitions_map
+
+		# Create BiPartite network (nx.Graph() object)
+		BPG = self._create_bi_partite_network(partitions_map, branch)
+		if verbose:
+			print_bipartite_properties(BPG=BPG, network=branch.capitalize())
 
-		self._train_topo_feat_df = train_feat_extractor.create_topological_features_df(
-			positive_edges=train_pos_edges, negative_edges=train_neg_edge, save=save, save_dir_path=train_path)
-		self._test_topo_feat_df = test_feat_extractor.create_topological_features_df(
-			positive_edges=test_pos_edges, negative_edges=[], save=save, save_dir_path=test_path)
+		# Sample edges and extract topological features of an auto-sized train sample
+		if branch == 'train' and auto_size_tol is not None:
+			topo_feat_df = self._auto_size_train_topological_features(
+				BPG, max_edges_to_sample, auto_size_tol, val_size, verbose)
+			branch_stage_keys = {stage: key for stage, key in self._stage_keys.items() if stage.startswith(branch)}
+			return BPG, topo_feat_df, branch_stage_keys
+
+		# Sample edges
+		pos_edges, neg_edges = self._sample_edges(BPG, branch, max_edges_to_sample=max_edges_to_sample)
+
+		# Extract topological features (spilled in chunks, and without keeping the network, if memory-budgeted)
+		if branch == 'test' and self._memory_budget is not None:
+			self._test_feature_chunks = self._spill_test_topological_features(BPG, pos_edges)
+			BPG, topo_feat_df = None, None
+		else:
+			topo_feat_df = self._extract_topological_features(BPG, branch, pos_edges, neg_edges)
+
+		branch_stage_keys = {stage: key for stage, key in self._stage_keys.items() if stage.startswith(branch)}
+		return BPG, topo_feat_df, branch_stage_keys
+
+	##################################
+	# Memory-budgeted execution
+	##################################
+
+	def _get_scratch_dir_path(self):
+		if self._scratch_dir_path is None:
+			self._scratch_dir_path = tempfile.mkdtemp(prefix='anomalous_community_detection_')
+		os.makedirs(self._scratch_dir_path, exist_ok=True)
+		return self._scratch_dir_path
+
+	def _features_chunk_size(self):
+		"""Returns the number of edges whose topological features are held at once (a quarter of the budget)."""
+		return max(1, self._memory_budget // (4 * _FEATURES_BYTES_PER_EDGE))
+
+	def _drop_test_feature_chunks(self):
+		if self._test_feature_chunks:
+			shutil.rmtree(os.path.dirname(self._test_feature_chunks[0]), ignore_errors=True)
+		self._test_feature_chunks = None
+
+	def _spill_test_topological_features(self, BPG, pos_edges):
+		"""
+		Extracts the test topological features in chunks, each spilled to a binary checkpoint in a new directory
+		under the scratch directory. Returns the chunks' file paths.
+		"""
+
+		self._drop_test_feature_chunks()
+		chunks_dir_path = tempfile.mkdtemp(prefix='test_topological_features_', dir=self._get_scratch_dir_path())
+		feat_extractor = FeatureExtractor(BPG, features=self._fitted_features)
+		pos_edges = list(pos_edges)
+		chunk_size = self._features_chunk_size()
+
+		with self._metrics.stage('test_topological_features') as record:
+			chunk_paths = []
+			for start in range(0, len(pos_edges), chunk_size):
+				chunk_df = feat_extractor.create_topological_features_df(
+					positive_edges=pos_edges[start:start + chunk_size], negative_edges=[])
+				chunk_paths.append(os.path.join(chunks_dir_path, f'{len(chunk_paths):05d}.npz'))
+				save_features_checkpoint(chunk_df, chunk_paths[-1])
+				self._metrics.add_community_costs('test', feat_extractor.get_vertex_costs_df())
+				record['features'] = chunk_df.shape[1] - 1
+
+			record.update({'from_cache': False, 'edges': len(pos_edges), 'chunks': len(chunk_paths)})
+
+		return chunk_paths
+
+	def _extract_meta_features_out_of_core(self, label_thresh):
+		"""Streams the spilled test topological features chunks through the classifier, accumulating meta-features."""
+
+		meta_feat_accumulator = MetaFeatureAccumulator(thresh=label_thresh)
+		community_edges = Counter()
+
+		with self._metrics.stage('meta_features') as record:
+			for chunk_path in self._test_feature_chunks:
+				chunk_df = load_features_checkpoint(chunk_path)
+				for edges, probs in self._link_predictor.iter_edges_existence_prob(chunk_df, chunk_size=len(chunk_df)):
+					communities = [comm for comm, _ in edges]
+					meta_feat_accumulator.update(communities, probs)
+					community_edges.update(communities)
+
+			meta_feats_df = meta_feat_accumulator.get_meta_features()
+			record.update({
+				'from_cache': False, 'edges': sum(community_edges.values()), 'communities': len(meta_feats_df),
+				'chunks': len(self._test_feature_chunks)})
+
+		self._metrics.apportion_stages_time(
+			'test', pd.Series(community_edges, dtype=int), stages=['meta_features'], time_col='scoring_time')
+		return meta_feats_df
+
+	def _spill_train_state(self):
+		"""
+		Saves the train-side state (train BiPartite network's communities, topological features) to the scratch
+		directory, and drops it from memory - it is rebuilt from the saved state only when needed, as of a loaded
+		detector.
+		"""
+
+		train_state_dir_path = os.path.join(self._get_scratch_dir_path(), 'train_state')
+		self.save(train_state_dir_path)
+		_, _, self._train_incidence = load_fitted_detector(train_state_dir_path)
+		self._saved_dir_path = train_state_dir_path
+
+		self._train_partitions_map = None
+		self._BPG_train = None
+		self._train_topo_feat_df = None
+		self._link_predictor.set_fitted_state(self._link_predictor.get_fitted_state())
+
+	def _plan_within_time_budget(self, time_budget: float, test_partitions_map: dict = None):
+		"""
+		Picks max_edges_to_sample and the features to extract (of the detector's features), so that the run's
+		estimated cost fits within the time budget (see CostEstimator.plan_within_time_budget).
+		The cost model's calibration, when first needed, is run within the budget, and the run is planned to fit
+		within the rest of it. Returns the picked max_edges_to_sample and features.
+		"""
+
+		with self._metrics.stage('planning') as record:
+			start_time = time.perf_counter()
+			if self._calibration is None:
+				self._calibration = calibrate(classifier_obj=self._classifier_obj)
+			calibration_time = time.perf_counter() - start_time
+
+			plan = plan_within_time_budget(
+				self._get_train_partitions_map(), test_partitions_map, time_budget=time_budget - calibration_time,
+				features=self._features, calibration=self._calibration)
+
+			record.update({
+				'calibration_time': calibration_time,
+				'max_edges_to_sample': plan['max_edges_to_sample'], 'features': len(plan['features']),
+				'estimated_time': plan['estimated_cost']['total_time'],
+				'estimated_peak_memory': plan['estimated_cost']['peak_memory']})
+
+		return plan['max_edges_to_sample'], plan['features']
+
+	def _check_memory_budget(self):
+		peak_rss = max_rss()
+		if self._memory_budget is not None and peak_rss is not None and peak_rss > self._memory_budget:
+			warnings.warn(f'Peak RSS ({peak_rss} bytes) exceeded the memory budget ({self._memory_budget} bytes).')
+
+	def _run_branch_in_worker(self, branch: str, max_edges_to_sample, verbose, partitions_map: dict = None):
+		"""Runs a branch in a worker process, and returns its outputs and its stages' metrics."""
+
+		self._metrics.reset()
+		return (*self._run_branch(branch, max_edges_to_sample, verbose, partitions_map=partitions_map), self._metrics)
+
+	def _screen_test_partitions_map(self, test_partitions_map: dict, screener, screening_fraction: float):
+		"""
+		Shortlists the most anomalous fraction of the test communities by their co-membership scores
+		(see CommunityScreener), for link-prediction scoring.
+
+		Returns the shortlisted communities' partitions map, and a list of the screened out communities.
+		"""
+
+		with self._metrics.stage('screening') as record:
+			shortlist = set(screener.shortlist(test_partitions_map, screening_fraction))
+			record.update({'communities': len(test_partitions_map), 'shortlisted': len(shortlist)})
+
+		return (
+			{comm: comm_vertices for comm, comm_vertices in test_partitions_map.items() if comm in shortlist},
+			[comm for comm in test_partitions_map if comm not in shortlist])
+
+	@staticmethod
+	def _add_screened_out_communities(sorted_ranked, screened_out: list):
+		"""
+		Adds the screened out communities to the top (the normal end) of each meta-feature's ranking,
+		with NaN scores.
+		"""
+
+		screened_out_df = pd.DataFrame({
+			col: screened_out if 'ranking' in col else np.full(len(screened_out), np.nan)
+			for col in sorted_ranked.columns})
+		return pd.concat([screened_out_df, sorted_ranked], ignore_index=True)
+
+	def _scoring_copy(self, keep_cache: bool):
+		"""
+		Returns a shallow copy of the fitted detector for scoring test sets, without the train-side state
+		(train BiPartite network and topological features), which scoring does not need.
+
+		The copy is cheap to send to worker processes, and scoring it leaves this detector's state intact.
+		"""
+
+		scorer = copy(self)
+		scorer._BPG_train = None
+		scorer._train_topo_feat_df = None
+		scorer._link_predictor = copy(self._link_predictor)
+		scorer._link_predictor._train_df = None
+		scorer._stage_keys = dict(self._stage_keys)
+		if not keep_cache:
+			scorer._cache = None
+		return scorer
+
+	def _test_map_meta_features(
+			self, test_partitions_map: dict, max_edges_to_sample, label_thresh, prob_chunk_size, verbose):
+		"""Runs the test branch of a single test set, and returns its communities' meta-features DataFrame."""
+
+		self._test_partitions_map = test_partitions_map
+
+		# Create test BiPartite network, sample edges and extract topological features
+		self._BPG_test, self._test_topo_feat_df, _ = self._run_branch('test', max_edges_to_sample, verbose)
+
+		# Extract meta-features extraction
+		return self._extract_meta_features(label_thresh=label_thresh, verbose=verbose, prob_chunk_size=prob_chunk_size)
+
+	def _score_test_map(
+			self, test_partitions_map: dict, max_edges_to_sample, label_thresh, prob_chunk_size, top_k, verbose,
+			screener=None, screening_fraction: float = None):
+		"""
+		Runs the test branch of a single test set, and returns its communities ranked by meta-features.
+		If a screener is given, only the shortlisted communities are scored.
+		"""
+
+		screened_out = []
+		if screener is not None:
+			test_partitions_map, screened_out = self._screen_test_partitions_map(
+				test_partitions_map, screener, screening_fraction)
+
+		meta_feats_df = self._test_map_meta_features(
+			test_partitions_map, max_edges_to_sample, label_thresh, prob_chunk_size, verbose)
+		self._drop_test_feature_chunks()
+
+		# Rank and sort meta-feature
+		self._rank_sort_meta_features(meta_feats_df, top_k=top_k, screened_out=screened_out)
+
+		return self._sorted_ranked
+
+	def _score_test_map_in_worker(self, test_partitions_map: dict, **score_test_map_kwargs):
+		"""Scores a single test set in a worker process, and returns its ranking and its stages' metrics."""
+
+		self._metrics.reset()
+		return self._score_test_map(test_partitions_map, **score_test_map_kwargs), self._metrics
+
+	def _get_train_partitions_map(self):
+		"""Returns the train partitions map, rebuilding it from the incidence arrays of a loaded detector."""
+
+		if self._train_partitions_map is None and self._train_incidence is not None:
+			self._train_partitions_map = incidence_arrays_to_partitions_map(**self._train_incidence)
+		return self._train_partitions_map
+
+	def _restore_train_state(self):
+		"""Rebuilds the train-side state of a loaded detector (train BiPartite network and topological features)."""
+
+		if self._BPG_train is not None or self._train_incidence is None:
+			return
+
+		self._BPG_train = self._create_bi_partite_network(self._get_train_partitions_map(), 'train')
+		self._train_topo_feat_df = load_fitted_detector_train_df(self._saved_dir_path)
+		self._link_predictor.set_fitted_state(
+			self._link_predictor.get_fitted_state(), train_df=self._train_topo_feat_df)
+
+	def _partitions_maps_fingerprint(self):
+		"""Returns a fingerprint of the train and test partition maps and partite labels."""
+		return fingerprint(
+			self._get_train_partitions_map(), self._test_partitions_map,
+			self._community_partite_label, self._vertex_partite_label)
 
 	def _fit_link_prediction_classifer(self, val_size, verbose):
-		self._link_predictor.fit(
-			train_df=self._train_topo_feat_df, label_col_name='edge_exist', val_size=val_size, verbose=verbose)
 
-	def _extract_meta_features(self, label_thresh, verbose):
-		edges_exist_prob_dict = self._link_predictor.get_edges_existence_prob(self._test_topo_feat_df, verbose=verbose)
-		meta_feat_extractor = MetaFeatureExtractor(edges_exist_prob_dict)
-		meta_feats_dict = meta_feat_extractor.get_comm_repr_vertices_meta_features(thresh=label_thresh)
-		return meta_feats_dict
+		def fit():
+			self._link_predictor.fit(
+				train_df=self._train_topo_feat_df, label_col_name='edge_exist', val_size=val_size, verbose=verbose)
+			return self._link_predictor.get_fitted_state()
+
+		# a cached fitted classifier is restored instead of training
+		self._stage_key('fit', self._stage_keys.get('train_topological_features'), self._classifier_obj, val_size)
+		fitted_state = self._cached('fit', fit, counts=lambda _: {'edges': len(self._train_topo_feat_df)})
+		self._link_predictor.set_fitted_state(fitted_state, train_df=self._train_topo_feat_df)
+
+		self._train_communities = set(self._train_partitions_map.keys())
+		self._model_fingerprint = fingerprint('model', self._train_topo_feat_df, self._classifier_obj, val_size)
+
+	def _add_train_communities(self, new_partitions_map: dict):
+		"""
+		Adds new communities to the train BiPartite network.
+
+		Returns the new community-representing vertices, and the already existing vertices which belong to them
+		(whose edges' topological features are affected by the new communities).
+		"""
+
+		# Create the new communities BiPartite network, and find vertices already in train BiPartite network
+		new_BPG = BiPartiteCreator(new_partitions_map).create_bipartite_graph(
+			list(new_partitions_map.keys()),
+			community_partite_label=self._community_partite_label,
+			vertex_partite_label=self._vertex_partite_label)
+		affected_vertices = [
+			vertex for vertex, partite in new_BPG.nodes(data='partite')
+			if partite == self._vertex_partite_label and vertex in self._BPG_train]
+
+		# Add new communities to train BiPartite network
+		self._BPG_train.add_nodes_from(new_BPG.nodes(data=True))
+		self._BPG_train.add_edges_from(new_BPG.edges())
+
+		return list(new_partitions_map.keys()), affected_vertices
+
+	def _extract_meta_features(self, label_thresh, verbose, prob_chunk_size=None):
+
+		# stream spilled test topological features chunks
+		if self._test_topo_feat_df is None and self._test_feature_chunks is not None:
+			return self._extract_meta_features_out_of_core(label_thresh)
+
+		# accumulate meta-features chunk by chunk, without holding all edges probabilities
+		if prob_chunk_size is not None:
+
+			def accumulate():
+				meta_feat_accumulator = MetaFeatureAccumulator(thresh=label_thresh)
+				for edges, probs in self._link_predictor.iter_edges_existence_prob(
+						self._test_topo_feat_df, chunk_size=prob_chunk_size):
+					meta_feat_accumulator.update([comm for comm, _ in edges], probs)
+				return meta_feat_accumulator.get_meta_features()
+
+			self._stage_key(
+				'meta_features', self._stage_keys.get('fit'), self._stage_keys.get('test_topological_features'),
+				label_thresh, prob_chunk_size)
+			meta_feats_df = self._cached('meta_features', accumulate, counts=lambda meta_feats_df: {
+				'edges': len(self._test_topo_feat_df), 'communities': len(meta_feats_df)})
 
-	def _rank_sort_meta_features(self, meta_feats_dict):
-		meta_feat_ranker = MetaFeatureRanker(meta_feats_dict)
-		self._sorted_ranked = meta_feat_ranker.rank_columns()
+			self._metrics.apportion_stages_time(
+				'test', self._test_community_edges(), stages=['meta_features'], time_col='scoring_time')
+			return meta_feats_df
+
+		def extract():
+			with self._resources.limit_native_threads():
+				meta_feat_extractor = MetaFeatureExtractor(edges_exist_prob_dict)
+				return meta_feat_extractor.get_comm_repr_vertices_meta_features(thresh=label_thresh)
+
+		self._stage_key('prediction', self._stage_keys.get('fit'), self._stage_keys.get('test_topological_features'))
+		edges_exist_prob_dict = self._cached('prediction', lambda: self._link_predictor.get_edges_existence_prob(
+			self._test_topo_feat_df, verbose=verbose), counts=lambda probs: {'edges': len(probs)})
+
+		self._stage_key('meta_features', self._stage_keys['prediction'], label_thresh)
+		meta_feats_df = self._cached('meta_features', extract, counts=lambda meta_feats_df: {
+			'edges': len(edges_exist_prob_dict), 'communities': len(meta_feats_df)})
+
+		self._metrics.apportion_stages_time(
+			'test', self._test_community_edges(), stages=['prediction', 'meta_features'], time_col='scoring_time')
+		return meta_feats_df
+
+	def _test_community_edges(self):
+		"""Returns the number of test edges of each community-representing vertex."""
+
+		edges = list(self._test_topo_feat_df.index)
+		if len(edges) > 0 and type(edges[0]) == str:
+			edges = literal_tuple_strings_to_tuples(edges)
+		return pd.Series([comm for comm, _ in edges], dtype=object).value_counts(sort=False)
+
+	def _rank_sort_meta_features(self, meta_feats_df, top_k=None, screened_out: list = None):
+		with self._metrics.stage('ranking') as record:
+			meta_feat_ranker = MetaFeatureRanker(meta_feats_df)
+			self._sorted_ranked = meta_feat_ranker.rank_columns(top_k=top_k)
+			record['communities'] = len(meta_feats_df)
+
+			# screened out communities are least anomalous, so never among the top_k
+			if screened_out and top_k is None:
+				self._sorted_ranked = self._add_screened_out_communities(self._sorted_ranked, screened_out)
 
 	##################################
 	# Main methods
@@ -137,10 +740,17 @@ class AnomalousCommunityDetector:
 	def detect_anomalous_communities(
 			self,
 			max_edges_to_sample: int = None,
-			label_thresh: float = 0.5,
+			label_thresh=0.5,
 			val_size: float = 0.1,
 			save_topological_features: bool = False,
 			save_dir_path: str = None,
+			prob_chunk_size: int = None,
+			top_k: int = None,
+			cache_dir_path: str = None,
+			return_metrics: bool = False,
+			time_budget: float = None,
+			auto_size_tol: float = None,
+			screening_fraction: float = None,
 			verbose: bool = False):
 		"""
 		Performs the following steps:
@@ -153,46 +763,455 @@ class AnomalousCommunityDetector:
 		----------
 		max_edges_to_sample: Int; default None.
 			maximal number of edges to sample from train BiPartite network.
-		label_thresh: Float; default 0.5.
+		label_thresh: Float, or a list of floats; default 0.5.
 			A float to determine the classification threshold of the label-based meta-features.
+			Given a list, label-based meta-features are extracted and ranked for each of the thresholds.
 		val_size: Optional; default 0.1
 			A float to determine train/validation split for the link-prediction classifier evaluation.
 		save_topological_features:
 		save_dir_path:
+		prob_chunk_size: Optional; default None (all edges at once).
+			An int to determine the number of test edges to predict at a time. If given, meta-features are
+			accumulated chunk by chunk in bounded memory, and the median meta-feature is approximate.
+		top_k: Optional; default None (all communities).
+			An int to determine the number of most anomalous communities to return per meta-feature.
+		cache_dir_path: Optional; default None (no caching).
+			A string indicating a directory to cache each stage's output in (bipartite networks, sampled edges,
+			topological features, fitted classifier, predictions and meta-features), under a fingerprint of the
+			stage's inputs and parameters. Stages whose inputs are unchanged are loaded instead of recomputed.
+		return_metrics: Optional; default False.
+			A boolean to determine whether to also return the stages' metrics records (see metrics).
+		time_budget: Optional; default None (no budget).
+			A float to determine the number of seconds the run should fit within. If given, max_edges_to_sample
+			(overriding the argument) and the features to extract are picked by the cost model, calibrated by a small
+			local benchmark on first use (see CostEstimator), which counts against the budget. The picked features
+			are the run's only - the detector's features are kept for later runs.
+		auto_size_tol: Optional; default None (train on max_edges_to_sample edges).
+			A float to determine the minimal validation AUC gain of growing the train sample. If given, the train
+			sample grows geometrically (up to max_edges_to_sample) until the classifier's validation AUC plateaus,
+			and only the edges of the samples tried are extracted (see learning_curve).
+		screening_fraction: Optional; default None (all test communities are scored).
+			A float in (0, 1] to determine the fraction of test communities to score. If given, the test communities
+			are first screened by a cheap vectorized co-membership score (see CommunityScreener), and only the most
+			anomalous fraction of them goes through link-prediction scoring. Screened out communities are ranked
+			first (least anomalous), with NaN scores.
 		verbose: Optional; default=False
 			A boolean to determine whether to print some properties and progress.
 
 		Returns
 		---------
-		A DataFrame of community-representing vertices, ranked by meta-features.
+		A DataFrame of community-representing vertices, ranked by meta-features
+		(and a list of the stages' metrics records, if return_metrics).
 		"""
 
-		# Create train and test BiPartite networks (nx.Graph() objects)
-		self._create_bi_partite_networks(verbose=verbose)
+		if self._get_train_partitions_map() is None or self._test_partitions_map is None:
+			raise ValueError('Train and test partitions maps must be given. Use fit and score otherwise.')
+		if save_topological_features and self._memory_budget is not None:
+			raise ValueError('Topological features of a memory-budgeted pipeline are not held, and can not be saved.')
 
-		# Sample edges
-		train_pos_edges, train_neg_edge, test_pos_edges = self._sample_edges(max_edges_to_sample=max_edges_to_sample)
+		self._cache = PipelineCache(cache_dir_path) if cache_dir_path is not None else None
+		self._stage_keys = {}
+		self._metrics.reset()
+
+		# Shortlist test communities to score, by a cheap screening
+		test_partitions_map, screened_out = self._test_partitions_map, []
+		if screening_fraction is not None:
+			test_partitions_map, screened_out = self._screen_test_partitions_map(
+				self._test_partitions_map, CommunityScreener(self._get_train_partitions_map()), screening_fraction)
+
+		# the run's features are picked by the time budget, if given (the detector's features are kept)
+		self._fitted_features = self._features
+		if time_budget is not None:
+			max_edges_to_sample, self._fitted_features = self._plan_within_time_budget(time_budget, test_partitions_map)
 
-		# Extract topological features
-		self._extract_topological_features(
-			train_pos_edges, train_neg_edge, test_pos_edges, save_topological_features, save_dir_path)
+		# Run the test branch in a worker process, concurrently with the train branch and the classifier's training,
+		# if the threads budget allows more than one worker (and the pipeline is not memory-budgeted)
+		test_branch_executor = None
+		if self._resources.n_jobs > 1 and self._memory_budget is None:
+			test_branch_executor = ProcessPoolExecutor(max_workers=1, initializer=self._resources.worker_initializer)
+			test_branch = test_branch_executor.submit(
+				self._run_branch_in_worker, 'test', max_edges_to_sample, verbose, partitions_map=test_partitions_map)
+
+		# Create train BiPartite network, sample edges and extract topological features
+		self._BPG_train, self._train_topo_feat_df, _ = self._run_branch(
+			'train', max_edges_to_sample, verbose, auto_size_tol=auto_size_tol, val_size=val_size)
 
 		# Train Link-Prediction classifier
 		self._fit_link_prediction_classifer(val_size=val_size, verbose=verbose)
 
+		# Drop the train-side state before the test branch, if memory-budgeted
+		if self._memory_budget is not None:
+			self._spill_train_state()
+
+		# Create test BiPartite network, sample edges and extract topological features (or join the worker)
+		if test_branch_executor is not None:
+			with test_branch_executor:
+				self._BPG_test, self._test_topo_feat_df, test_stage_keys, test_metrics = test_branch.result()
+			self._stage_keys.update(test_stage_keys)
+			self._metrics.merge(test_metrics)
+		else:
+			self._BPG_test, self._test_topo_feat_df, _ = self._run_branch(
+				'test', max_edges_to_sample, verbose, partitions_map=test_partitions_map)
+
+		if save_topological_features:
+			save_topological_features_df(
+				self._train_topo_feat_df, self._test_topo_feat_df, dir_path=save_dir_path,
+				partitions_maps_fingerprint=self._partitions_maps_fingerprint())
+
 		# Extract meta-features extraction
-		meta_feats_dict = self._extract_meta_features(label_thresh=label_thresh, verbose=verbose)
+		meta_feats_df = self._extract_meta_features(
+			label_thresh=label_thresh, verbose=verbose, prob_chunk_size=prob_chunk_size)
 
 		# Rank and sort meta-feature
-		self._rank_sort_meta_features(meta_feats_dict)
+		self._rank_sort_meta_features(meta_feats_df, top_k=top_k, screened_out=screened_out)
+		self._check_memory_budget()
 
+		if return_metrics:
+			return self._sorted_ranked, self.metrics
+		return self._sorted_ranked
+
+	def fit(
+			self,
+			train_partitions_map: dict = None,
+			max_edges_to_sample: int = None,
+			val_size: float = 0.1,
+			cache_dir_path: str = None,
+			time_budget: float = None,
+			auto_size_tol: float = None,
+			verbose: bool = False):
+		"""
+		Builds the train-side state once - constructs the train bipartite network, extracts its topological features
+		and trains the link-prediction classifier - so that many test sets can be scored against it (see score).
+
+		Parameters
+		----------
+		train_partitions_map: Optional; default None (the map given at construction).
+			dict, Train set partition map indicating each community's belonging vertices.
+		max_edges_to_sample: Int; default None.
+			maximal number of edges to sample from train BiPartite network.
+		val_size: Optional; default 0.1
+			A float to determine train/validation split for the link-prediction classifier evaluation.
+		cache_dir_path: Optional; default None (no caching).
+			A string indicating a directory to cache each stage's output in (see detect_anomalous_communities).
+		time_budget: Optional; default None (no budget).
+			A float to determine the number of seconds fitting should fit within - max_edges_to_sample and the
+			features are picked by the cost model (see detect_anomalous_communities). The picked features are also
+			extracted from the scored test sets.
+		auto_size_tol: Optional; default None (train on max_edges_to_sample edges).
+			A float to determine the minimal validation AUC gain of growing the train sample, sized by the
+			classifier's learning curve (see detect_anomalous_communities).
+		verbose: Optional; default=False
+			A boolean to determine whether to print some properties and progress.
+
+		Returns
+		---------
+		The fitted detector.
+		"""
+
+		if train_partitions_map is not None:
+			self._train_partitions_map = train_partitions_map
+		if self._get_train_partitions_map() is None:
+			raise ValueError('Train partitions map must be given.')
+
+		self._cache = PipelineCache(cache_dir_path) if cache_dir_path is not None else None
+		self._stage_keys = {}
+		self._metrics.reset()
+		self._BPG_test = None
+		self._test_topo_feat_df = None
+
+		# the fitted features are picked by the time budget, if given (the detector's features are kept)
+		self._fitted_features = self._features
+		if time_budget is not None:
+			max_edges_to_sample, self._fitted_features = self._plan_within_time_budget(time_budget)
+
+		# Create train BiPartite network, sample edges and extract topological features
+		self._BPG_train, self._train_topo_feat_df, _ = self._run_branch(
+			'train', max_edges_to_sample, verbose, auto_size_tol=auto_size_tol, val_size=val_size)
+
+		# Train Link-Prediction classifier
+		self._fit_link_prediction_classifer(val_size=val_size, verbose=verbose)
+
+		# Drop the train-side state, if memory-budgeted
+		if self._memory_budget is not None:
+			self._spill_train_state()
+		self._check_memory_budget()
+
+		return self
+
+	def score(
+			self,
+			test_partitions_maps: list,
+			max_edges_to_sample: int = None,
+			label_thresh=0.5,
+			prob_chunk_size: int = None,
+			top_k: int = None,
+			screening_fraction: float = None,
+			verbose: bool = False):
+		"""
+		Scores many test sets against the fitted detector, each in the same way as detect_anomalous_communities.
+
+		Must be called after fit (or detect_anomalous_communities). The train-side state is reused as is.
+		With more than 1 worker (n_jobs), the test sets are split into a batch per worker, and scored in parallel by
+		worker processes. Each worker receives the fitted detector once per batch, without the train-side state.
+		Parallel scoring does not use the stages cache.
+
+		Parameters
+		----------
+		test_partitions_maps: list of dicts, Test sets partition maps indicating each community's belonging vertices.
+		max_edges_to_sample: Int; default None.
+			maximal number of edges to sample from each test BiPartite network.
+		label_thresh: Float, or a list of floats; default 0.5.
+			A float to determine the classification threshold of the label-based meta-features.
+			Given a list, label-based meta-features are extracted and ranked for each of the thresholds.
+		prob_chunk_size: Optional; default None (all edges at once).
+			An int to determine the number of test edges to predict at a time (see detect_anomalous_communities).
+		top_k: Optional; default None (all communities).
+			An int to determine the number of most anomalous communities to return per meta-feature.
+		screening_fraction: Optional; default None (all test communities are scored).
+			A float in (0, 1] to determine the fraction of each test set's communities to score, shortlisted by a
+			cheap screening (see detect_anomalous_communities).
+		verbose: Optional; default=False
+			A boolean to determine whether to print some properties and progress.
+
+		Returns
+		---------
+		A list of DataFrames of community-representing vertices ranked by meta-features, one per test set
+		(in the order of test_partitions_maps).
+		"""
+
+		if not self._train_communities:
+			raise ValueError('Detector is not fitted yet. Call fit before scoring.')
+
+		# the screener is built once, and shared by all test sets
+		screener = CommunityScreener(self._get_train_partitions_map()) if screening_fraction is not None else None
+
+		score_test_map_kwargs = dict(
+			max_edges_to_sample=max_edges_to_sample, label_thresh=label_thresh,
+			prob_chunk_size=prob_chunk_size, top_k=top_k, verbose=verbose,
+			screener=screener, screening_fraction=screening_fraction)
+		self._metrics.reset()
+
+		# Score batches of test sets in worker processes (unless memory-budgeted)
+		num_workers = min(self._resources.n_jobs, len(test_partitions_maps))
+		if num_workers > 1 and self._memory_budget is None:
+			scorer = self._scoring_copy(keep_cache=False)
+			with ProcessPoolExecutor(max_workers=num_workers, initializer=self._resources.worker_initializer) as executor:
+				rankings_and_metrics = list(executor.map(
+					partial(scorer._score_test_map_in_worker, **score_test_map_kwargs),
+					test_partitions_maps,
+					chunksize=ceil(len(test_partitions_maps) / num_workers)))
+
+			for _, test_map_metrics in rankings_and_metrics:
+				self._metrics.merge(test_map_metrics)
+			return [ranking for ranking, _ in rankings_and_metrics]
+
+		scorer = self._scoring_copy(keep_cache=True)
+		rankings = [
+			scorer._score_test_map(test_partitions_map, **score_test_map_kwargs)
+			for test_partitions_map in test_partitions_maps]
+		self._check_memory_budget()
+		return rankings
+
+	def iter_progressive_top_k(
+			self,
+			test_partitions_map: dict = None,
+			top_k: int = 10,
+			batch_size: int = 1000,
+			max_edges_to_sample: int = None,
+			confidence: float = 0.95,
+			patience: int = None):
+		"""
+		Scores a test set progressively, yielding the current top_k most anomalous communities after each batch.
+
+		Test edges are featurized and predicted in batches drawn at random from all test communities, and each batch
+		updates the communities' running meta-features (see MetaFeatureAccumulator). Communities are ranked by
+		normality_prob_mean, estimated from their edges seen so far, with confidence bounds - so a long-running
+		detection can be stopped early (e.g. by breaking out of the iteration) once the head of the ranking settles.
+		Must be called after fit (or detect_anomalous_communities).
+
+		Parameters
+		----------
+		test_partitions_map: Optional; default None (the map given at construction).
+			dict, Test set partition map indicating each community's belonging vertices.
+		top_k: Optional; default 10. An int to determine the number of most anomalous communities to yield.
+		batch_size: Optional; default 1000. An int to determine the number of test edges scored per batch.
+		max_edges_to_sample: Int; default None.
+			maximal number of edges to sample from the test BiPartite network.
+		confidence: Optional; default 0.95. A float to determine the confidence level of the bounds.
+		patience: Optional; default None (score all batches).
+			An int to determine the number of consecutive batches the top_k communities must stay unchanged to stop
+			early. Scoring also stops early once the top_k communities are separated (see below).
+
+		Yields
+		-------
+		A dict per batch, holding:
+			- 'batch': the batch's number (from 1),
+			- 'edges' and 'total_edges': the number of test edges scored so far, and in total,
+			- 'top_k': a DataFrame of the top_k communities (of those seen so far), most anomalous first, with their
+				'normality_prob_mean__score', its 'lower_bound' and 'upper_bound', and 'edges' scored,
+			- 'separated': whether the top_k communities' upper bounds are all below the other communities' lower
+				bounds - i.e. the head of the ranking is settled at the confidence level.
+		"""
+
+		if not self._train_communities:
+			raise ValueError('Detector is not fitted yet. Call fit before scoring.')
+
+		test_partitions_map = test_partitions_map if test_partitions_map is not None else self._test_partitions_map
+
+		# Create test BiPartite network, and sample its edges in random order
+		BPG = BiPartiteCreator(test_partitions_map).create_bipartite_graph(
+			list(test_partitions_map.keys()),
+			community_partite_label=self._community_partite_label,
+			vertex_partite_label=self._vertex_partite_label)
+		edges, _ = NetworkSampler(
+			self._community_partite_label, self._vertex_partite_label).sample_network_edges_in_random_order(
+			BPG, max_edges=max_edges_to_sample, generate_negative_edges=False)
+
+		population_counts = Counter(comm for comm, _ in edges)
+		feat_extractor = FeatureExtractor(BPG, features=self._fitted_features)
+		meta_feat_accumulator = MetaFeatureAccumulator()
+		prev_head, unchanged_batches = None, 0
+
+		for batch_idx, start in enumerate(range(0, len(edges), batch_size), start=1):
+
+			# featurize and predict a batch, and update the running meta-features
+			with self._metrics.stage('progressive_batch') as record:
+				batch_topo_feat_df = feat_extractor.create_topological_features_df(
+					positive_edges=edges[start:start + batch_size], negative_edges=[])
+				self._metrics.add_community_costs('test', feat_extractor.get_vertex_costs_df())
+
+				for batch_edges, probs in self._link_predictor.iter_edges_existence_prob(
+						batch_topo_feat_df, chunk_size=len(batch_topo_feat_df)):
+					meta_feat_accumulator.update([comm for comm, _ in batch_edges], probs)
+				record['edges'] = len(batch_topo_feat_df)
+
+			# rank the communities seen so far, with confidence bounds of their mean probability
+			ranked_df = meta_feat_accumulator.get_mean_confidence_bounds(
+				confidence=confidence, population_counts=population_counts).sort_values(
+				'normality_prob_mean__score', kind='stable')
+
+			# the head is only settled once all communities were seen
+			head_df, rest_df = ranked_df.iloc[:top_k], ranked_df.iloc[top_k:]
+			separated = bool(
+				len(ranked_df) == len(population_counts) and
+				(len(rest_df) == 0 or head_df['upper_bound'].max() < rest_df['lower_bound'].min()))
+
+			yield {
+				'batch': batch_idx,
+				'edges': min(start + batch_size, len(edges)),
+				'total_edges': len(edges),
+				'top_k': head_df,
+				'separated': separated}
+
+			# stop once the head of the ranking settles
+			head = set(head_df.index)
+			unchanged_batches = unchanged_batches + 1 if head == prev_head else 0
+			prev_head = head
+			if patience is not None and (separated or unchanged_batches >= patience):
+				return
+
+	def update_train_partitions(
+			self,
+			new_train_partitions_map: dict,
+			max_edges_to_sample: int = None,
+			label_thresh=0.5,
+			val_size: float = 0.1,
+			verbose: bool = False):
+		"""
+		Updates the link-prediction classifier with new train communities, without training from scratch.
+
+		Must be called after detect_anomalous_communities or fit (or on a detector loaded with load).
+		Performs the following steps:
+			(1) Adds communities which the classifier was not trained on to the train BiPartite network.
+			(2) Extracts topological features of the new communities' edges (and of a same number of negative edges),
+				and of the existing edges whose vertices belong to the new communities (which were affected).
+			(3) Continues training the link-prediction classifier with these features only.
+			(4) Re-ranks the test set communities with the updated classifier, if the detector holds a test set
+				(of detect_anomalous_communities).
+
+		Communities already in the model are skipped, even if their vertices changed.
+
+		Parameters
+		----------
+		new_train_partitions_map: dict, partition map of new train set communities.
+		max_edges_to_sample: Int; default None.
+			maximal number of new communities' edges to sample.
+		label_thresh: Float, or a list of floats; default 0.5.
+			A float to determine the classification threshold of the label-based meta-features.
+			Given a list, label-based meta-features are extracted and ranked for each of the thresholds.
+		val_size: Optional; default 0.1
+			A float to determine train/validation split of the new data for the classifier evaluation.
+		verbose: Optional; default=False
+			A boolean to determine whether to print some properties and progress.
+
+		Returns
+		---------
+		A DataFrame of the test set's community-representing vertices, ranked by meta-features - or None, if the
+		detector holds no test set (fitted with fit, or loaded with load); score ranks test sets then.
+		"""
+
+		self._metrics.reset()
+		self._restore_train_state()
+		if not self._train_communities or self._BPG_train is None:
+			raise ValueError('Detector is not fitted yet. Call fit or detect_anomalous_communities before updating.')
+
+		has_test_set = self._test_topo_feat_df is not None or self._test_feature_chunks is not None
+
+		# Filter out communities the classifier was already trained on
+		new_partitions_map = {
+			comm: vertices for comm, vertices in new_train_partitions_map.items()
+			if comm not in self._train_communities}
+		if len(new_partitions_map) == 0:
+			return self._sorted_ranked if has_test_set else None
+
+		# Add new communities to train BiPartite network
+		new_comms, affected_vertices = self._add_train_communities(new_partitions_map)
+
+		# Sample new communities' positive and negative edges
+		sampler = NetworkSampler(self._community_partite_label, self._vertex_partite_label)
+		new_pos_edges, new_neg_edges = sampler.sample_network_edges(
+			G=self._BPG_train,
+			max_edges=max_edges_to_sample,
+			generate_negative_edges=True,
+			community_nodes=new_comms)
+
+		# Existing edges affected by the new communities (their vertices' neighborhoods changed)
+		affected_edges = {
+			(comm, vertex) for vertex in affected_vertices for comm in self._BPG_train.neighbors(vertex)
+			if comm in self._train_communities}
+
+		# Extract topological features of new and affected edges only
+		with self._metrics.stage('update_topological_features') as record:
+			feat_extractor = FeatureExtractor(self._BPG_train, features=self._fitted_features)
+			new_train_topo_feat_df = feat_extractor.create_topological_features_df(
+				positive_edges=list(new_pos_edges | affected_edges), negative_edges=new_neg_edges)
+			self._metrics.add_community_costs('train', feat_extractor.get_vertex_costs_df())
+			record.update({'edges': len(new_train_topo_feat_df), 'features': new_train_topo_feat_df.shape[1] - 1})
+
+		# Continue training Link-Prediction classifier (a new model, so downstream cache keys change)
+		with self._metrics.stage('update_fit') as record:
+			self._link_predictor.update(new_train_df=new_train_topo_feat_df, val_size=val_size, verbose=verbose)
+			record['edges'] = len(new_train_topo_feat_df)
+		self._stage_key('fit', self._stage_keys.get('fit'), new_train_topo_feat_df)
+		self._train_partitions_map = {**self._train_partitions_map, **new_partitions_map}
+		self._train_communities |= set(new_comms)
+		self._model_fingerprint = fingerprint(self._model_fingerprint, new_train_topo_feat_df)
+
+		# Re-rank test set communities with the updated classifier
+		if not has_test_set:
+			return None
+
+		meta_feats_df = self._extract_meta_features(label_thresh=label_thresh, verbose=verbose)
+		self._rank_sort_meta_features(meta_feats_df)
 		return self._sorted_ranked
 
 	def detect_anomalous_communities_from_topological_features(
 			self,
 			dir_path: str = 'Checkpoint',
-			label_thresh: float = 0.5,
+			label_thresh=0.5,
 			val_size: float = 0.1,
+			prob_chunk_size: int = None,
+			top_k: int = None,
 			verbose: bool = False):
 		"""
 		skips the bipartite network constructions and topological features extraction.
@@ -204,10 +1223,16 @@ class AnomalousCommunityDetector:
 		----------
 		dir_path: String
 
-		label_thresh: Float; default 0.5.
+		label_thresh: Float, or a list of floats; default 0.5.
 			A float to determine the classification threshold of the label-based meta-features.
+			Given a list, label-based meta-features are extracted and ranked for each of the thresholds.
 		val_size: Optional; default 0.1
 			A float to determine train/validation split for the link-prediction classifier evaluation.
+		prob_chunk_size: Optional; default None (all edges at once).
+			An int to determine the number of test edges to predict at a time. If given, meta-features are
+			accumulated chunk by chunk in bounded memory, and the median meta-feature is approximate.
+		top_k: Optional; default None (all communities).
+			An int to determine the number of most anomalous communities to return per meta-feature.
 		verbose: Optional; default=False
 			A boolean to determine whether to print some properties and progress.
 
@@ -216,16 +1241,260 @@ class AnomalousCommunityDetector:
 		A DataFrame of community-representing vertices, sorted and ranked by the meta-features.
 		"""
 
+		# Warn if the checkpoint was extracted from other partition maps
+		checkpoint_fingerprint = load_checkpoint_fingerprint(dir_path=dir_path)
+		if checkpoint_fingerprint is not None and checkpoint_fingerprint != self._partitions_maps_fingerprint():
+			warnings.warn(
+				f'Topological features in "{dir_path}" were extracted from different partition maps than the '
+				f'detector\'s. The checkpoint is stale.')
+
 		# Load topological features DataFrames
-		self._train_topo_feat_df, self._test_topo_feat_df = load_topological_features_df(dir_path=dir_path)
+		self._cache = None
+		self._stage_keys = {}
+		self._metrics.reset()
+		with self._metrics.stage('load_topological_features') as record:
+			self._train_topo_feat_df, self._test_topo_feat_df = load_topological_features_df(dir_path=dir_path)
+			record['edges'] = len(self._train_topo_feat_df) + len(self._test_topo_feat_df)
 
 		# Train Link-Prediction classifier
 		self._fit_link_prediction_classifer(val_size=val_size, verbose=verbose)
 
 		# Extract meta-features extraction
-		meta_feats_dict = self._extract_meta_features(label_thresh=label_thresh, verbose=verbose)
+		meta_feats_df = self._extract_meta_features(
+			label_thresh=label_thresh, verbose=verbose, prob_chunk_size=prob_chunk_size)
+
+		# Rank and sort meta-feature
+		self._rank_sort_meta_features(meta_feats_df, top_k=top_k)
+
+		return self._sorted_ranked
+
+	def save(self, dir_path: str):
+		"""
+		Saves the fitted detector to a directory, to be loaded (e.g. by scoring worker processes) with load.
+
+		The directory holds the configuration, the trained classifier, the train set communities and vertices
+		intern tables and their incidence arrays (memory-mapped on load), and the train topological features
+		(needed only to update the classifier with new train communities).
+
+		Parameters
+		----------
+		dir_path: A string indicating the directory path (created if it does not exist).
+		"""
+
+		if not self._train_communities:
+			raise ValueError('Detector is not fitted yet. Call fit before saving.')
+
+		train_partitions_map = {
+			comm: vertices for comm, vertices in self._get_train_partitions_map().items()
+			if comm in self._train_communities}
+
+		# the train topological features of a loaded detector are only read on update
+		train_df = self._link_predictor._train_df
+		if train_df is None and self._saved_dir_path is not None:
+			train_df = load_fitted_detector_train_df(self._saved_dir_path)
+
+		save_fitted_detector(
+			dir_path,
+			config={
+				'community_partite_label': self._community_partite_label,
+				'vertex_partite_label': self._vertex_partite_label,
+				'model_fingerprint': self._model_fingerprint,
+				'features': self._features},
+			model_state={
+				'classifier_obj': self._classifier_obj,
+				'fitted_features': self._fitted_features,
+				'fitted_state': self._link_predictor.get_fitted_state()},
+			train_partitions_map=train_partitions_map,
+			train_df=train_df)
+
+	@classmethod
+	def load(cls, dir_path: str, n_jobs: int = None, max_threads: int = None):
+		"""
+		Loads a fitted detector saved with save, ready to score test sets.
+
+		The train BiPartite network and topological features are not loaded - they are rebuilt from the
+		memory-mapped incidence arrays only if the detector is updated with new train communities.
+
+		Parameters
+		----------
+		dir_path: A string indicating the directory path.
+		n_jobs: optional; default None (1 worker).
+			int, number of concurrent pipeline workers of the loaded detector.
+		max_threads: optional; default None (all available cores).
+			int, total number of threads the loaded detector may occupy.
+
+		Returns
+		---------
+		A fitted AnomalousCommunityDetector.
+		"""
+
+		config, model_state, train_incidence = load_fitted_detector(dir_path)
+		model_fingerprint = config.pop('model_fingerprint', None)
+
+		detector = cls(classifer_obj=model_state['classifier_obj'], n_jobs=n_jobs, max_threads=max_threads, **config)
+		detector._link_predictor.set_fitted_state(model_state['fitted_state'])
+		detector._fitted_features = model_state.get('fitted_features', detector._features)
+		detector._train_communities = set(train_incidence['communities'])
+		detector._model_fingerprint = model_fingerprint
+		detector._saved_dir_path = dir_path
+		detector._train_incidence = train_incidence
+
+		return detector
+
+	def get_edges_existence_prob(self, BPG, edges: list, verbose: bool = False):
+		"""
+		Extracts topological features of given edges of a BiPartite network, and predicts their existence
+		probabilities with the fitted classifier.
+
+		Parameters
+		----------
+		BPG: A BiPartite network (nx.Graph() object), with the detector's partite labels.
+		edges: A list of distinct existing (community, vertex) edges of BPG.
+		verbose: Optional; default=False
+			A boolean to determine whether to print some properties and progress.
+
+		Returns
+		---------
+		A numpy array of the edges' existence probabilities, aligned to edges.
+		"""
+
+		if not self._train_communities:
+			raise ValueError('Detector is not fitted yet. Call fit before predicting.')
+
+		if len(edges) == 0:
+			return np.zeros(0)
+
+		topo_feat_df = FeatureExtractor(BPG, features=self._fitted_features).create_topological_features_df(
+			positive_edges=edges, negative_edges=[])
+		if verbose:
+			print(f'Predicting {len(topo_feat_df)} edges existence probabilities...')
+
+		# edges are predicted without a prediction summary, which is meaningless (and may be undefined) for a few
+		# existing edges
+		return np.concatenate([
+			probs for _, probs in self._link_predictor.iter_edges_existence_prob(
+				topo_feat_df, chunk_size=len(topo_feat_df))])
+
+	@staticmethod
+	def _changed_communities(prev_partitions_map: dict, partitions_map: dict):
+		"""
+		Returns the communities of partitions_map whose edges' topological features may differ from
+		prev_partitions_map's - new communities, and communities with a (current or former) vertex whose
+		memberships changed. The latter include communities whose member sets changed.
+		"""
+
+		def memberships(partitions_map):
+			vertex_comms = {}
+			for comm, vertices in partitions_map.items():
+				for vertex in vertices:
+					vertex_comms.setdefault(vertex, set()).add(comm)
+			return vertex_comms
+
+		prev_vertex_comms = memberships(prev_partitions_map)
+		vertex_comms = memberships(partitions_map)
+		changed_vertices = {
+			vertex for vertex in prev_vertex_comms.keys() | vertex_comms.keys()
+			if prev_vertex_comms.get(vertex) != vertex_comms.get(vertex)}
+
+		return [
+			comm for comm, vertices in partitions_map.items()
+			if comm not in prev_partitions_map
+			or not changed_vertices.isdisjoint(vertices)
+			or not changed_vertices.isdisjoint(prev_partitions_map[comm])]
+
+	def detect_anomalous_communities_delta(
+			self,
+			test_partitions_map: dict,
+			state_dir_path: str,
+			label_thresh=0.5,
+			top_k: int = None,
+			verbose: bool = False):
+		"""
+		Detects anomalous communities of a test set which changed slightly since a previous run, reusing the
+		previous run's results of unchanged communities.
+
+		Must be called after fit (or load). Compares the test set to the previous run's test set (saved in
+		state_dir_path), and finds the communities whose member sets, or whose vertices' memberships, changed.
+		Extracts topological features, predicts edges existence probabilities and extracts meta-features only for
+		these communities, merges the rest from the previous run, and ranks all communities. The run's state is
+		then saved to state_dir_path, for the next run.
+
+		All communities are scored if there is no previous state, or if the classifier changed since.
+		The shortest path feature of unchanged communities' edges is reused even if a farther change in their
+		connected component changed it.
+
+		Parameters
+		----------
+		test_partitions_map: dict, Test set partition map indicating each community's belonging vertices.
+		state_dir_path: A string indicating a directory holding the previous run's state (and the current one's,
+			after the run).
+		label_thresh: Float, or a list of floats; default 0.5.
+			A float to determine the classification threshold of the label-based meta-features.
+			Given a list, label-based meta-features are extracted and ranked for each of the thresholds.
+		top_k: Optional; default None (all communities).
+			An int to determine the number of most anomalous communities to return per meta-feature.
+		verbose: Optional; default=False
+			A boolean to determine whether to print some properties and progress.
+
+		Returns
+		---------
+		A DataFrame of community-representing vertices, ranked by meta-features.
+		"""
+
+		if not self._train_communities:
+			raise ValueError('Detector is not fitted yet. Call fit before detecting.')
+
+		self._metrics.reset()
+		state = {'model_fingerprint': self._model_fingerprint, 'label_thresh': repr(label_thresh)}
+
+		# Previous run's state, if it was made with the same classifier
+		prev_edge_probs, prev_meta_feats_df = {}, pd.DataFrame()
+		changed_comms = list(test_partitions_map.keys())
+		prev_run = load_delta_state(state_dir_path)
+		if prev_run is not None and prev_run[0]['model_fingerprint'] == self._model_fingerprint:
+			prev_state, prev_partitions_map, prev_edge_probs, prev_meta_feats_df = prev_run
+			changed_comms = self._changed_communities(prev_partitions_map, test_partitions_map)
+
+			# meta-features of another threshold are re-extracted from the previous probabilities
+			if prev_state['label_thresh'] != state['label_thresh']:
+				prev_meta_feats_df = pd.DataFrame()
+
+		if verbose:
+			print(f'{len(changed_comms)} of {len(test_partitions_map)} communities changed since the previous run.')
+
+		# Create test BiPartite network, and predict probabilities of the changed communities' edges only
+		self._test_partitions_map = test_partitions_map
+		self._BPG_test = self._create_bi_partite_network(test_partitions_map, 'test')
+		changed_edges = [(comm, vertex) for comm in changed_comms for vertex in self._BPG_test.neighbors(comm)]
+		with self._metrics.stage('delta_prediction') as record:
+			probs = self.get_edges_existence_prob(self._BPG_test, changed_edges, verbose=verbose)
+			record.update({'edges': len(changed_edges), 'communities': len(changed_comms)})
+
+		# Merge edges existence probabilities
+		edge_probs = {comm: {} for comm in changed_comms}
+		for (comm, vertex), prob in zip(changed_edges, probs):
+			edge_probs[comm][vertex] = prob
+		edge_probs.update({
+			comm: prev_edge_probs[comm] for comm in test_partitions_map.keys() if comm not in edge_probs})
+
+		# Extract meta-features of changed communities (or of all, if there are no reusable meta-features)
+		reusable_comms = set(prev_meta_feats_df.index) - set(changed_comms)
+		reused_comms = [comm for comm in test_partitions_map.keys() if comm in reusable_comms]
+		extracted_comms = [comm for comm in test_partitions_map.keys() if comm not in reusable_comms]
+
+		with self._metrics.stage('delta_meta_features') as record:
+			meta_feats_dfs = [prev_meta_feats_df.loc[reused_comms]] if len(reused_comms) > 0 else []
+			extracted_edge_probs = {
+				(comm, vertex): prob for comm in extracted_comms for vertex, prob in edge_probs[comm].items()}
+			if len(extracted_edge_probs) > 0:
+				meta_feats_dfs.append(MetaFeatureExtractor(
+					extracted_edge_probs).get_comm_repr_vertices_meta_features(thresh=label_thresh))
+			meta_feats_df = pd.concat(meta_feats_dfs) if len(meta_feats_dfs) > 0 else pd.DataFrame()
+			record.update({'edges': len(extracted_edge_probs), 'communities': len(extracted_comms)})
+
+		save_delta_state(state_dir_path, state, test_partitions_map, edge_probs, meta_feats_df)
 
 		# Rank and sort meta-feature
-		self._rank_sort_meta_features(meta_feats_dict)
+		self._rank_sort_meta_features(meta_feats_df, top_k=top_k)
 
 		return self._sorted_ranked
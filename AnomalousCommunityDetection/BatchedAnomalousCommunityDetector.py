@@ -0,0 +1,311 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import numpy as np
+from copy import deepcopy
+from .BiPartiteCreator import BiPartiteCreator
+from .NetworkSampler import NetworkSampler
+from .FeatureExtractor import FeatureExtractor
+from .LinkPredictor import LinkPredictor
+from .MetaFeatureExtractor import MetaFeatureExtractor
+from .MetaFeatureRanker import MetaFeatureRanker
+from .PipelineMetrics import PipelineMetrics
+from .lazy_imports import lazy_import
+from .utils import literal_tuple_strings_to_tuples
+
+pd = lazy_import('pandas')
+
+# separates a problem's namespace from its communities' and vertices' names, in the disjoint union
+_PROBLEM_SEP = '|'
+
+
+##################################
+# Batched Anomalous Community Detector
+##################################
+
+class BatchedAnomalousCommunityDetector:
+	"""
+	A class for detecting anomalous communities in many independent (train, test) problems at once.
+
+	The problems are packed into a disjoint union - a single train and a single test BiPartite network, whose
+	communities and vertices are namespaced per problem - so that each pipeline stage runs once for all
+	problems, instead of once per problem:
+		- edges are sampled per problem (negative edges never cross problems), from the union network,
+		- topological features of all problems' edges are extracted in a single sweep - each problem is a separate
+			component of the union, so its edges' features are the same as in its own network,
+		- a link-prediction classifier is trained per problem (or a single classifier shared by all problems),
+		- meta-features of all test communities are extracted at once, and are then split back per problem and ranked.
+
+	Attributes:
+		_problems: A dictionary of form {problem_id: (train_partitions_map, test_partitions_map)}.
+		_problem_ids: Each problem's namespace in the union (an opaque string, 'p' and the problem's position), so that
+			problem ids of any (hashable) type - e.g. tuples of an evaluation grid's parameters - are supported.
+		_namespace_problems: Each namespace's problem id.
+		_shared_model: Whether a single classifier is trained on all problems' train edges.
+		_link_predictors: A LinkPredictor per problem id (a single one under None, if the model is shared).
+		_metrics: Metrics of the last run's stages (see PipelineMetrics).
+	"""
+
+	def __init__(
+			self,
+			problems: dict,
+			community_partite_label: str = 'Community', vertex_partite_label: str = 'Vertex',
+			classifer_obj=None,
+			shared_model: bool = False,
+			features: list = None,
+			max_threads: int = None,
+			metrics_callbacks: list = None):
+		"""
+		Parameters
+		----------
+		problems: dict of form {problem_id: (train_partitions_map, test_partitions_map)}, the problems to detect
+			anomalous communities in (e.g. the experiments of an evaluation grid).
+		community_partite_label: optional; default 'Community'.
+			string, community-representing-vertices partite's attribute value.
+		vertex_partite_label: optional; default 'Vertex'.
+			string, regular vertices partite's attribute value.
+		classifer_obj: optional; default None (a new XGBClassifier()).
+			an instantiated classifier object, with fit, predict and predict_proba methods. Each problem's classifier
+			is a copy of it.
+		shared_model: optional; default False.
+			bool, whether to train a single classifier on all problems' train edges, instead of a classifier per
+			problem. Amortizes training, but each problem's ranking then also depends on the other problems.
+		features: optional; default None (all features).
+			list, the edges' topological features to extract (see FeatureExtractor).
+		max_threads: optional; default None (all available cores).
+			int, total number of threads the classifiers (and native libraries) may occupy.
+		metrics_callbacks: optional; default None.
+			list of functions, each called with a stage's metrics record (see PipelineMetrics).
+		"""
+
+		self._problems = problems
+		self._problem_ids = {problem_id: f'p{problem_idx}' for problem_idx, problem_id in enumerate(problems)}
+		self._namespace_problems = {namespace: problem_id for problem_id, namespace in self._problem_ids.items()}
+
+		self._community_partite_label = community_partite_label
+		self._vertex_partite_label = vertex_partite_label
+
+		# xgboost is slow to import, so it is only imported for a default classifier
+		if classifer_obj is None:
+			from xgboost import XGBClassifier
+			classifer_obj = XGBClassifier()
+
+		self._classifier_obj = classifer_obj
+		self._shared_model = shared_model
+		self._features = features
+		self._max_threads = max_threads
+		self._link_predictors = {}
+
+		self._metrics = PipelineMetrics(callbacks=metrics_callbacks)
+
+	##################################
+	# Properties
+	##################################
+
+	@property
+	def metrics(self):
+		"""Metrics records of the last run's stages (see PipelineMetrics)."""
+		return self._metrics.records
+
+	##################################
+	# Disjoint union
+	##################################
+
+	@staticmethod
+	def _namespaced(namespace: str, name):
+		return f'{namespace}{_PROBLEM_SEP}{name}'
+
+	def _union_partitions_map(self, branch: str):
+		"""
+		Returns the disjoint union of all problems' train (or test) partitions maps, with namespaced communities and
+		vertices, and a dictionary mapping each namespaced community to its problem id and original name.
+		"""
+
+		union_partitions_map = {}
+		communities = {}
+
+		for problem_id, (train_partitions_map, test_partitions_map) in self._problems.items():
+			namespace = self._problem_ids[problem_id]
+			partitions_map = train_partitions_map if branch == 'train' else test_partitions_map
+
+			for comm, comm_vertices in partitions_map.items():
+				namespaced_comm = self._namespaced(namespace, comm)
+				union_partitions_map[namespaced_comm] = [self._namespaced(namespace, vertex) for vertex in comm_vertices]
+				communities[namespaced_comm] = (problem_id, comm)
+
+		return union_partitions_map, communities
+
+	def _sample_edges(self, BPG, union_partitions_map: dict, communities: dict, branch: str, max_edges_to_sample):
+		"""
+		Samples each problem's positive (and, for the train branch, negative) edges from the union BiPartite network,
+		restricted to the problem's own vertices.
+		"""
+
+		# group the union's communities and vertices by problem
+		problems_communities = {problem_id: [] for problem_id in self._problems}
+		problems_vertices = {problem_id: set() for problem_id in self._problems}
+		for namespaced_comm, comm_vertices in union_partitions_map.items():
+			problem_id = communities[namespaced_comm][0]
+			problems_communities[problem_id].append(namespaced_comm)
+			problems_vertices[problem_id].update(comm_vertices)
+
+		sampler = NetworkSampler(self._community_partite_label, self._vertex_partite_label)
+		pos_edges, neg_edges = [], []
+		for problem_id in self._problems:
+			if len(problems_communities[problem_id]) == 0:
+				continue
+
+			problem_pos_edges, problem_neg_edges = sampler.sample_network_edges_among(
+				BPG, community_nodes=problems_communities[problem_id], vertex_nodes=list(problems_vertices[problem_id]),
+				max_edges=max_edges_to_sample, generate_negative_edges=branch == 'train')
+			pos_edges += list(problem_pos_edges)
+			neg_edges += problem_neg_edges
+
+		return pos_edges, neg_edges
+
+	def _run_branch(self, branch: str, max_edges_to_sample):
+		"""
+		Constructs a branch's (train or test) union BiPartite network, samples its edges and extracts their
+		topological features in a single sweep.
+
+		Returns the topological features DataFrame, a Series of the problem namespace of each of its rows, and a
+		dictionary mapping each namespaced community to its problem id and original name.
+		"""
+
+		with self._metrics.stage(f'{branch}_bipartite') as record:
+			union_partitions_map, communities = self._union_partitions_map(branch)
+			BPG = BiPartiteCreator(union_partitions_map).create_bipartite_graph(
+				list(union_partitions_map.keys()),
+				community_partite_label=self._community_partite_label,
+				vertex_partite_label=self._vertex_partite_label)
+			record.update({'problems': len(self._problems), 'communities': len(communities), 'edges': BPG.number_of_edges()})
+
+		with self._metrics.stage(f'{branch}_sampling') as record:
+			pos_edges, neg_edges = self._sample_edges(BPG, union_partitions_map, communities, branch, max_edges_to_sample)
+			record.update({'positive_edges': len(pos_edges), 'negative_edges': len(neg_edges)})
+
+		with self._metrics.stage(f'{branch}_topological_features') as record:
+			topo_feat_df = FeatureExtractor(BPG, features=self._features).create_topological_features_df(
+				positive_edges=pos_edges, negative_edges=neg_edges)
+			record.update({'edges': len(topo_feat_df), 'features': topo_feat_df.shape[1] - 1})
+
+		edges = literal_tuple_strings_to_tuples(topo_feat_df.index)
+		namespaces = pd.Series([self._problem_ids[communities[comm][0]] for comm, _ in edges])
+
+		return topo_feat_df, namespaces, communities
+
+	##################################
+	# Link prediction
+	##################################
+
+	def _new_link_predictor(self):
+		return LinkPredictor(deepcopy(self._classifier_obj), max_threads=self._max_threads)
+
+	def _fit_link_prediction_classifiers(self, train_topo_feat_df, namespaces, val_size: float):
+		"""Trains a classifier per problem, on the problem's rows (or a single classifier on all rows)."""
+
+		with self._metrics.stage('fit') as record:
+			self._link_predictors = {}
+
+			if self._shared_model:
+				self._link_predictors[None] = self._new_link_predictor()
+				self._link_predictors[None].fit(train_topo_feat_df, label_col_name='edge_exist', val_size=val_size)
+
+			else:
+				for namespace, rows in namespaces.groupby(namespaces, sort=False).indices.items():
+					problem_id = self._namespace_problems[namespace]
+					self._link_predictors[problem_id] = self._new_link_predictor()
+					self._link_predictors[problem_id].fit(
+						train_topo_feat_df.iloc[rows], label_col_name='edge_exist', val_size=val_size)
+
+			record.update({'edges': len(train_topo_feat_df), 'classifiers': len(self._link_predictors)})
+
+	def _predict(self, test_topo_feat_df, namespaces):
+		"""Returns a dictionary of form {(community, vertex): edge_existence_probability} of all problems' edges."""
+
+		with self._metrics.stage('prediction') as record:
+			if self._shared_model:
+				rows_by_predictor = {None: np.arange(len(test_topo_feat_df))}
+			else:
+				rows_by_predictor = {
+					self._namespace_problems[namespace]: rows
+					for namespace, rows in namespaces.groupby(namespaces, sort=False).indices.items()}
+
+			edges_exist_prob_dict = {}
+			for problem_id, rows in rows_by_predictor.items():
+				problem_topo_feat_df = test_topo_feat_df.iloc[rows]
+				for edges, probs in self._link_predictors[problem_id].iter_edges_existence_prob(
+						problem_topo_feat_df, chunk_size=len(problem_topo_feat_df)):
+					edges_exist_prob_dict.update(zip(edges, probs))
+
+			record['edges'] = len(edges_exist_prob_dict)
+
+		return edges_exist_prob_dict
+
+	##################################
+	# Main methods
+	##################################
+
+	def detect_anomalous_communities(
+			self,
+			max_edges_to_sample: int = None,
+			label_thresh=0.5,
+			val_size: float = 0.1,
+			top_k: int = None):
+		"""
+		Detects anomalous communities in all problems at once, in the same way as
+		AnomalousCommunityDetector.detect_anomalous_communities detects them in each.
+
+		Parameters
+		----------
+		max_edges_to_sample: Int; default None.
+			maximal number of edges to sample from each problem's train and test BiPartite networks.
+		label_thresh: Float, or a list of floats; default 0.5.
+			A float to determine the classification threshold of the label-based meta-features.
+		val_size: Optional; default 0.1
+			A float to determine train/validation split for the link-prediction classifiers evaluation.
+		top_k: Optional; default None (all communities).
+			An int to determine the number of most anomalous communities to return per meta-feature.
+
+		Returns
+		---------
+		A dictionary of form {problem_id: DataFrame of the problem's community-representing vertices ranked by
+		meta-features}, in the order of the problems.
+		"""
+
+		self._metrics.reset()
+
+		# Create union BiPartite networks, sample each problem's edges and extract all topological features at once
+		train_topo_feat_df, train_namespaces, _ = self._run_branch('train', max_edges_to_sample)
+		test_topo_feat_df, test_namespaces, test_communities = self._run_branch('test', max_edges_to_sample)
+
+		# Train Link-Prediction classifiers, and predict all test edges
+		self._fit_link_prediction_classifiers(train_topo_feat_df, train_namespaces, val_size)
+		edges_exist_prob_dict = self._predict(test_topo_feat_df, test_namespaces)
+
+		# Extract meta-features of all test communities at once
+		with self._metrics.stage('meta_features') as record:
+			meta_feats_df = MetaFeatureExtractor(edges_exist_prob_dict).get_comm_repr_vertices_meta_features(
+				thresh=label_thresh)
+			record['communities'] = len(meta_feats_df)
+
+		# Split meta-features back per problem (with the communities' original names), and rank
+		with self._metrics.stage('ranking') as record:
+			namespaces = pd.Series(
+				[self._problem_ids[test_communities[comm][0]] for comm in meta_feats_df.index], index=meta_feats_df.index)
+			problems_meta_feats_dfs = {}
+			for namespace, problem_meta_feats_df in meta_feats_df.groupby(namespaces, sort=False):
+				problem_meta_feats_df.index = pd.Index(
+					[test_communities[comm][1] for comm in problem_meta_feats_df.index], dtype=object)
+				problems_meta_feats_dfs[self._namespace_problems[namespace]] = problem_meta_feats_df
+
+			rankings = {
+				problem_id: MetaFeatureRanker(problems_meta_feats_dfs[problem_id]).rank_columns(top_k=top_k)
+				for problem_id in self._problems if problem_id in problems_meta_feats_dfs}
+			record.update({'problems': len(rankings), 'communities': len(meta_feats_df)})
+
+		return rankings
@@ -5,9 +5,11 @@ __email__ = 'lapidshay@gmail.com'
 # Imports
 ##################################
 
-import networkx as nx
 from copy import deepcopy
 from .utils import print_bipartite_properties
+from .lazy_imports import lazy_import
+
+nx = lazy_import('networkx')
 
 
 ##################################
@@ -0,0 +1,95 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+########################################
+# imports
+########################################
+
+import numpy as np
+from math import ceil
+from .utils import partitions_map_to_incidence_arrays
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+sparse = lazy_import('scipy.sparse')
+
+
+########################################
+# Community Screener
+########################################
+
+class CommunityScreener:
+	"""
+	A class for cheaply screening test communities before link-prediction scoring.
+
+	A community's co-membership score is the average number of train communities shared by a pair of its vertices.
+	Members of normal communities tend to belong to the same train communities, while anomalous communities gather
+	vertices which rarely appear together - so the lower the score, the more anomalous the community.
+
+	Scores of all test communities are computed at once, as sparse products of the communities-vertices incidence
+	matrices: for a test community c, X[c, t] is the number of c's vertices in train community t, and the number of
+	(ordered) vertex pairs sharing t is X[c, t] * (X[c, t] - 1).
+
+	Attributes:
+		_vertex_codes: An index of the train vertices, each vertex's position is its column in the incidence matrix.
+		_train_incidence: The train communities-vertices incidence matrix (sparse, CSR).
+	"""
+
+	def __init__(self, train_partitions_map: dict):
+		"""
+		Parameters
+		----------
+		train_partitions_map: dict, Train set partition map indicating each community's belonging vertices.
+		"""
+
+		communities, vertices, indptr, indices = partitions_map_to_incidence_arrays(train_partitions_map)
+		self._vertex_codes = pd.Index(vertices)
+		self._train_incidence = sparse.csr_matrix(
+			(np.ones(len(indices), dtype=np.float64), indices, indptr), shape=(len(communities), len(vertices)))
+
+	def comembership_scores(self, test_partitions_map: dict):
+		"""
+		Returns a Series of the co-membership score of each test community (see CommunityScreener).
+		Vertices which are not in any train community share no train communities.
+		"""
+
+		communities = list(test_partitions_map.keys())
+		sizes = np.array([len(comm_vertices) for comm_vertices in test_partitions_map.values()], dtype=np.float64)
+
+		# test communities-vertices incidence matrix, of the train vertices only
+		codes = self._vertex_codes.get_indexer(
+			[vertex for comm_vertices in test_partitions_map.values() for vertex in comm_vertices])
+		rows = np.repeat(np.arange(len(communities)), sizes.astype(np.int64))
+		known = codes >= 0
+		test_incidence = sparse.csr_matrix(
+			(np.ones(known.sum(), dtype=np.float64), (rows[known], codes[known])),
+			shape=(len(communities), len(self._vertex_codes)))
+
+		# number of vertex pairs of each test community sharing each train community, summed
+		shared = test_incidence @ self._train_incidence.T
+		shared.data = shared.data * (shared.data - 1)
+		shared_pairs = np.asarray(shared.sum(axis=1)).ravel()
+
+		# communities of a single vertex have no pairs
+		num_pairs = sizes * (sizes - 1)
+		scores = np.divide(shared_pairs, num_pairs, out=np.zeros_like(shared_pairs), where=num_pairs > 0)
+
+		return pd.Series(scores, index=pd.Index(communities, dtype=object), name='comembership_score')
+
+	def shortlist(self, test_partitions_map: dict, fraction: float):
+		"""
+		Returns the most anomalous (lowest co-membership scored) fraction of the test communities, at least one,
+		in order of their scores.
+
+		Parameters
+		----------
+		test_partitions_map: dict, Test set partition map indicating each community's belonging vertices.
+		fraction: A float in (0, 1] to determine the fraction of test communities to shortlist.
+		"""
+
+		if not 0 < fraction <= 1:
+			raise ValueError(f'Argument \'fraction\' must be in (0, 1], got {fraction}.')
+
+		scores = self.comembership_scores(test_partitions_map)
+		num_shortlisted = min(len(scores), max(1, ceil(fraction * len(scores))))
+		return scores.sort_values(kind='stable').index[:num_shortlisted].tolist()
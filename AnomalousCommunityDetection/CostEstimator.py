@@ -0,0 +1,388 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import time
+import random
+import warnings
+import tracemalloc
+import numpy as np
+from copy import deepcopy
+from .BiPartiteCreator import BiPartiteCreator
+from .NetworkSampler import NetworkSampler
+from .FeatureExtractor import FeatureExtractor, TOPOLOGICAL_FEATURES
+from .LinkPredictor import LinkPredictor
+from .MetaFeatureExtractor import MetaFeatureExtractor
+from .utils import partitions_map_to_incidence_arrays
+
+# features whose cost is calibrated separately (all other features are derived from the vertices' degrees)
+_EXPENSIVE_FEATURES = ['friends_measure', 'shortest_path']
+
+# fractions of the benchmark's edges the classifier is timed on, and the number of timings of each
+_FIT_SIZE_FRACTIONS = [0.25, 0.5, 0.75, 1.0, 2.0, 4.0]
+_FIT_REPEATS = 3
+
+# calibration of this process with the default classifier (see get_calibration)
+_calibration = None
+
+
+##################################
+# Partition Map Statistics
+##################################
+
+def partitions_map_statistics(partitions_map: dict):
+	"""
+	Returns cheap statistics of a partitions map, which determine the pipeline's cost.
+
+	Returns
+	-------
+	A dict of:
+		- 'communities', 'vertices' and 'edges' (memberships, the BiPartite network's edges),
+		- 'community_size_mean' and 'community_size_second_moment',
+		- 'vertex_degree_mean' and 'vertex_degree_second_moment' (number of communities each vertex belongs to),
+		- 'overlap': the fraction of vertices which belong to more than one community,
+		- 'positive_product_mean': mean product of an existing edge's vertices' neighborhood sizes (without the edge),
+		- 'negative_product_mean': expected product of a random non-existing edge's vertices' neighborhood sizes.
+	"""
+
+	communities, vertices, indptr, indices = partitions_map_to_incidence_arrays(partitions_map)
+	sizes = np.diff(indptr)
+	degrees = np.bincount(indices, minlength=len(vertices))
+
+	if len(indices) == 0:
+		return {
+			'communities': len(communities), 'vertices': 0, 'edges': 0,
+			'community_size_mean': 0.0, 'community_size_second_moment': 0.0,
+			'vertex_degree_mean': 0.0, 'vertex_degree_second_moment': 0.0,
+			'overlap': 0.0, 'positive_product_mean': 0.0, 'negative_product_mean': 0.0}
+
+	# neighborhood sizes of each edge's community and vertex
+	edge_community_sizes = np.repeat(sizes, sizes)
+	edge_vertex_degrees = degrees[indices]
+
+	return {
+		'communities': len(communities),
+		'vertices': len(vertices),
+		'edges': len(indices),
+		'community_size_mean': float(sizes.mean()),
+		'community_size_second_moment': float((sizes ** 2).mean()),
+		'vertex_degree_mean': float(degrees.mean()),
+		'vertex_degree_second_moment': float((degrees ** 2).mean()),
+		'overlap': float((degrees > 1).mean()),
+		'positive_product_mean': float(((edge_community_sizes - 1) * (edge_vertex_degrees - 1)).mean()),
+		'negative_product_mean': float(sizes.mean() * degrees.mean()),
+	}
+
+
+##################################
+# Calibration
+##################################
+
+def _benchmark_partitions_map(num_communities: int, num_vertices: int, seed: int):
+	"""Returns a random partitions map of overlapping communities, of varying sizes."""
+
+	rand = random.Random(seed)
+	return {
+		f'comm{comm_idx}': [f'v{vertex}' for vertex in rand.sample(range(num_vertices), rand.randint(5, 40))]
+		for comm_idx in range(num_communities)}
+
+
+def _linear_fit(sizes: list, seconds: list):
+	"""
+	Returns the (non-negative) intercept and slope of seconds as a linear function of sizes.
+	Sizes may repeat - each size's seconds are reduced to their median, which is robust to outlying timings.
+	"""
+
+	sizes, seconds = np.asarray(sizes, dtype=float), np.asarray(seconds, dtype=float)
+	unique_sizes = np.unique(sizes)
+	median_seconds = [np.median(seconds[sizes == size]) for size in unique_sizes]
+
+	slope, intercept = np.polyfit(unique_sizes, median_seconds, deg=1)
+	return max(float(intercept), 0.0), max(float(slope), 0.0)
+
+
+def _edge_seconds(BPG, pos_edges: list, neg_edges: list, features: list):
+	"""Extracts the given features of the edges, and returns each edge's seconds."""
+
+	feat_extractor = FeatureExtractor(BPG, features=features)
+	feat_extractor.create_topological_features_df(positive_edges=pos_edges, negative_edges=neg_edges)
+	return feat_extractor.get_edge_costs_df()
+
+
+def calibrate(classifier_obj=None, num_communities: int = 40, num_vertices: int = 400, seed: int = 0):
+	"""
+	Runs a small local benchmark of the pipeline's stages, and fits the cost model's coefficients to this machine.
+
+	Parameters
+	----------
+	classifier_obj: Optional; default None (XGBClassifier()).
+		An instantiated classifier object, whose training and prediction are benchmarked (on a copy).
+	num_communities: Optional; default 40. Number of communities of the benchmark's partitions map.
+	num_vertices: Optional; default 400. Number of vertices of the benchmark's partitions map.
+	seed: Optional; default 0. Random seed of the benchmark's partitions map.
+
+	Returns
+	-------
+	A dict of coefficients:
+		- 'graph_seconds_per_edge' and 'graph_bytes_per_edge': BiPartite network construction,
+		- 'features_seconds_per_edge': extraction of an edge's degree-derived features,
+		- 'friends_measure_seconds_per_product': friends measure, per pair of the edge's neighborhoods product,
+		- 'shortest_path_seconds_per_edge': shortest path of an edge,
+		- 'features_bytes_per_edge': peak memory of an edge's features while extracted,
+		- 'fit_seconds' and 'fit_seconds_per_edge': classifier training (with validation), intercept and slope,
+		- 'scoring_seconds' and 'scoring_seconds_per_edge': prediction and meta-features, intercept and slope.
+	"""
+
+	partitions_map = _benchmark_partitions_map(num_communities, num_vertices, seed)
+	communities = list(partitions_map.keys())
+
+	# BiPartite network construction
+	start_time = time.perf_counter()
+	BPG = BiPartiteCreator(partitions_map).create_bipartite_graph(communities, 'Community', 'Vertex')
+	graph_seconds = time.perf_counter() - start_time
+
+	tracemalloc.start()
+	BiPartiteCreator(partitions_map).create_bipartite_graph(communities, 'Community', 'Vertex')
+	graph_bytes = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	pos_edges, neg_edges = NetworkSampler('Community', 'Vertex').sample_network_edges(
+		G=BPG, generate_negative_edges=True)
+	pos_edges = list(pos_edges)
+	num_edges = len(pos_edges) + len(neg_edges)
+
+	# features - degree-derived features only, then each expensive feature's extra seconds (edge by edge)
+	base_features = [feature for feature in TOPOLOGICAL_FEATURES if feature not in _EXPENSIVE_FEATURES]
+	base_costs_df = _edge_seconds(BPG, pos_edges, neg_edges, base_features)
+	friends_costs_df = _edge_seconds(BPG, pos_edges, neg_edges, base_features + ['friends_measure'])
+	shortest_path_costs_df = _edge_seconds(BPG, pos_edges, neg_edges, base_features + ['shortest_path'])
+
+	products = base_costs_df['neighborhood_product'].to_numpy(dtype=float)
+	friends_seconds = friends_costs_df['features_time'].to_numpy() - base_costs_df['features_time'].to_numpy()
+	shortest_path_seconds = shortest_path_costs_df['features_time'] - base_costs_df['features_time']
+
+	# features memory
+	tracemalloc.start()
+	features_df = FeatureExtractor(BPG).create_topological_features_df(positive_edges=pos_edges, negative_edges=neg_edges)
+	features_bytes = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+
+	# classifier training and scoring, timed repeatedly on samples of several sizes (resampling the edges beyond
+	# their number), so that the per-edge slopes are not fitted to a couple of noisy timings
+	if classifier_obj is None:
+		from xgboost import XGBClassifier
+		classifier_obj = XGBClassifier()
+	sizes, fit_seconds, scoring_seconds = [], [], []
+
+	# an untimed warm-up fit, so that the classifier library's one-off initialization is not timed
+	LinkPredictor(deepcopy(classifier_obj)).fit(train_df=features_df, label_col_name='edge_exist')
+
+	for size_idx, fraction in enumerate(_FIT_SIZE_FRACTIONS):
+		size = int(fraction * num_edges)
+		for repeat in range(_FIT_REPEATS):
+			sample_df = features_df.sample(
+				n=size, replace=size > num_edges, random_state=seed + size_idx * _FIT_REPEATS + repeat)
+			link_predictor = LinkPredictor(deepcopy(classifier_obj))
+
+			start_time = time.perf_counter()
+			link_predictor.fit(train_df=sample_df, label_col_name='edge_exist')
+			fit_seconds.append(time.perf_counter() - start_time)
+
+			start_time = time.perf_counter()
+			pos_sample_df = sample_df[sample_df['edge_exist'] == 1]
+			edges_exist_prob_dict = {}
+			for edges, probs in link_predictor.iter_edges_existence_prob(pos_sample_df, chunk_size=len(pos_sample_df)):
+				edges_exist_prob_dict.update(zip(edges, probs))
+			MetaFeatureExtractor(edges_exist_prob_dict).get_comm_repr_vertices_meta_features(thresh=0.5)
+			scoring_seconds.append(time.perf_counter() - start_time)
+			sizes.append(size)
+
+	fit_intercept, fit_slope = _linear_fit(sizes, fit_seconds)
+	scoring_intercept, scoring_slope = _linear_fit(sizes, scoring_seconds)
+
+	return {
+		'graph_seconds_per_edge': graph_seconds / BPG.number_of_edges(),
+		'graph_bytes_per_edge': graph_bytes / BPG.number_of_edges(),
+		'features_seconds_per_edge': float(base_costs_df['features_time'].mean()),
+		'friends_measure_seconds_per_product': max(float(products @ friends_seconds / (products @ products)), 0.0),
+		'shortest_path_seconds_per_edge': max(float(shortest_path_seconds.mean()), 0.0),
+		'features_bytes_per_edge': features_bytes / num_edges,
+		'fit_seconds': fit_intercept,
+		'fit_seconds_per_edge': fit_slope,
+		'scoring_seconds': scoring_intercept,
+		'scoring_seconds_per_edge': scoring_slope,
+	}
+
+
+def get_calibration():
+	"""Returns the calibration of this process with the default classifier (calibrated on first call)."""
+
+	global _calibration
+	if _calibration is None:
+		_calibration = calibrate()
+	return _calibration
+
+
+##################################
+# Cost Estimation
+##################################
+
+def _features_seconds_per_edge(calibration: dict, features: list, product_mean: float):
+	seconds = calibration['features_seconds_per_edge']
+	if 'friends_measure' in features:
+		seconds += calibration['friends_measure_seconds_per_product'] * product_mean
+	if 'shortest_path' in features:
+		seconds += calibration['shortest_path_seconds_per_edge']
+	return seconds
+
+
+def _estimate_cost(train_stats: dict, test_stats: dict, max_edges_to_sample, features: list, calibration: dict):
+	"""Estimates the pipeline's cost from its partitions maps' statistics."""
+
+	def sampled_edges(stats):
+		return stats['edges'] if max_edges_to_sample is None else min(max_edges_to_sample, stats['edges'])
+
+	train_edges = sampled_edges(train_stats)
+	test_edges = sampled_edges(test_stats) if test_stats is not None else 0
+
+	# train set has a negative edge per positive edge, test set positive edges only
+	features_time = train_edges * (
+		_features_seconds_per_edge(calibration, features, train_stats['positive_product_mean']) +
+		_features_seconds_per_edge(calibration, features, train_stats['negative_product_mean']))
+	if test_stats is not None:
+		features_time += test_edges * _features_seconds_per_edge(
+			calibration, features, test_stats['positive_product_mean'])
+
+	network_edges = train_stats['edges'] + (test_stats['edges'] if test_stats is not None else 0)
+	graph_time = network_edges * calibration['graph_seconds_per_edge']
+	fit_time = calibration['fit_seconds'] + 2 * train_edges * calibration['fit_seconds_per_edge']
+	scoring_time = 0.0
+	if test_stats is not None:
+		scoring_time = calibration['scoring_seconds'] + test_edges * calibration['scoring_seconds_per_edge']
+
+	return {
+		'train_edges': train_edges,
+		'test_edges': test_edges,
+		'graph_time': graph_time,
+		'features_time': features_time,
+		'fit_time': fit_time,
+		'scoring_time': scoring_time,
+		'total_time': graph_time + features_time + fit_time + scoring_time,
+		'peak_memory': (
+			network_edges * calibration['graph_bytes_per_edge'] +
+			(2 * train_edges + test_edges) * calibration['features_bytes_per_edge']),
+	}
+
+
+def estimate_cost(train_partitions_map: dict, test_partitions_map: dict = None, config: dict = None, calibration: dict = None):
+	"""
+	Predicts the runtime and peak memory of a (single-worker, in-memory) pipeline run, before running it,
+	from cheap statistics of the partitions maps (see partitions_map_statistics).
+
+	Each edge's features cost is linear in its vertices' neighborhoods product (friends measure) - so the
+	estimate uses the maps' mean neighborhood products of existing and random non-existing edges.
+
+	Parameters
+	----------
+	train_partitions_map: dict, Train set partition map indicating each community's belonging vertices.
+	test_partitions_map: Optional; default None (train-side only, as of fit).
+		dict, Test set partition map indicating each community's belonging vertices.
+	config: Optional; default None (all edges and features).
+		A dict of the run's configuration - 'max_edges_to_sample' and 'features' (see AnomalousCommunityDetector).
+	calibration: Optional; default None (calibrated once per process, see get_calibration).
+		A dict returned by calibrate.
+
+	Returns
+	-------
+	A dict of the sampled 'train_edges' and 'test_edges', the estimated seconds of each part of the pipeline -
+	'graph_time', 'features_time', 'fit_time' and 'scoring_time' - and their 'total_time', and the estimated
+	'peak_memory' (bytes, on top of the interpreter's baseline).
+	"""
+
+	config = config if config is not None else {}
+	features = config.get('features') or TOPOLOGICAL_FEATURES
+	calibration = calibration if calibration is not None else get_calibration()
+
+	return _estimate_cost(
+		partitions_map_statistics(train_partitions_map),
+		partitions_map_statistics(test_partitions_map) if test_partitions_map is not None else None,
+		config.get('max_edges_to_sample'), features, calibration)
+
+
+def plan_within_time_budget(
+		train_partitions_map: dict,
+		test_partitions_map: dict = None,
+		time_budget: float = None,
+		features: list = None,
+		min_edges_to_sample: int = 1000,
+		calibration: dict = None):
+	"""
+	Picks max_edges_to_sample and the features, so that the estimated runtime fits within a time budget.
+
+	All edges are kept if they fit. Otherwise, the largest max_edges_to_sample (no smaller than
+	min_edges_to_sample) which fits is picked. If even min_edges_to_sample does not fit, the most expensive
+	of friends_measure and shortest_path is dropped (then the other), and the search is repeated.
+
+	Parameters
+	----------
+	train_partitions_map: dict, Train set partition map indicating each community's belonging vertices.
+	test_partitions_map: Optional; default None (train-side only, as of fit).
+		dict, Test set partition map indicating each community's belonging vertices.
+	time_budget: A float to determine the number of seconds the pipeline should fit within.
+	features: Optional; default None (all features). A list of the topological features to pick from.
+	min_edges_to_sample: Optional; default 1000.
+		An int to determine the smallest max_edges_to_sample to pick before dropping features.
+	calibration: Optional; default None (calibrated once per process, see get_calibration).
+		A dict returned by calibrate.
+
+	Returns
+	-------
+	A dict of the picked 'max_edges_to_sample' (None means all edges) and 'features', and the run's
+	'estimated_cost' (see estimate_cost).
+	"""
+
+	calibration = calibration if calibration is not None else get_calibration()
+	train_stats = partitions_map_statistics(train_partitions_map)
+	test_stats = partitions_map_statistics(test_partitions_map) if test_partitions_map is not None else None
+
+	def estimate(max_edges, candidate_features):
+		return _estimate_cost(train_stats, test_stats, max_edges, candidate_features, calibration)
+
+	# candidate features, dropping the most expensive feature first
+	candidate_features = [feature for feature in TOPOLOGICAL_FEATURES if features is None or feature in features]
+	product_mean = train_stats['positive_product_mean']
+	expensive_features = sorted(
+		[feature for feature in _EXPENSIVE_FEATURES if feature in candidate_features],
+		key=lambda feature: -(
+			calibration['friends_measure_seconds_per_product'] * product_mean if feature == 'friends_measure'
+			else calibration['shortest_path_seconds_per_edge']))
+
+	max_network_edges = max(train_stats['edges'], test_stats['edges'] if test_stats is not None else 0)
+	min_edges = min(min_edges_to_sample, max_network_edges)
+
+	for num_dropped in range(len(expensive_features) + 1):
+		plan_features = [feature for feature in candidate_features if feature not in expensive_features[:num_dropped]]
+
+		# all edges fit
+		cost = estimate(None, plan_features)
+		if cost['total_time'] <= time_budget:
+			return {'max_edges_to_sample': None, 'features': plan_features, 'estimated_cost': cost}
+
+		# largest max_edges_to_sample which fits (the cost is increasing in it)
+		if estimate(min_edges, plan_features)['total_time'] <= time_budget:
+			low, high = min_edges, max_network_edges
+			while low < high:
+				mid = (low + high + 1) // 2
+				if estimate(mid, plan_features)['total_time'] <= time_budget:
+					low = mid
+				else:
+					high = mid - 1
+			return {'max_edges_to_sample': low, 'features': plan_features, 'estimated_cost': estimate(low, plan_features)}
+
+	warnings.warn(
+		f'No configuration is estimated to fit within the time budget ({time_budget} seconds). '
+		f'The cheapest configuration was picked.')
+	return {'max_edges_to_sample': min_edges, 'features': plan_features, 'estimated_cost': estimate(min_edges, plan_features)}
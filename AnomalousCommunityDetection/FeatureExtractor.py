@@ -5,10 +5,19 @@ __email__ = 'lapidshay@gmail.com'
 # imports
 ########################################
 
-import networkx as nx
-from tqdm.autonotebook import tqdm
-import pandas as pd
+import time
 from itertools import product
+from .utils import save_features_checkpoint
+from .lazy_imports import lazy_import
+
+nx = lazy_import('networkx')
+pd = lazy_import('pandas')
+
+
+# edge topological features, in order of their columns
+TOPOLOGICAL_FEATURES = [
+	'total_friends', 'preferential_attachment_score', 'friends_measure', 'shortest_path',
+	'vertex_1_degree', 'vertex_2_degree']
 
 
 ########################################
@@ -16,8 +25,22 @@ from itertools import product
 ########################################
 
 class FeatureExtractor:
-	def __init__(self, g):
+	def __init__(self, g, features: list = None):
+		"""
+		Parameters
+		----------
+		g: The network (nx.Graph object) to extract edges' topological features from.
+		features: Optional; default None (all features).
+			A list of the topological features to extract (see TOPOLOGICAL_FEATURES). The expensive features -
+			friends_measure and shortest_path - are only computed if selected.
+		"""
+
 		self._g = g
+		self._features = [
+			feature for feature in TOPOLOGICAL_FEATURES if features is None or feature in features]
+
+		# cost of each edge of the last extraction - (first vertex, neighborhoods sizes, neighborhoods product, seconds)
+		self._edge_costs = []
 
 	########################################
 	# edge topological features
@@ -70,16 +93,20 @@ class FeatureExtractor:
 		preferential_attachment_score = u_deg * v_deg
 
 		# friends measure
-		friends_measure = self._friends_measure(u_neighborhood, v_neighborhood)
+		friends_measure = None
+		if 'friends_measure' in self._features:
+			friends_measure = self._friends_measure(u_neighborhood, v_neighborhood)
 
 		# join vertices' neighborhoods
 		total_friends = len(u_neighborhood | v_neighborhood)
 
 		# shortest path
-		if nx.has_path(self._g, u, v):
-			shortest_path = len(nx.shortest_path(self._g, u, v)) - 1
-		else:
-			shortest_path = -1
+		shortest_path = None
+		if 'shortest_path' in self._features:
+			if nx.has_path(self._g, u, v):
+				shortest_path = len(nx.shortest_path(self._g, u, v)) - 1
+			else:
+				shortest_path = -1
 
 		# instantiate a dictionary to contain edge topological features
 		output_dict = {
@@ -112,21 +139,72 @@ class FeatureExtractor:
 		:return: a dictionary.
 		"""
 
+		from tqdm.autonotebook import tqdm
+
 		output = {}
+		self._edge_costs = []
 		print('\nExtracting positive edges features...\n')
 		for (u, v) in tqdm(pos_edges):
-			edge_dict = self._get_edge_topological_features(u, v)
+			edge_dict = self._get_timed_edge_topological_features(u, v)
 			edge_dict.update({'edge_exist': 1})
 			output[f'({u}, {v})'] = edge_dict
 
 		print('\nExtracting negative edges features...\n')
 		for (u, v) in tqdm(neg_edges):
-			edge_dict = self._get_edge_topological_features(u, v)
+			edge_dict = self._get_timed_edge_topological_features(u, v)
 			edge_dict.update({'edge_exist': 0})
 			output[f'({u}, {v})'] = edge_dict
 
 		return output
 
+	def _get_timed_edge_topological_features(self, u, v):
+		"""Returns edge (u, v) topological features, and records the edge's cost."""
+
+		start_time = time.perf_counter()
+		edge_dict = self._get_edge_topological_features(u, v)
+		elapsed_time = time.perf_counter() - start_time
+
+		# friends measure iterates over the product of the neighborhoods
+		self._edge_costs.append((
+			u,
+			edge_dict['vertex_1_degree'] + edge_dict['vertex_2_degree'],
+			edge_dict['preferential_attachment_score'],
+			elapsed_time))
+
+		return {feature: edge_dict[feature] for feature in self._features}
+
+	########################################
+	# extraction costs
+	########################################
+
+	def get_edge_costs_df(self):
+		"""
+		Returns the cost of each edge of the last extraction, as a DataFrame (in extraction order) with columns
+		'vertex' (the edge's first vertex), 'neighborhood_sizes', 'neighborhood_product' and 'features_time'
+		(see get_vertex_costs_df).
+		"""
+
+		return pd.DataFrame(
+			self._edge_costs, columns=['vertex', 'neighborhood_sizes', 'neighborhood_product', 'features_time'])
+
+	def get_vertex_costs_df(self):
+		"""
+		Returns the cost of the last extraction, attributed to the first vertex of each edge (for sampled BiPartite
+		edges - the community-representing vertex), as a DataFrame indexed by vertex with columns:
+			- 'edges': number of edges whose features were extracted,
+			- 'neighborhood_sizes': sum of the edges' vertices' neighborhood sizes,
+			- 'neighborhood_product' and 'max_neighborhood_product': sum and maximum of the edges' products of
+				neighborhood sizes (the number of pairs the friends measure checks),
+			- 'features_time': seconds spent extracting the edges' features.
+		"""
+
+		return self.get_edge_costs_df().groupby('vertex', sort=False).agg(
+			edges=('features_time', 'size'),
+			neighborhood_sizes=('neighborhood_sizes', 'sum'),
+			neighborhood_product=('neighborhood_product', 'sum'),
+			max_neighborhood_product=('neighborhood_product', 'max'),
+			features_time=('features_time', 'sum'))
+
 	########################################
 	# create train and test sets of edges' topological features
 	########################################
@@ -150,6 +228,6 @@ class FeatureExtractor:
 		edges_df = pd.DataFrame.from_dict(edges_dict, orient='index')
 
 		if save:
-			edges_df.to_csv(save_dir_path, index=True, encoding='UTF-8')
+			save_features_checkpoint(edges_df, save_dir_path)
 
 		return edges_df
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 __author__ = 'Shay Lapid'
 __email__ = 'lapidshay@gmail.com'
 
@@ -5,9 +7,21 @@ __email__ = 'lapidshay@gmail.com'
 # imports
 ########################################
 
-import pandas as pd
+import numpy as np
+from copy import deepcopy
+from .ResourceManager import ResourceManager
 from .utils import \
-	model_validation, print_scores_confusion_matrix, get_classifier_scores, convert_literal_tuple_string_index_to_tuple
+	model_validation, model_validation_auc, print_scores_confusion_matrix, get_classifier_scores, \
+	convert_literal_tuple_string_index_to_tuple, literal_tuple_strings_to_tuples
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+# continued boosting of an XGBoost classifier adds a fraction of its n_estimators rounds per update, and refits it on
+# all data from scratch once its booster would grow beyond a multiple of n_estimators rounds
+_CONTINUED_ROUNDS_FRACTION = 0.25
+_MAX_BOOSTED_ROUNDS_FACTOR = 2
+_XGB_DEFAULT_N_ESTIMATORS = 100
 
 
 ########################################
@@ -16,11 +30,25 @@ from .utils import \
 
 class LinkPredictor:
 
-	def __init__(self, classifier_model):
+	def __init__(self, classifier_model, n_jobs: int = None, max_threads: int = None):
+		"""
+		Parameters
+		----------
+		classifier_model: an instantiated classifier object, with fit, predict and predict_proba methods.
+		n_jobs: Optional; default None.
+			int, number of concurrent pipeline workers the threads budget is shared with.
+		max_threads: Optional; default None (all available cores).
+			int, total number of threads the pipeline may occupy.
+		"""
 
-		self._model = classifier_model
+		# hand the classifier its share of the threads budget
+		self._resources = ResourceManager(n_jobs=n_jobs, max_threads=max_threads)
+		self._model = self._resources.configure_classifier(classifier_model)
 		self._label_col_name = None
 
+		# training data the model was fitted on (for classifiers which can not continue training)
+		self._train_df = None
+
 		# scores
 		self._train_set_validation_scores = None
 		self._test_set_prediction_summary = None
@@ -46,18 +74,145 @@ class LinkPredictor:
 			A boolean to determine whether to print the trained classifier evaluation scores.
 		"""
 
-		# set label column's name
+		# set label column's name, and keep training data for later updates
 		self._label_col_name = label_col_name
+		self._train_df = train_df
 
 		# split data and label
 		X_train_val = train_df.drop(self._label_col_name, axis=1)
 		y_train_val = train_df[self._label_col_name].values
 
-		# evaluate
-		self._train_set_validation_scores = model_validation(self._model, X_train_val, y_train_val, val_size)
+		with self._resources.limit_native_threads():
+
+			# evaluate
+			self._train_set_validation_scores = model_validation(self._model, X_train_val, y_train_val, val_size)
+
+			# train classifier on ol of the input data
+			self._model.fit(X_train_val, y_train_val)
+
+		# print evaluation performance
+		if verbose:
+			if val_size == 0:
+				raise ValueError('Argument \'val_size\' is 0. Can not perform evaluation.')
+			print_scores_confusion_matrix(self._train_set_validation_scores, data_name='validation')
+
+	def learning_curve(
+			self, train_dfs, label_col_name: str, tol: float = 0.005, val_size: float = 0.1, verbose: bool = False):
+		"""
+		Finds the training set size at which the classifier's validation AUC plateaus.
+
+		Trains a copy of the classifier on each of growing training sets in turn, and stops once the validation AUC
+		gained over the previous training set is below tol. Training sets are consumed lazily, so training sets
+		beyond the plateau are never built. The classifier itself is not trained (see fit).
+
+		Parameters
+		----------
+		train_dfs: An iterable of growing pandas.DataFrames to train on (e.g. a generator).
+		label_col_name: A string to determine the label (target) column name in the training sets.
+		tol: Optional; default 0.005
+			a float to determine the minimal validation AUC gain to keep growing the training set.
+		val_size: Optional; default 0.1
+			a float to determine train/validation split of each training set for evaluation.
+		verbose: Optional; default=False
+			A boolean to determine whether to print the learning curve.
+
+		Returns
+		-------
+		The training set it stopped at (the last consumed), and the learning curve - a list of dicts holding each
+		training set's size ('edges') and validation AUC ('validation_auc').
+		"""
+
+		curve = []
+		train_df = None
+
+		with self._resources.limit_native_threads():
+			for train_df in train_dfs:
+				X = train_df.drop(label_col_name, axis=1)
+				y = train_df[label_col_name].values
+				curve.append({'edges': len(train_df), 'validation_auc': model_validation_auc(self._model, X, y, val_size)})
+
+				if verbose:
+					print(f'Learning curve: {curve[-1]["edges"]} edges, validation AUC {curve[-1]["validation_auc"]:.4f}')
+
+				# stop once the AUC plateaus
+				if len(curve) > 1 and curve[-1]['validation_auc'] - curve[-2]['validation_auc'] < tol:
+					break
+
+		return train_df, curve
+
+	def _continue_training(self, model, X, y, X_prev, y_prev):
+		"""
+		Continues training a fitted model with new data, inplace.
+
+		Uses partial_fit if the classifier supports it, continues boosting from the existing booster for
+		XGBoost classifiers (see update), and otherwise refits on all data (previous and new).
+		"""
+
+		if hasattr(model, 'partial_fit'):
+			model.partial_fit(X, y)
+			return
+
+		if hasattr(model, 'get_booster'):
+			n_estimators = model.get_params().get('n_estimators') or _XGB_DEFAULT_N_ESTIMATORS
+			continued_rounds = max(1, int(_CONTINUED_ROUNDS_FRACTION * n_estimators))
+
+			if model.get_booster().num_boosted_rounds() + continued_rounds <= _MAX_BOOSTED_ROUNDS_FACTOR * n_estimators:
+				model.set_params(n_estimators=continued_rounds)
+				try:
+					model.fit(X, y, xgb_model=model.get_booster())
+				finally:
+					model.set_params(n_estimators=n_estimators)
+				return
+
+		model.fit(pd.concat([X_prev, X], sort=False), np.concatenate([y_prev, y]))
 
-		# train classifier on ol of the input data
-		self._model.fit(X_train_val, y_train_val)
+	def update(self, new_train_df: pd.DataFrame, val_size: float = 0.1, verbose: bool = False):
+		"""
+		Continues training the fitted classifier with new training data.
+
+		Rows of new_train_df whose index already exists in the training data replace the old rows
+		(e.g. edges whose topological features changed).
+
+		XGBoost classifiers continue boosting on the new data only, adding a quarter of their n_estimators rounds
+		per update. Once the booster would grow beyond twice n_estimators rounds, the classifier is refitted from
+		scratch on all data (previous and new) instead, so repeated updates do not grow the model (and its
+		prediction cost) without bound, and the previous data is revisited.
+		First splits the new data to train and validation set to evaluate an updated copy of the classifier,
+		then updates the classifier with all new data.
+
+		Parameters
+		----------
+		new_train_df: A pandas.DataFrame of new training data, with the same columns as the data fitted on.
+		val_size: Optional; default 0.1
+			a float to determine train/validation split of the new data for evaluation.
+		verbose: Optional; default=False
+			A boolean to determine whether to print the updated classifier evaluation scores.
+		"""
+
+		if self._train_df is None:
+			raise ValueError('LinkPredictor is not fitted yet. Call fit before update.')
+
+		# split previous data (without replaced rows) and new data to data and labels
+		prev_train_df = self._train_df.loc[~self._train_df.index.isin(new_train_df.index)]
+		X_prev = prev_train_df.drop(self._label_col_name, axis=1)
+		y_prev = prev_train_df[self._label_col_name].values
+		X_new = new_train_df.drop(self._label_col_name, axis=1)[X_prev.columns]
+		y_new = new_train_df[self._label_col_name].values
+
+		with self._resources.limit_native_threads():
+
+			# evaluate an updated copy of the classifier
+			if val_size > 0:
+				from sklearn.model_selection import train_test_split
+				train_X, val_X, train_y, val_y = train_test_split(X_new, y_new, test_size=val_size)
+				model_copy = deepcopy(self._model)
+				self._continue_training(model_copy, train_X, train_y, X_prev, y_prev)
+				self._train_set_validation_scores = get_classifier_scores(model_copy, val_X, val_y, 'validation')
+
+			# update classifier with all new data
+			self._continue_training(self._model, X_new, y_new, X_prev, y_prev)
+
+		self._train_df = pd.concat([prev_train_df, new_train_df], sort=False)
 
 		# print evaluation performance
 		if verbose:
@@ -65,6 +220,31 @@ class LinkPredictor:
 				raise ValueError('Argument \'val_size\' is 0. Can not perform evaluation.')
 			print_scores_confusion_matrix(self._train_set_validation_scores, data_name='validation')
 
+	def get_fitted_state(self):
+		"""Returns the fitted classifier and its training metadata (e.g. for caching or saving)."""
+
+		return {
+			'model': self._model,
+			'label_col_name': self._label_col_name,
+			'train_set_validation_scores': self._train_set_validation_scores,
+		}
+
+	def set_fitted_state(self, fitted_state: dict, train_df: pd.DataFrame = None):
+		"""
+		Restores a fitted classifier and its training metadata, as returned by get_fitted_state.
+
+		Parameters
+		----------
+		fitted_state: A dictionary returned by get_fitted_state.
+		train_df: Optional; the pandas.DataFrame the classifier was fitted on (needed for later updates of
+			classifiers which can not continue training).
+		"""
+
+		self._model = self._resources.configure_classifier(fitted_state['model'])
+		self._label_col_name = fitted_state['label_col_name']
+		self._train_set_validation_scores = fitted_state['train_set_validation_scores']
+		self._train_df = train_df
+
 	########################################
 	# Inference
 	########################################
@@ -116,11 +296,13 @@ class LinkPredictor:
 		X_test = test_df.drop(self._label_col_name, axis=1)
 		y_test = test_df[self._label_col_name].values
 
-		# get prediction statistics
-		self._test_set_edges_prediction_summary(X_test, y_test, verbose)
+		with self._resources.limit_native_threads():
+
+			# get prediction statistics
+			self._test_set_edges_prediction_summary(X_test, y_test, verbose)
 
-		# get all edges existence probabilities
-		probs = self._model.predict_proba(X_test)[:, 1]
+			# get all edges existence probabilities
+			probs = self._model.predict_proba(X_test)[:, 1]
 
 		# convert DataFrame's literal tuple string index to a tuple index
 		if type(test_df.index[0]) == str:
@@ -129,3 +311,36 @@ class LinkPredictor:
 
 		# create a dictionary
 		return {idx: pr for idx, pr in zip(test_df.index, probs)}
+
+	def iter_edges_existence_prob(
+			self, test_df: pd.DataFrame, chunk_size: int, comm_before_user: bool = True, vertex_to_int: bool = False):
+		"""
+		Yields edges existence probabilities in chunks, instead of one dictionary of all edges.
+
+		Parameters
+		----------
+		test_df: A pandas.DataFrame of edges topological features (with the label column).
+		chunk_size: An int to determine the number of edges in each chunk.
+		comm_before_user: Optional; a boolean to determine whether the community is first in the index tuples.
+		vertex_to_int: Optional; a boolean to interpret vertices numbers as integers.
+
+		Yields
+		-------
+		Tuples of (edges, probabilities) - a list of edge tuples and a numpy array of their existence probabilities.
+		"""
+
+		X_test = test_df.drop(self._label_col_name, axis=1)
+
+		for start in range(0, len(X_test), chunk_size):
+			X_chunk = X_test.iloc[start:start + chunk_size]
+
+			with self._resources.limit_native_threads():
+				probs = self._model.predict_proba(X_chunk)[:, 1]
+
+			# convert literal tuple string index to tuples
+			edges = list(X_chunk.index)
+			if len(edges) > 0 and type(edges[0]) == str:
+				edges = literal_tuple_strings_to_tuples(
+					edges, comm_before_user=comm_before_user, vertex_to_int=vertex_to_int)
+
+			yield edges, probs
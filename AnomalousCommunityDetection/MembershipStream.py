@@ -0,0 +1,442 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import json
+import time
+import socket
+import threading
+from .BiPartiteCreator import BiPartiteCreator
+from .MetaFeatureExtractor import MetaFeatureExtractor
+from .MetaFeatureRanker import MetaFeatureRanker
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+
+##################################
+# Membership events sources
+##################################
+
+_MEMBERSHIP_ACTIONS = ['add', 'remove']
+
+
+def parse_membership_event(line: str):
+	"""
+	Parses a membership event JSON line, of form {"community": <c>, "vertex": <v>, "action": "add" | "remove"}
+	(action defaults to "add").
+
+	Returns a (community, vertex, action) tuple.
+	"""
+
+	event = json.loads(line)
+	action = event.get('action', 'add')
+	if action not in _MEMBERSHIP_ACTIONS:
+		raise ValueError(f'Unknown membership event action "{action}".')
+
+	return event['community'], event['vertex'], action
+
+
+def _split_lines(buffer: str):
+	"""Returns the complete lines of a buffer, and its incomplete remainder."""
+
+	lines = buffer.split('\n')
+	return [line for line in lines[:-1] if line.strip()], lines[-1]
+
+
+def tail_membership_events(
+		file_path: str, follow: bool = True, poll_interval: float = 0.5, stop_event: threading.Event = None):
+	"""
+	Yields batches (lists) of membership events appended to a JSON lines file, like "tail -f".
+
+	Parameters
+	----------
+	file_path: A string indicating the events file path.
+	follow: Optional; default True.
+		A boolean to determine whether to wait for new events at the end of the file, or to stop.
+	poll_interval: Optional; default 0.5.
+		A float to determine the number of seconds to wait before checking the file for new events.
+	stop_event: Optional; a threading.Event which stops following the file when set.
+	"""
+
+	with open(file_path, 'r') as file:
+		remainder = ''
+		while stop_event is None or not stop_event.is_set():
+			chunk = file.read()
+			if not chunk:
+				if not follow:
+					break
+				time.sleep(poll_interval)
+				continue
+
+			lines, remainder = _split_lines(remainder + chunk)
+			if lines:
+				yield [parse_membership_event(line) for line in lines]
+
+
+def socket_membership_events(
+		host: str = '127.0.0.1', port: int = 8766, timeout: float = 0.5, stop_event: threading.Event = None):
+	"""
+	Yields batches (lists) of membership events sent to a local socket, as JSON lines.
+
+	A local stand-in of a message bus - accepts connections one at a time, and yields the events of each
+	received chunk.
+
+	Parameters
+	----------
+	host: Optional; default '127.0.0.1'.
+	port: Optional; default 8766.
+	timeout: Optional; default 0.5.
+		A float to determine the number of seconds to wait for a connection or data before checking stop_event.
+	stop_event: Optional; a threading.Event which stops listening when set.
+	"""
+
+	def stopped():
+		return stop_event is not None and stop_event.is_set()
+
+	with socket.create_server((host, port)) as server:
+		server.settimeout(timeout)
+
+		while not stopped():
+			try:
+				connection, _ = server.accept()
+			except socket.timeout:
+				continue
+
+			with connection:
+				connection.settimeout(timeout)
+				remainder = ''
+				while not stopped():
+					try:
+						data = connection.recv(1 << 16)
+					except socket.timeout:
+						continue
+					if not data:
+						break
+
+					lines, remainder = _split_lines(remainder + data.decode())
+					if lines:
+						yield [parse_membership_event(line) for line in lines]
+
+
+##################################
+# Incremental Scorer
+##################################
+
+class IncrementalScorer:
+	"""
+	A class for keeping a test set's anomalous communities ranking up to date, as its memberships change.
+
+	Membership events - a vertex added to or removed from a community - update the test BiPartite network in place.
+	Only edges whose neighborhoods changed are re-scored:
+		- edges of the event's community and of the event's vertex (their degrees changed),
+		- edges between the vertex's communities and the community's vertices (their friends measure changed).
+	Then, meta-features are re-computed only for communities with a re-scored (or removed) edge.
+	The shortest path feature of farther edges is not refreshed - it may change by any event in the connected
+	component - so it is exact only for re-scored edges.
+
+	Events may be consumed in a background thread, while the ranking is available at any time.
+
+	Attributes:
+		_detector: The fitted detector.
+		_label_thresh: Classification threshold(s) of the label-based meta-features.
+		_verbose: Whether to print progress.
+		_BPG: The test BiPartite network.
+		_edge_probs: A dictionary mapping each community to a dictionary of its vertices' edges existence
+			probabilities.
+		_meta_feats_df: Meta-features DataFrame of all communities.
+		_lock: A lock guarding the above between the consuming thread and ranking.
+	"""
+
+	def __init__(self, detector, test_partitions_map: dict, label_thresh=0.5, verbose: bool = False):
+		"""
+		Parameters
+		----------
+		detector: A fitted AnomalousCommunityDetector.
+		test_partitions_map: dict, Test set partition map indicating each community's belonging vertices.
+		label_thresh: Optional; default 0.5.
+			A float, or a list of floats, to determine the classification threshold(s) of the label-based
+			meta-features.
+		verbose: Optional; default=False
+			A boolean to determine whether to print some properties and progress.
+		"""
+
+		self._detector = detector
+		self._label_thresh = label_thresh
+		self._verbose = verbose
+		self._lock = threading.Lock()
+
+		self._BPG = BiPartiteCreator(test_partitions_map).create_bipartite_graph(
+			list(test_partitions_map.keys()),
+			community_partite_label=detector.community_partite_label,
+			vertex_partite_label=detector.vertex_partite_label)
+
+		self._edge_probs = {comm: {} for comm in test_partitions_map.keys()}
+		self._meta_feats_df = pd.DataFrame()
+
+		# score all edges
+		self._rescore(
+			edges=[(comm, vertex) for comm in test_partitions_map.keys() for vertex in self._BPG.neighbors(comm)],
+			communities=list(test_partitions_map.keys()))
+
+	##################################
+	# Utility methods
+	##################################
+
+	def _apply_event(self, comm, vertex, action: str):
+		"""Applies a membership event to the test BiPartite network. Returns whether it changed the network."""
+
+		if action == 'add':
+			if self._BPG.has_edge(comm, vertex):
+				return False
+
+			if comm not in self._BPG:
+				self._BPG.add_node(comm, partite=self._detector.community_partite_label)
+				self._edge_probs[comm] = {}
+			if vertex not in self._BPG:
+				self._BPG.add_node(vertex, partite=self._detector.vertex_partite_label)
+			self._BPG.add_edge(comm, vertex)
+
+		elif action == 'remove':
+			if not self._BPG.has_edge(comm, vertex):
+				return False
+
+			# an edge added earlier in the same batch is not scored yet
+			self._BPG.remove_edge(comm, vertex)
+			self._edge_probs[comm].pop(vertex, None)
+
+		else:
+			raise ValueError(f'Unknown membership event action "{action}".')
+
+		return True
+
+	def _affected_edges(self, changed_memberships: list):
+		"""Returns the existing edges whose neighborhoods were changed by the given memberships."""
+
+		affected_edges = set()
+		for comm, vertex in changed_memberships:
+			comm_vertices = set(self._BPG.neighbors(comm))
+			vertex_comms = set(self._BPG.neighbors(vertex))
+
+			# edges of the community and of the vertex
+			affected_edges.update((comm, comm_vertex) for comm_vertex in comm_vertices)
+			affected_edges.update((vertex_comm, vertex) for vertex_comm in vertex_comms)
+
+			# edges between the vertex's communities and the community's vertices
+			for vertex_comm in vertex_comms:
+				affected_edges.update(
+					(vertex_comm, comm_vertex) for comm_vertex in comm_vertices & set(self._BPG.neighbors(vertex_comm)))
+
+		return list(affected_edges)
+
+	def _remove_isolated_nodes(self, changed_memberships: list):
+		"""Removes communities and vertices left without memberships. Returns the removed communities."""
+
+		removed_comms = []
+		for comm, vertex in changed_memberships:
+			if comm in self._BPG and self._BPG.degree(comm) == 0:
+				self._BPG.remove_node(comm)
+				del self._edge_probs[comm]
+				removed_comms.append(comm)
+			if vertex in self._BPG and self._BPG.degree(vertex) == 0:
+				self._BPG.remove_node(vertex)
+
+		return removed_comms
+
+	def _rescore(self, edges: list, communities: list, removed_comms: list = ()):
+		"""Re-scores the given edges, and re-computes the given communities' meta-features."""
+
+		probs = self._detector.get_edges_existence_prob(self._BPG, edges, verbose=self._verbose)
+		for (comm, vertex), prob in zip(edges, probs):
+			self._edge_probs[comm][vertex] = prob
+
+		communities = [comm for comm in communities if len(self._edge_probs.get(comm, {})) > 0]
+		kept_meta_feats_df = self._meta_feats_df.drop(index=communities + list(removed_comms), errors='ignore')
+		if len(communities) == 0:
+			self._meta_feats_df = kept_meta_feats_df
+			return
+
+		meta_feat_extractor = MetaFeatureExtractor({
+			(comm, vertex): prob for comm in communities for vertex, prob in self._edge_probs[comm].items()})
+		meta_feats_df = meta_feat_extractor.get_comm_repr_vertices_meta_features(thresh=self._label_thresh)
+
+		if len(kept_meta_feats_df) == 0:
+			self._meta_feats_df = meta_feats_df
+		else:
+			self._meta_feats_df = pd.concat([kept_meta_feats_df, meta_feats_df])
+
+	##################################
+	# Main methods
+	##################################
+
+	def apply_events(self, events: list):
+		"""
+		Applies a batch of membership events, and re-scores the affected edges and communities once.
+
+		Parameters
+		----------
+		events: A list of (community, vertex, action) tuples, where action is 'add' or 'remove'.
+
+		Returns
+		---------
+		The number of re-scored edges.
+		"""
+
+		# validate the whole batch before changing anything, so a bad event does not leave it half-applied
+		for event in events:
+			if len(event) != 3 or event[2] not in ('add', 'remove'):
+				raise ValueError(f'Membership events must be (community, vertex, \'add\' or \'remove\'), got {event}.')
+
+		with self._lock:
+			changed_memberships = [
+				(comm, vertex) for comm, vertex, action in events if self._apply_event(comm, vertex, action)]
+			if len(changed_memberships) == 0:
+				return 0
+
+			affected_edges = self._affected_edges(changed_memberships)
+			removed_comms = self._remove_isolated_nodes(changed_memberships)
+
+			affected_comms = {comm for comm, _ in changed_memberships} | {comm for comm, _ in affected_edges}
+			self._rescore(
+				edges=affected_edges,
+				communities=[comm for comm in affected_comms if comm not in removed_comms],
+				removed_comms=removed_comms)
+
+			return len(affected_edges)
+
+	def consume(self, event_batches):
+		"""
+		Applies batches of membership events as they arrive (e.g. from tail_membership_events or
+		socket_membership_events), until the source is exhausted.
+		"""
+
+		for events in event_batches:
+			self.apply_events(events)
+
+	def consume_in_background(self, event_batches):
+		"""Consumes batches of membership events in a daemon thread, and returns the thread."""
+
+		consumer = threading.Thread(target=self.consume, args=(event_batches,), daemon=True)
+		consumer.start()
+		return consumer
+
+	def ranking(self, top_k: int = None):
+		"""
+		Returns the current ranking of the test set communities.
+
+		Parameters
+		----------
+		top_k: Optional; default None (all communities).
+			An int to determine the number of most anomalous communities to return per meta-feature.
+
+		Returns
+		---------
+		A DataFrame of community-representing vertices, ranked by meta-features.
+		"""
+
+		with self._lock:
+			meta_feats_df = self._meta_feats_df.copy()
+
+		return MetaFeatureRanker(meta_feats_df).rank_columns(top_k=top_k)
+
+
+##################################
+# Sliding-window detection
+##################################
+
+def detect_sliding_windows(
+		detector,
+		events,
+		window,
+		step,
+		start=None,
+		end=None,
+		label_thresh=0.5,
+		top_k: int = None,
+		verbose: bool = False):
+	"""
+	Detects anomalous communities over sliding time windows of timestamped membership events.
+
+	A vertex belongs to a community in a window [window_start, window_start + window) if the window holds any of
+	their membership events. Consecutive windows are ranked by a single IncrementalScorer - as the window advances,
+	memberships which enter or leave it are applied as add or remove events, so only edges whose neighborhoods
+	changed are re-scored, and persisting memberships reuse their scores.
+
+	Parameters
+	----------
+	detector: A fitted AnomalousCommunityDetector.
+	events: An iterable of (community, vertex, timestamp) tuples. Timestamps may be numbers or datetimes
+		(in any order).
+	window: The window length (a number, or a timedelta for datetime timestamps).
+	step: The windows' advance (of the same type as window). Both window and step must be positive.
+	start: Optional; default None (the earliest timestamp). The first window's start.
+	end: Optional; default None (the latest timestamp). Windows advance until a window ends after end.
+	label_thresh: Optional; default 0.5.
+		A float, or a list of floats, to determine the classification threshold(s) of the label-based meta-features.
+	top_k: Optional; default None (all communities).
+		An int to determine the number of most anomalous communities to return per meta-feature.
+	verbose: Optional; default=False
+		A boolean to determine whether to print some properties and progress.
+
+	Yields
+	-------
+	Tuples of (window_start, window_end, ranking) - ranking is a DataFrame of the window's community-representing
+	vertices, ranked by meta-features.
+	"""
+
+	# multiplying by 0 gives the zero of either type (a number or a timedelta)
+	if window <= window * 0:
+		raise ValueError(f'Argument \'window\' must be positive, got {window}.')
+	if step <= step * 0:
+		raise ValueError(f'Argument \'step\' must be positive, got {step}.')
+
+	events = sorted(events, key=lambda event: event[2])
+	if len(events) == 0:
+		return
+
+	window_start = events[0][2] if start is None else start
+	end = events[-1][2] if end is None else end
+
+	# number of each membership's events in the current window
+	membership_counts = {}
+	entering_idx, leaving_idx = 0, 0
+	scorer = None
+
+	while True:
+		window_end = window_start + window
+		prev_memberships = {membership for membership, count in membership_counts.items() if count > 0}
+
+		# events entering and leaving the window
+		while entering_idx < len(events) and events[entering_idx][2] < window_end:
+			comm, vertex, _ = events[entering_idx]
+			membership_counts[(comm, vertex)] = membership_counts.get((comm, vertex), 0) + 1
+			entering_idx += 1
+
+		while leaving_idx < entering_idx and events[leaving_idx][2] < window_start:
+			comm, vertex, _ = events[leaving_idx]
+			membership_counts[(comm, vertex)] -= 1
+			if membership_counts[(comm, vertex)] == 0:
+				del membership_counts[(comm, vertex)]
+			leaving_idx += 1
+
+		memberships = set(membership_counts.keys())
+
+		if scorer is None:
+			window_partitions_map = {}
+			for comm, vertex in memberships:
+				window_partitions_map.setdefault(comm, []).append(vertex)
+			scorer = IncrementalScorer(detector, window_partitions_map, label_thresh=label_thresh, verbose=verbose)
+
+		else:
+			scorer.apply_events(
+				[(comm, vertex, 'add') for comm, vertex in memberships - prev_memberships] +
+				[(comm, vertex, 'remove') for comm, vertex in prev_memberships - memberships])
+
+		yield window_start, window_end, scorer.ranking(top_k=top_k)
+
+		if window_end > end:
+			break
+		window_start += step
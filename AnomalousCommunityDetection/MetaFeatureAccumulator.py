@@ -0,0 +1,254 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+########################################
+# imports
+########################################
+
+import numpy as np
+from statistics import NormalDist
+from .MetaFeatureExtractor import MetaFeatureExtractor, label_thresholds_and_suffixes
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+
+########################################
+# Meta-Feature Accumulator
+########################################
+
+class MetaFeatureAccumulator:
+	"""
+	A class for computing community-representing vertices meta-features from a stream of probability chunks.
+
+	Keeps per-community running statistics instead of the probabilities themselves, so memory grows with the
+	number of communities and not with the number of edges:
+		- count, mean and sum of squared deviations, updated with the batched (Chan et al.) form of Welford's
+			algorithm,
+		- number of edges labeled as existing by each threshold,
+		- a fixed-width histogram of the probabilities, used as a quantile sketch for the median.
+			Since probabilities lie in [0, 1], bins of width 2 * median_error bound the median's error by
+			median_error.
+
+	Accumulators of disjoint chunks (e.g. computed by different worker processes) can be merged.
+
+	Attributes:
+		_thresholds: Classification thresholds of the label-based meta-features.
+		_suffixes: Column name suffix of each threshold.
+		_num_bins: Number of histogram bins.
+		_comm_rows: A dictionary mapping each community-representing vertex to its row in the statistics arrays.
+		_counts: Number of edges of each community.
+		_means: Running mean of each community's probabilities.
+		_m2s: Running sum of squared deviations from the mean of each community's probabilities.
+		_label_counts: Number of edges labeled as existing of each community (a column per threshold).
+		_histograms: Histogram of each community's probabilities.
+	"""
+
+	def __init__(self, thresh: float = 0.5, median_error: float = 0.01):
+		"""
+		Parameters
+		----------
+		thresh: Optional; default 0.5.
+			A float, or an array of floats, to determine the classification threshold(s) of the label-based
+			meta-features (see MetaFeatureExtractor.get_comm_repr_vertices_meta_features).
+		median_error: Optional; default 0.01.
+			A float to determine the maximal absolute error of the approximate median.
+		"""
+
+		self._thresholds, self._suffixes = label_thresholds_and_suffixes(thresh)
+		self._num_bins = int(np.ceil(1 / (2 * median_error)))
+
+		self._comm_rows = {}
+		self._counts = np.zeros(0, dtype=np.int64)
+		self._means = np.zeros(0)
+		self._m2s = np.zeros(0)
+		self._label_counts = np.zeros((0, len(self._thresholds)), dtype=np.int64)
+		self._histograms = np.zeros((0, self._num_bins), dtype=np.uint32)
+
+	########################################
+	# Utility methods
+	########################################
+
+	def _get_rows(self, communities):
+		"""Returns the statistics rows of the given communities, adding rows for unseen communities."""
+
+		rows = np.fromiter(
+			(self._comm_rows.setdefault(comm, len(self._comm_rows)) for comm in communities),
+			dtype=np.int64, count=len(communities))
+
+		# grow statistics arrays
+		num_new_rows = len(self._comm_rows) - len(self._counts)
+		if num_new_rows > 0:
+			self._counts = np.concatenate([self._counts, np.zeros(num_new_rows, dtype=np.int64)])
+			self._means = np.concatenate([self._means, np.zeros(num_new_rows)])
+			self._m2s = np.concatenate([self._m2s, np.zeros(num_new_rows)])
+			self._label_counts = np.concatenate(
+				[self._label_counts, np.zeros((num_new_rows, len(self._thresholds)), dtype=np.int64)])
+			self._histograms = np.concatenate(
+				[self._histograms, np.zeros((num_new_rows, self._num_bins), dtype=np.uint32)])
+
+		return rows
+
+	def _combine(self, rows, counts, means, m2s, label_counts, histograms):
+		"""Combines statistics of a batch (aligned to the given rows) into the running statistics."""
+
+		prev_counts = self._counts[rows]
+		total_counts = prev_counts + counts
+		delta = means - self._means[rows]
+
+		self._means[rows] += delta * counts / total_counts
+		self._m2s[rows] += m2s + delta ** 2 * prev_counts * counts / total_counts
+		self._counts[rows] = total_counts
+		self._label_counts[rows] += label_counts
+		self._histograms[rows] += histograms
+
+	########################################
+	# Main methods
+	########################################
+
+	def update(self, communities, probs):
+		"""
+		Updates the running statistics with a chunk of edges existence probabilities.
+
+		Parameters
+		----------
+		communities: A sequence of the community-representing vertex of each edge in the chunk.
+		probs: A sequence of the existence probability of each edge in the chunk.
+		"""
+
+		probs = np.asarray(probs, dtype=float)
+		if len(probs) == 0:
+			return
+
+		rows = self._get_rows(communities)
+
+		# reduce the chunk to per-community statistics
+		chunk_rows, inverse = np.unique(rows, return_inverse=True)
+		counts = np.bincount(inverse)
+		means = np.bincount(inverse, weights=probs) / counts
+		m2s = np.bincount(inverse, weights=(probs - means[inverse]) ** 2)
+		labels_by_thresh = probs[:, None] >= self._thresholds[None, :]
+		label_counts = np.zeros((len(chunk_rows), len(self._thresholds)), dtype=np.int64)
+		np.add.at(label_counts, inverse, labels_by_thresh)
+
+		bins = np.minimum((probs * self._num_bins).astype(np.int64), self._num_bins - 1)
+		histograms = np.bincount(
+			inverse * self._num_bins + bins, minlength=len(chunk_rows) * self._num_bins
+		).reshape(len(chunk_rows), self._num_bins).astype(np.uint32)
+
+		self._combine(chunk_rows, counts, means, m2s, label_counts, histograms)
+
+	def merge(self, other):
+		"""
+		Merges the running statistics of another accumulator (of disjoint edges) into this one, inplace.
+
+		Parameters
+		----------
+		other: A MetaFeatureAccumulator with the same threshold and median error.
+		"""
+
+		if not np.array_equal(other._thresholds, self._thresholds) or other._num_bins != self._num_bins:
+			raise ValueError('Can not merge accumulators with different thresholds or median errors.')
+
+		if len(other._comm_rows) == 0:
+			return self
+
+		rows = self._get_rows(list(other._comm_rows.keys()))
+		self._combine(
+			rows, other._counts, other._means, other._m2s, other._label_counts, other._histograms)
+
+		return self
+
+	def _approximate_medians(self):
+		"""Returns the approximate median of each community, from its histogram."""
+
+		cumulative = np.cumsum(self._histograms, axis=1)
+		bin_mids = (np.arange(self._num_bins) + 0.5) / self._num_bins
+
+		# bins of the lower and upper middle elements (identical for odd counts)
+		lower = (cumulative < ((self._counts + 1) // 2)[:, None]).sum(axis=1)
+		upper = (cumulative < (self._counts // 2 + 1)[:, None]).sum(axis=1)
+
+		return (bin_mids[lower] + bin_mids[upper]) / 2
+
+	def get_meta_features(self):
+		"""
+		Returns the meta-features of all community-representing vertices seen so far.
+
+		Returns
+		-------
+		DataFrame indexed by community-representing vertices, with the same columns as
+		MetaFeatureExtractor.get_comm_repr_vertices_meta_features.
+		"""
+
+		if len(self._comm_rows) == 0:
+			return pd.DataFrame()
+
+		# edges existing probability meta-features
+		normality_prob_mean = self._means
+
+		normality_prob_std = 1 - np.sqrt(self._m2s / self._counts)
+
+		normality_prob_median = self._approximate_medians()
+
+		# labeled edges meta-features (labels are binary, so their variance is p * (1 - p))
+		predicted_label_mean = self._label_counts / self._counts[:, None]
+
+		predicted_label_std = 1 - np.sqrt(predicted_label_mean * (1 - predicted_label_mean))
+
+		meta_features = {
+			'normality_prob_mean__score': normality_prob_mean,
+			'normality_prob_std__score': normality_prob_std,
+			'normality_prob_median__score': normality_prob_median,
+		}
+		for idx, suffix in enumerate(self._suffixes):
+			meta_features[f'predicted_label_mean{suffix}__score'] = predicted_label_mean[:, idx]
+			meta_features[f'predicted_label_std{suffix}__score'] = predicted_label_std[:, idx]
+			meta_features[f'weighted_sum{suffix}__score'] = MetaFeatureExtractor._weighted_sum(
+				normality_prob_mean,
+				normality_prob_std,
+				normality_prob_median,
+				predicted_label_mean[:, idx],
+				predicted_label_std[:, idx])
+
+		return pd.DataFrame(meta_features, index=pd.Index(list(self._comm_rows.keys()), dtype=object))
+
+	def get_mean_confidence_bounds(self, confidence: float = 0.95, population_counts: dict = None):
+		"""
+		Returns the mean probability (normality_prob_mean) of all community-representing vertices seen so far, with
+		its confidence bounds, estimated from the edges seen (normal approximation, clipped to [0, 1]).
+
+		Parameters
+		----------
+		confidence: Optional; default 0.95. A float to determine the bounds' confidence level.
+		population_counts: Optional; default None (infinite populations).
+			A dictionary of form {comm: number of edges}, of the total number of edges of each community. If given,
+			the bounds are narrowed by the finite population correction - a community whose edges were all seen has
+			its exact mean.
+
+		Returns
+		-------
+		DataFrame indexed by community-representing vertices, with 'normality_prob_mean__score', its 'lower_bound'
+		and 'upper_bound', and 'edges' (number of edges seen) columns.
+		"""
+
+		communities = list(self._comm_rows.keys())
+		counts = self._counts.astype(float)
+		z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+		# standard error of the mean (unbounded for communities of a single edge seen)
+		sample_stds = np.sqrt(np.divide(self._m2s, counts - 1, out=np.zeros_like(counts), where=counts > 1))
+		half_widths = np.full_like(counts, np.inf)
+		np.divide(z * sample_stds, np.sqrt(counts), out=half_widths, where=counts > 1)
+
+		if population_counts is not None:
+			populations = np.array([population_counts[comm] for comm in communities], dtype=float)
+			corrections = np.sqrt(np.maximum(populations - counts, 0) / np.maximum(populations - 1, 1))
+			half_widths = np.where(corrections == 0, 0, half_widths * corrections)
+
+		return pd.DataFrame({
+			'normality_prob_mean__score': self._means,
+			'lower_bound': np.clip(self._means - half_widths, 0, 1),
+			'upper_bound': np.clip(self._means + half_widths, 0, 1),
+			'edges': self._counts},
+			index=pd.Index(communities, dtype=object))
@@ -5,8 +5,28 @@ __email__ = 'lapidshay@gmail.com'
 # imports
 ########################################
 
-import networkx as nx
 import numpy as np
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+
+########################################
+# Utility functions
+########################################
+
+def label_thresholds_and_suffixes(thresh):
+	"""
+	Returns an array of classification thresholds, and the column name suffix of each threshold.
+
+	A scalar threshold keeps the original (unsuffixed) label-based meta-features names.
+	"""
+
+	if np.ndim(thresh) == 0:
+		return np.array([thresh], dtype=float), ['']
+
+	thresholds = np.asarray(thresh, dtype=float)
+	return thresholds, [f'_{t:g}' for t in thresholds]
 
 
 ########################################
@@ -20,97 +40,108 @@ class MetaFeatureExtractor:
 
 		self.edge_probs = edges_existence_prob_dict
 
-		# if graph was sampled before creating edges_existence_prob_dict
-		# create graph only from these edges:
-		self.g = nx.from_edgelist(self.edge_probs.keys())
-
-		# get community-representing vertices set
 		# community needs to be first in the index tuples
-		self.comm_vertices = self._get_community_repr_vertices_set(self.edge_probs)
-
-	@ staticmethod
-	def _get_community_repr_vertices_set(dic):
-		"""Returns a set of recipe vertices which are involved in edges within the input."""
+		communities = [edge[0] for edge in self.edge_probs.keys()]
+		probs = np.fromiter(self.edge_probs.values(), dtype=float, count=len(self.edge_probs))
 
-		# extract all edges, which are the keys of the dictionary
-		edges = dic.keys()
+		self._set_grouped_probabilities(communities, probs)
 
-		# extract only the first element of the edge-tuple (partite 1 node) and create a set
-		return set(list(zip(*edges))[0])
-
-	########################################
-	# Community-representing vertices meta-features extraction
-	########################################
-
-	@ staticmethod
-	def _binary_label_by_thresh(prob, thresh):
-		return 1 if prob >= thresh else 0
-
-	def _vertex_meta_features(self, u, thresh):
+	def _set_grouped_probabilities(self, communities, probs):
 		"""
-		Return a dictionary containing vertex's meta-features.
+		Groups edges existence probabilities by community.
 
-		It is assumed the graph g contains edge existing probabilities as edge attributes called 'exist_prob',
-		for each edge that contains vertex u.
-
-		:param u:
-		:param thresh:
-		:return:
+		Encodes community-representing vertices as integer codes, and sorts the probabilities by code
+		(and by probability within each community, for medians), so each community's probabilities
+		are a contiguous segment which can be reduced at once for all communities.
 		"""
 
-		# extract edge existing probabilities
-		vertex_edges_probs = [self.edge_probs[edge] for edge in self.g.edges(u)]
-
-		# edges existing probability meta-features
-		normality_prob_mean = np.mean(vertex_edges_probs)
+		# encode community-representing vertices
+		codes, self.comm_vertices = pd.factorize(pd.Series(communities, dtype=object), sort=False)
 
-		normality_prob_std = 1 - np.std(vertex_edges_probs)
+		# sort by community code, then by probability
+		order = np.lexsort((probs, codes))
+		self._probs = probs[order]
+		sorted_codes = codes[order]
 
-		normality_prob_median = np.median(vertex_edges_probs)
+		# segments' start positions and lengths
+		self._starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+		self._counts = np.diff(np.r_[self._starts, len(sorted_codes)])
 
-		# label edges by the given threshold
-		labels_by_thresh = [self._binary_label_by_thresh(prob, thresh=thresh) for prob in vertex_edges_probs]
-
-		# labeled edges meta-features
-		predicted_label_mean = np.mean(labels_by_thresh)
+	########################################
+	# Community-representing vertices meta-features extraction
+	########################################
 
-		predicted_label_std = 1 - np.std(labels_by_thresh)
+	def _segments_mean(self, values):
+		"""Returns the mean of each community's segment of values (of each column, if values is 2-dimensional)."""
+		counts = self._counts if values.ndim == 1 else self._counts[:, None]
+		return np.add.reduceat(values, self._starts, axis=0) / counts
 
-		weighted_sum = self._weighted_sum(
-			normality_prob_mean,
-			normality_prob_std,
-			normality_prob_median,
-			predicted_label_mean,
-			predicted_label_std)
+	def _segments_std(self, values, means):
+		"""Returns the (population) standard deviation of each community's segment of values."""
+		deviations = values - np.repeat(means, self._counts, axis=0)
+		return np.sqrt(self._segments_mean(deviations ** 2))
 
-		return {
-			'normality_prob_mean__score': normality_prob_mean,
-			'normality_prob_std__score': normality_prob_std,
-			'normality_prob_median__score': normality_prob_median,
-			'predicted_label_mean__score': predicted_label_mean,
-			'predicted_label_std__score': predicted_label_std,
-			'weighted_sum__score': weighted_sum
-		}
+	def _segments_median(self):
+		"""Returns the median of each community's (sorted) segment of probabilities."""
+		lower = self._probs[self._starts + (self._counts - 1) // 2]
+		upper = self._probs[self._starts + self._counts // 2]
+		return (lower + upper) / 2
 
 	@staticmethod
 	def _weighted_sum(npmean, npstd, npmed, prlmean, prlstd):
 
 		weights = np.array([-0.5, 0.5, 0, -0.5, 0.5])
 		meta_feats_arr = np.vstack((npmean, npstd, npmed, prlmean, prlstd)).T
-		return np.squeeze(meta_feats_arr.dot(weights))
+		return meta_feats_arr.dot(weights)
 
 	def get_comm_repr_vertices_meta_features(self, thresh):
 		"""
-		Extract meta-features and returns as dictionary of form {comm_name: {meta-feat_1: x_1, ... meta-feat_n: x_n}}.
+		Extract meta-features of all community-representing vertices at once.
+
+		Parameters
+		----------
+		thresh: A float, or an array of floats, to determine the classification threshold(s) of the label-based
+			meta-features. Given an array, the label-based meta-features (and weighted sum) of all thresholds are
+			computed in a single pass, in columns suffixed by the threshold (e.g. 'predicted_label_mean_0.3__score').
 
 		Returns
 		-------
-		Dictionary containing each community-representing meta-features.
+		DataFrame indexed by community-representing vertices, with a column for each meta-feature.
 		"""
 
-		return {
-			comm: self._vertex_meta_features(comm, thresh)
-			for comm
-			in self.comm_vertices
-		}
+		if len(self._probs) == 0:
+			return pd.DataFrame()
+
+		thresholds, suffixes = label_thresholds_and_suffixes(thresh)
+
+		# edges existing probability meta-features
+		normality_prob_mean = self._segments_mean(self._probs)
+
+		normality_prob_std = 1 - self._segments_std(self._probs, normality_prob_mean)
+
+		normality_prob_median = self._segments_median()
+
+		# label edges by all given thresholds (a column per threshold)
+		labels_by_thresh = (self._probs[:, None] >= thresholds[None, :]).astype(float)
+
+		# labeled edges meta-features
+		predicted_label_mean = self._segments_mean(labels_by_thresh)
 
+		predicted_label_std = 1 - self._segments_std(labels_by_thresh, predicted_label_mean)
+
+		meta_features = {
+			'normality_prob_mean__score': normality_prob_mean,
+			'normality_prob_std__score': normality_prob_std,
+			'normality_prob_median__score': normality_prob_median,
+		}
+		for idx, suffix in enumerate(suffixes):
+			meta_features[f'predicted_label_mean{suffix}__score'] = predicted_label_mean[:, idx]
+			meta_features[f'predicted_label_std{suffix}__score'] = predicted_label_std[:, idx]
+			meta_features[f'weighted_sum{suffix}__score'] = self._weighted_sum(
+				normality_prob_mean,
+				normality_prob_std,
+				normality_prob_median,
+				predicted_label_mean[:, idx],
+				predicted_label_std[:, idx])
+
+		return pd.DataFrame(meta_features, index=self.comm_vertices)
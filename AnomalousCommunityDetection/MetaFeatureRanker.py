@@ -5,7 +5,10 @@ __email__ = 'lapidshay@gmail.com'
 # imports
 ########################################
 
-import pandas as pd
+import numpy as np
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
 
 
 ########################################
@@ -13,26 +16,68 @@ import pandas as pd
 ########################################
 
 class MetaFeatureRanker:
-	def __init__(self, meta_feature_scores_dict: dict):
+	def __init__(self, meta_feature_scores):
+		"""
+		Parameters
+		----------
+		meta_feature_scores: A DataFrame indexed by communities with a column for each meta-feature score,
+			or a dictionary of form {comm_name: {meta-feat_1: x_1, ... meta-feat_n: x_n}}.
+		"""
 
 		# Create a DataFrame from dict
-		self._meta_feature_scores_df = pd.DataFrame.from_dict(meta_feature_scores_dict, orient='index')
+		if isinstance(meta_feature_scores, pd.DataFrame):
+			self._meta_feature_scores_df = meta_feature_scores
+		else:
+			self._meta_feature_scores_df = pd.DataFrame.from_dict(meta_feature_scores, orient='index')
+
+	@staticmethod
+	def _descending_order(scores, top_k):
+		"""
+		Returns the row order of each column of a scores matrix, from highest to lowest score (NaNs last).
+
+		If top_k is given, returns only the top_k lowest scored (most anomalous) rows of each column,
+		found by partitioning, in the same descending order. NaNs are selected only to fill the top_k rows of a column
+		with fewer than top_k non-NaN scores, and are then ordered first.
+		"""
+
+		if top_k is None or top_k >= len(scores):
+			return np.argsort(-scores, axis=0, kind='stable')
+
+		# select top_k lowest scored rows of each column, then sort only them
+		lowest_first_scores = np.where(np.isnan(scores), np.inf, scores)
+		bottom_rows = np.argpartition(lowest_first_scores, top_k - 1, axis=0)[:top_k]
+		bottom_order = np.argsort(
+			-np.take_along_axis(lowest_first_scores, bottom_rows, axis=0), axis=0, kind='stable')
+		return np.take_along_axis(bottom_rows, bottom_order, axis=0)
+
+	def rank_columns(self, top_k: int = None):
+		"""
+		Ranks communities by each of the meta-feature columns, all columns at once.
+
+		Parameters
+		----------
+		top_k: Optional; default None (all communities).
+			An int to determine the number of most anomalous (lowest scored) communities to return per meta-feature.
+			These are the last top_k rows of the full ranking, in the same order, unless the meta-feature has NaN scores
+			(which are last in the full ranking, but are never preferred to non-NaN scores for the top_k rows).
 
-	def rank_columns(self):
-		"""Creates new columns which contain column ranking, and changes DataFrame inplace."""
+		Returns
+		-------
+		DataFrame with a pair of columns per meta-feature - '*__ranking' containing the communities sorted by
+		the meta-feature, and '*__score' containing their corresponding scores.
+		"""
 
-		ranked_features_mini_dfs = []
-		for col in self._meta_feature_scores_df.columns:
+		communities = self._meta_feature_scores_df.index.to_numpy()
+		scores = self._meta_feature_scores_df.to_numpy(dtype=float)
 
-			# Sort series and convert to 1-column DataFrame with community names as index
-			col_mini_df = self._meta_feature_scores_df[col].sort_values(ascending=False).to_frame()
+		order = self._descending_order(scores, top_k)
 
-			# Update index name to contain "ranking" instead of "score"
-			col_mini_df.index.name = col.replace('score', 'ranking')
+		ranked_columns = {}
+		for col_idx, col in enumerate(self._meta_feature_scores_df.columns):
+			col_order = order[:, col_idx]
 
-			# Put index as columns
-			col_mini_df.reset_index(inplace=True)
-			ranked_features_mini_dfs.append(col_mini_df)
+			# Column name contains "ranking" instead of "score"
+			ranked_columns[col.replace('score', 'ranking')] = communities[col_order]
+			ranked_columns[col] = scores[col_order, col_idx]
 
-		ranked_columns_df = pd.concat(ranked_features_mini_dfs, sort=False, axis=1)
-		return ranked_columns_df
+		return pd.DataFrame(ranked_columns)
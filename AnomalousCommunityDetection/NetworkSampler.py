@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 __author__ = 'Shay Lapid'
 __email__ = 'lapidshay@gmail.com'
 
@@ -5,9 +7,11 @@ __email__ = 'lapidshay@gmail.com'
 # Imports
 ########################################
 
-import networkx as nx
 import random
 import warnings
+from .lazy_imports import lazy_import
+
+nx = lazy_import('networkx')
 
 
 ########################################
@@ -28,7 +32,9 @@ class NetworkSampler:
 		self._community_part_label = community_part_label
 		self._vertex_part_label = vertex_part_label
 
-	def sample_network_edges(self, G: nx.Graph, max_edges: int = None, generate_negative_edges: bool = False):
+	def sample_network_edges(
+			self, G: nx.Graph, max_edges: int = None, generate_negative_edges: bool = False,
+			community_nodes: list = None):
 		"""
 		Returns 2 lists - (1) sampled positive edges and (2) negative edges \ an empty list.
 
@@ -41,6 +47,8 @@ class NetworkSampler:
 		G: nx.Graph, graph to sample edges from.
 		max_edges: int, maximum edges to sample.
 		generate_negative_edges: a boolean, determines whether to create negative edges.
+		community_nodes: Optional; default None (all community part vertices).
+			a list of community-representing vertices to restrict both positive and negative edges to.
 
 		Returns
 		-------
@@ -54,6 +62,12 @@ class NetworkSampler:
 			if data['partite'] == self._community_part_label
 		]
 
+		# Community part vertices which are not sampled from, if community_nodes is given
+		excluded_community_nodes = None
+		if community_nodes is not None:
+			excluded_community_nodes = list(set(community_partite_nodes) - set(community_nodes))
+			community_partite_nodes = list(community_nodes)
+
 		# Select random max_edges or all positive edges
 		positive_edges = self._select_existing_edges(G, nodes_to_include=community_partite_nodes, max_edges=max_edges)
 
@@ -64,13 +78,61 @@ class NetworkSampler:
 			negative_edges_num = len(positive_edges)
 
 			# Generate random non existing links
-			negative_edges = self._select_non_existing_edges(G, n=negative_edges_num)
+			negative_edges = self._select_non_existing_edges(
+				G, n=negative_edges_num, nodes_to_exclude=excluded_community_nodes)
 
 		else:
 			negative_edges = []
 
 		return positive_edges, negative_edges
 
+	def sample_network_edges_in_random_order(
+			self, G: nx.Graph, max_edges: int = None, generate_negative_edges: bool = True):
+		"""
+		Returns 2 lists - (1) sampled positive edges and (2) as many negative edges \ an empty list, each in random
+		order, so that their prefixes of any length are random samples (e.g. for growing training sets, or batches).
+
+		Parameters
+		----------
+		G: nx.Graph, graph to sample edges from.
+		max_edges: int, maximum edges to sample.
+		generate_negative_edges: Optional; default True. A boolean, determines whether to create negative edges.
+		"""
+
+		positive_edges, negative_edges = self.sample_network_edges(
+			G, max_edges=max_edges, generate_negative_edges=generate_negative_edges)
+		return (
+			random.sample(list(positive_edges), k=len(positive_edges)),
+			random.sample(list(negative_edges), k=len(negative_edges)))
+
+	def sample_network_edges_among(
+			self, G: nx.Graph, community_nodes: list, vertex_nodes: list, max_edges: int = None,
+			generate_negative_edges: bool = False):
+		"""
+		Returns 2 lists - (1) sampled positive edges and (2) negative edges \ an empty list, both restricted to the
+		given community part and vertex part vertices (e.g. of one component of a disjoint union of networks).
+
+		Unlike sample_network_edges, the graph's vertices are not scanned, so sampling many small parts of a large
+		graph costs in proportion to the parts.
+
+		Parameters
+		----------
+		G: nx.Graph, graph to sample edges from.
+		community_nodes: a list of community-representing vertices to sample edges of.
+		vertex_nodes: a list of regular vertices to pair with community_nodes in negative edges.
+		max_edges: int, maximum edges to sample.
+		generate_negative_edges: a boolean, determines whether to create negative edges.
+		"""
+
+		positive_edges = self._select_existing_edges(G, nodes_to_include=community_nodes, max_edges=max_edges)
+
+		negative_edges = []
+		if generate_negative_edges:
+			negative_edges = self._select_non_existing_edges_among(
+				G, n=len(positive_edges), comm_part_nodes=community_nodes, vertex_part_nodes=vertex_nodes)
+
+		return positive_edges, negative_edges
+
 	def _select_existing_edges(self, G, nodes_to_include: list, max_edges=None):
 		"""Returns a list of all existing links or random max_edges existing links."""
 		selected_edges = set()
@@ -97,7 +159,6 @@ class NetworkSampler:
 
 	def _select_non_existing_edges(self, G, n, nodes_to_exclude: list = None):
 		"""Returns a list of random n non-existing edges."""
-		selected_edges = set()
 
 		# Create lists of community part vertices and regular vertices
 		comm_part_nodes = [v for (v, data) in G.nodes(data=True) if data['partite'] == self._community_part_label]
@@ -107,6 +168,13 @@ class NetworkSampler:
 		if nodes_to_exclude is not None:
 			comm_part_nodes = list(set(comm_part_nodes) - set(nodes_to_exclude))
 
+		return self._select_non_existing_edges_among(G, n, comm_part_nodes, vertex_part_nodes)
+
+	@staticmethod
+	def _select_non_existing_edges_among(G, n, comm_part_nodes: list, vertex_part_nodes: list):
+		"""Returns a list of random n non-existing edges, between the given community part and vertex part vertices."""
+		selected_edges = set()
+
 		while len(selected_edges) < n:
 
 			# Randomly choose 2 nodes
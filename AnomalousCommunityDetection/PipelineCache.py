@@ -0,0 +1,162 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import os
+import pickle
+import hashlib
+import numpy as np
+from .ResourceManager import _CLASSIFIER_THREADS_PARAMS
+from .lazy_imports import lazy_import
+
+pd = lazy_import('pandas')
+
+
+##################################
+# Fingerprints
+##################################
+
+def _update_hash(hasher, obj):
+	"""Feeds a canonical byte representation of obj to hasher (recursively for containers)."""
+
+	# type name first, so equal-looking objects of different types (e.g. 1 and '1') differ
+	hasher.update(type(obj).__name__.encode())
+
+	if isinstance(obj, dict):
+		hasher.update(b'{')
+		for key_digest, value in sorted((fingerprint(key), value) for key, value in obj.items()):
+			hasher.update(key_digest.encode())
+			_update_hash(hasher, value)
+		hasher.update(b'}')
+
+	elif isinstance(obj, (list, tuple)) and all(type(element) in (str, int, float, bool) for element in obj):
+		# flat sequences (e.g. community vertices) are hashed at once
+		hasher.update(repr(obj).encode())
+
+	elif isinstance(obj, (list, tuple)):
+		hasher.update(b'[')
+		for element in obj:
+			_update_hash(hasher, element)
+		hasher.update(b']')
+
+	elif isinstance(obj, (set, frozenset)):
+		hasher.update(b'(')
+		for element_digest in sorted(fingerprint(element) for element in obj):
+			hasher.update(element_digest.encode())
+		hasher.update(b')')
+
+	elif isinstance(obj, pd.DataFrame):
+		_update_hash(hasher, [list(obj.columns), [str(dtype) for dtype in obj.dtypes]])
+		hasher.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+
+	elif isinstance(obj, (bytes, bytearray)):
+		hasher.update(obj)
+
+	elif isinstance(obj, np.ndarray):
+		_update_hash(hasher, [str(obj.dtype), obj.shape])
+		hasher.update(np.ascontiguousarray(obj).tobytes())
+
+	elif hasattr(obj, 'get_params'):
+		# estimators are identified by their class and parameters, except the threads budget
+		params = {param: value for param, value in obj.get_params().items() if param not in _CLASSIFIER_THREADS_PARAMS}
+		_update_hash(hasher, [type(obj).__module__, params])
+
+	else:
+		hasher.update(repr(obj).encode())
+
+
+def fingerprint(*objects):
+	"""Returns a hex digest identifying the content of the given objects."""
+
+	hasher = hashlib.sha256()
+	for obj in objects:
+		_update_hash(hasher, obj)
+	return hasher.hexdigest()
+
+
+##################################
+# Pipeline Cache
+##################################
+
+class PipelineCache:
+	"""
+	A class for caching pipeline stages' outputs on disk, addressed by a fingerprint of their inputs.
+
+	Each stage's key should be the fingerprint of its inputs, parameters and upstream stages' keys,
+	so a change anywhere upstream yields a new key. An entry is reused only if its key matches exactly,
+	and a stage keeps only its latest entry - stale entries are deleted when the stage is recomputed.
+
+	Attributes:
+		_dir_path: Directory holding a sub-directory of entries per stage.
+	"""
+
+	def __init__(self, dir_path: str):
+		"""
+		Parameters
+		----------
+		dir_path: A string indicating the cache directory path (created if it does not exist).
+		"""
+
+		self._dir_path = dir_path
+		os.makedirs(self._dir_path, exist_ok=True)
+
+	##################################
+	# Utility methods
+	##################################
+
+	def _entry_path(self, stage: str, key: str):
+		return os.path.join(self._dir_path, stage, f'{key}.pkl')
+
+	def _invalidate_stale_entries(self, stage: str, key: str):
+		"""Deletes all entries of the stage, except the entry of the given key."""
+
+		stage_dir_path = os.path.join(self._dir_path, stage)
+		for file_name in os.listdir(stage_dir_path):
+			if file_name != f'{key}.pkl':
+				os.remove(os.path.join(stage_dir_path, file_name))
+
+	##################################
+	# Main methods
+	##################################
+
+	def contains(self, stage: str, key: str):
+		return os.path.exists(self._entry_path(stage, key))
+
+	def load(self, stage: str, key: str):
+		with open(self._entry_path(stage, key), 'rb') as file:
+			return pickle.load(file)
+
+	def store(self, stage: str, key: str, value):
+		"""Stores a stage's output under the given key, and deletes the stage's stale entries."""
+
+		entry_path = self._entry_path(stage, key)
+		os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+		# write to a temporary file first, so a crashed write never leaves a corrupt entry
+		tmp_path = f'{entry_path}.tmp'
+		with open(tmp_path, 'wb') as file:
+			pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+		os.replace(tmp_path, entry_path)
+
+		self._invalidate_stale_entries(stage, key)
+
+	def get_or_compute(self, stage: str, key: str, compute):
+		"""
+		Returns a stage's cached output if its key is cached, and otherwise computes, stores and returns it.
+
+		Parameters
+		----------
+		stage: A string, the stage's name.
+		key: A string, the fingerprint of the stage's inputs.
+		compute: A function with no arguments, computing the stage's output.
+		"""
+
+		if self.contains(stage, key):
+			return self.load(stage, key)
+
+		value = compute()
+		self.store(stage, key, value)
+		return value
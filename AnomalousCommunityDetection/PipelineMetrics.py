@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+from .lazy_imports import lazy_import
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+pd = lazy_import('pandas')
+
+
+##################################
+# Utility functions
+##################################
+
+def max_rss():
+	"""Returns the peak resident set size of the process so far (in bytes), or None if unknown on the platform."""
+
+	if resource is None:
+		return None
+
+	# ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+	peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+
+##################################
+# Pipeline Metrics
+##################################
+
+class PipelineMetrics:
+	"""
+	A class for collecting a structured metrics record of each pipeline stage.
+
+	Each stage's record is a dict holding:
+		- 'stage': the stage's name,
+		- 'wall_time' and 'cpu_time': seconds the stage took (CPU time of the process running it),
+		- 'process_peak_rss': the process' lifetime peak resident set size (bytes) by the end of the stage - not the
+		  stage's own peak, which is only known if the stage raised the process' peak,
+		- 'process_peak_rss_increase': bytes by which the stage raised the process' peak resident set size,
+		- 'peak_traced_memory': peak bytes allocated by Python during the stage (only if memory is traced),
+		- counts set by the stage (e.g. 'edges', 'features', 'communities'),
+		- rates of these counts - 'edges_per_second', and 'features_per_second' (edges features values).
+
+	Records are passed to callbacks as soon as their stage ends (e.g. to push them to a monitoring system).
+	Callbacks are not sent to worker processes - records of stages run by workers are added when they join.
+	Stages may also be profiled, each into its own profile files (see StageProfiler).
+
+	Costs of stages may also be attributed to communities (see add_community_costs), to find the communities
+	dominating the pipeline's runtime.
+
+	Attributes:
+		_callbacks: Functions called with each stage's record.
+		_trace_memory: Whether to trace Python allocations (slows the pipeline down).
+		_profiler: A StageProfiler profiling each stage, or None.
+		_records: Stages' records, in order of completion.
+		_community_costs: DataFrames of per-community costs, each of a branch's stage.
+	"""
+
+	def __init__(self, callbacks: list = None, trace_memory: bool = False, profiler=None):
+		"""
+		Parameters
+		----------
+		callbacks: Optional; default None.
+			A list of functions, each called with a stage's record (a dict) when the stage ends.
+		trace_memory: Optional; default False.
+			A boolean to determine whether to trace each stage's peak Python allocations, with tracemalloc.
+		profiler: Optional; default None (no profiling).
+			A StageProfiler to profile each stage with.
+		"""
+
+		self._callbacks = list(callbacks) if callbacks is not None else []
+		self._trace_memory = trace_memory
+		self._profiler = profiler
+		self._records = []
+		self._community_costs = []
+
+	def __getstate__(self):
+		# callbacks may not be picklable, and should only run in the main process
+		state = self.__dict__.copy()
+		state['_callbacks'] = []
+		return state
+
+	@property
+	def records(self):
+		return list(self._records)
+
+	def to_df(self):
+		"""Returns the stages' records as a DataFrame, a row per stage."""
+		return pd.DataFrame(self._records)
+
+	def community_costs_df(self):
+		"""
+		Returns the per-community costs, summed over stages, as a DataFrame indexed by (branch, community).
+		Columns are the costs added (missing costs are 0).
+		"""
+
+		if len(self._community_costs) == 0:
+			return pd.DataFrame(index=pd.MultiIndex.from_tuples([], names=['branch', 'community']))
+
+		costs_df = pd.concat(self._community_costs, sort=False).fillna(0)
+		aggregations = {col: 'max' if col.startswith('max_') else 'sum' for col in costs_df.columns if col != 'branch'}
+		costs_df = costs_df.groupby(['branch', costs_df.index], sort=False).agg(aggregations)
+		costs_df.index.names = ['branch', 'community']
+		return costs_df
+
+	##################################
+	# Utility methods
+	##################################
+
+	@staticmethod
+	def _add_rates(record: dict):
+		wall_time = record['wall_time']
+		if wall_time <= 0 or 'edges' not in record:
+			return
+
+		record['edges_per_second'] = record['edges'] / wall_time
+		if 'features' in record:
+			record['features_per_second'] = record['edges'] * record['features'] / wall_time
+
+	##################################
+	# Main methods
+	##################################
+
+	def reset(self):
+		self._records = []
+		self._community_costs = []
+
+	def add(self, record: dict):
+		"""Adds a stage's record, and passes it to the callbacks."""
+
+		self._records.append(record)
+		for callback in self._callbacks:
+			callback(record)
+
+	def extend(self, records: list):
+		for record in records:
+			self.add(record)
+
+	def merge(self, metrics):
+		"""Adds the records and community costs of another PipelineMetrics (e.g. a worker's)."""
+
+		self.extend(metrics.records)
+		self._community_costs.extend(metrics._community_costs)
+
+	def add_community_costs(self, branch: str, costs_df: pd.DataFrame):
+		"""
+		Adds costs of a branch's (train or test) stage, attributed to communities.
+
+		Parameters
+		----------
+		branch: A string indicating the branch the communities belong to.
+		costs_df: A DataFrame indexed by community, with a column per cost (e.g. 'edges', 'features_time').
+		"""
+
+		self._community_costs.append(costs_df.assign(branch=branch))
+
+	def apportion_stages_time(self, branch: str, community_edges: pd.Series, stages: list, time_col: str):
+		"""
+		Attributes the wall time of vectorized stages (their last records) to communities, by their share of edges.
+
+		Parameters
+		----------
+		branch: A string indicating the branch the communities belong to.
+		community_edges: A Series of the number of edges of each community, processed by the stages.
+		stages: A list of stages' names.
+		time_col: A string indicating the name of the attributed time's cost column.
+		"""
+
+		last_records = {record['stage']: record for record in self._records}
+		stages_time = sum(last_records[stage]['wall_time'] for stage in stages if stage in last_records)
+
+		total_edges = community_edges.sum()
+		if total_edges == 0:
+			return
+		self.add_community_costs(branch, (community_edges * (stages_time / total_edges)).to_frame(time_col))
+
+	@contextmanager
+	def stage(self, name: str):
+		"""
+		A context manager measuring (and profiling, if there is a profiler) a stage.
+		Yields the stage's record, to which the stage may add counts.
+		"""
+
+		record = {'stage': name}
+
+		with self._profiler.profile(name) if self._profiler is not None else nullcontext():
+			with self._measure(record):
+				yield record
+
+	@contextmanager
+	def _measure(self, record: dict):
+		"""A context manager measuring a stage into its record."""
+
+		started_tracing = self._trace_memory and not tracemalloc.is_tracing()
+		if started_tracing:
+			tracemalloc.start()
+		if self._trace_memory:
+			tracemalloc.reset_peak()
+
+		start_peak_rss = max_rss()
+		start_wall_time, start_cpu_time = time.perf_counter(), time.process_time()
+		try:
+			yield record
+
+		finally:
+			record['wall_time'] = time.perf_counter() - start_wall_time
+			record['cpu_time'] = time.process_time() - start_cpu_time
+			record['process_peak_rss'] = max_rss()
+			if start_peak_rss is not None:
+				record['process_peak_rss_increase'] = record['process_peak_rss'] - start_peak_rss
+			if self._trace_memory:
+				record['peak_traced_memory'] = tracemalloc.get_traced_memory()[1]
+				if started_tracing:
+					tracemalloc.stop()
+
+			self._add_rates(record)
+			self.add(record)
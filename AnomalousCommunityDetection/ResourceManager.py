@@ -0,0 +1,154 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import os
+from copy import deepcopy
+from contextlib import contextmanager
+
+try:
+	from threadpoolctl import threadpool_limits
+except ImportError:
+	threadpool_limits = None
+
+
+##################################
+# Constants
+##################################
+
+# Environment variables read by native thread pools (BLAS, OpenMP) when they are loaded
+_NATIVE_THREADS_ENV_VARS = [
+	'OMP_NUM_THREADS',
+	'OPENBLAS_NUM_THREADS',
+	'MKL_NUM_THREADS',
+	'VECLIB_MAXIMUM_THREADS',
+	'NUMEXPR_NUM_THREADS',
+]
+
+# Classifier parameters which control the number of threads (sklearn-like and XGBoost estimators)
+_CLASSIFIER_THREADS_PARAMS = ['n_jobs', 'nthread', 'thread_count']
+
+
+##################################
+# Resource Manager
+##################################
+
+def available_cores():
+	"""Returns the number of cores the current process is allowed to run on."""
+
+	if hasattr(os, 'sched_getaffinity'):
+		return len(os.sched_getaffinity(0))
+	return os.cpu_count() or 1
+
+
+class ResourceManager:
+	"""
+	A class for coordinating the threads budget of a detection pipeline.
+
+	The pipeline may run up to n_jobs concurrent workers (processes or threads), and all of them together
+	may occupy up to max_threads threads. Each worker, and every native library it calls (the classifier,
+	BLAS and OpenMP pools), is handed an equal share of the budget, so that N concurrent detections on an
+	M-core host, each configured with max_threads=M//N, do not oversubscribe the cores.
+
+	Attributes:
+		_n_jobs: Number of concurrent pipeline workers.
+		_max_threads: Total number of threads the pipeline may occupy.
+	"""
+
+	def __init__(self, n_jobs: int = None, max_threads: int = None):
+		"""
+		Parameters
+		----------
+		n_jobs: Optional; default None (1 worker).
+			int, number of concurrent pipeline workers. -1 means one worker per available core.
+		max_threads: Optional; default None (all available cores).
+			int, total number of threads the pipeline may occupy.
+		"""
+
+		self._n_jobs = self._resolve(n_jobs, default=1)
+		self._max_threads = self._resolve(max_threads, default=available_cores())
+
+	@staticmethod
+	def _resolve(value, default):
+		"""Resolves None and negative (joblib-style) values to a positive number."""
+
+		if value is None:
+			return default
+
+		if value == 0:
+			raise ValueError('Number of jobs or threads must not be 0.')
+
+		# -1 means all cores, -2 all cores but one, etc.
+		if value < 0:
+			return max(1, available_cores() + 1 + value)
+
+		return value
+
+	##################################
+	# Properties
+	##################################
+
+	@property
+	def n_jobs(self):
+		"""Number of concurrent pipeline workers, never more than the threads budget."""
+		return min(self._n_jobs, self._max_threads)
+
+	@property
+	def max_threads(self):
+		return self._max_threads
+
+	@property
+	def threads_per_job(self):
+		"""Number of threads each worker (and the native libraries it calls) may occupy."""
+		return max(1, self._max_threads // self.n_jobs)
+
+	##################################
+	# Main methods
+	##################################
+
+	def configure_classifier(self, classifier_obj):
+		"""
+		Returns the classifier with its threads parameter (if it has one) set to the per-worker share.
+
+		The given classifier is left intact - if its threads parameter differs, a copy of it is configured instead.
+		"""
+
+		if not hasattr(classifier_obj, 'get_params'):
+			return classifier_obj
+
+		params = classifier_obj.get_params()
+		threads_params = {
+			param: self.threads_per_job for param in _CLASSIFIER_THREADS_PARAMS
+			if param in params and params[param] != self.threads_per_job}
+		if threads_params:
+			classifier_obj = deepcopy(classifier_obj)
+			classifier_obj.set_params(**threads_params)
+
+		return classifier_obj
+
+	@contextmanager
+	def limit_native_threads(self):
+		"""A context manager limiting already-loaded native thread pools to the per-worker share."""
+
+		if threadpool_limits is None:
+			yield
+			return
+
+		with threadpool_limits(limits=self.threads_per_job):
+			yield
+
+	def worker_initializer(self):
+		"""
+		Limits native thread pools of a newly started worker process.
+
+		Meant to be passed as the initializer of a process pool, before the worker loads any native library.
+		"""
+
+		for env_var in _NATIVE_THREADS_ENV_VARS:
+			os.environ[env_var] = str(self.threads_per_job)
+
+		if threadpool_limits is not None:
+			threadpool_limits(limits=self.threads_per_job)
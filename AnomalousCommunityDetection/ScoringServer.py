@@ -0,0 +1,297 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import json
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+
+##################################
+# Utility functions
+##################################
+
+def _namespaced(request_idx: int, name):
+	"""Returns a name (of a community or a vertex) prefixed by its request's index in a batch."""
+	return f'{request_idx}/{name}'
+
+
+def _error_response(request_id, message: str):
+	return {'id': request_id, 'error': message}
+
+
+##################################
+# Scoring Server
+##################################
+
+class ScoringServer:
+	"""
+	A local asyncio server scoring candidate communities with a fitted AnomalousCommunityDetector.
+
+	Clients connect over TCP and send newline-delimited JSON requests of form
+		{"id": <any>, "communities": {<community>: [<vertex>, ...], ...}}
+	and receive a newline-delimited JSON response per request, in order, of form
+		{"id": <id>, "scores": {<meta-feature>: {<community>: <score>, ...}, ...}}
+	or {"id": <id>, "error": <message>}. Lower scores are more anomalous.
+
+	Concurrent requests are coalesced into micro-batches - a batch is scored as a single test set, the disjoint
+	union of its requests' communities, with communities and vertices namespaced by request so requests do not
+	share vertices. Since all topological features are local to a vertex's connected component, each request is
+	scored as if it were scored alone, while feature extraction and predict_proba run once per batch.
+
+	Backpressure is applied by a bounded queue of pending requests - when it is full, connections stop reading
+	new requests until there is room (or the request times out).
+
+	Attributes:
+		_detector: The fitted detector.
+		_host: Host address to listen on.
+		_port: Port to listen on.
+		_label_thresh: Classification threshold(s) of the label-based meta-features.
+		_max_batch_size: Maximal number of requests in a batch.
+		_max_batch_delay: Maximal number of seconds to wait for more requests before scoring a batch.
+		_max_queue_size: Maximal number of pending requests.
+		_request_timeout: Maximal number of seconds a request may wait (in queue and being scored).
+		_queue: The pending requests queue (created when the server starts).
+		_server: The asyncio server (created when the server starts).
+		_batch_loop_task: The task scoring micro-batches (created when the server starts).
+		_executor: A single thread scoring batches off the event loop (created when the server starts).
+	"""
+
+	def __init__(
+			self,
+			detector,
+			host: str = '127.0.0.1',
+			port: int = 8765,
+			label_thresh=0.5,
+			max_batch_size: int = 32,
+			max_batch_delay: float = 0.01,
+			max_queue_size: int = 256,
+			request_timeout: float = 30.0):
+		"""
+		Parameters
+		----------
+		detector: A fitted AnomalousCommunityDetector (e.g. loaded with AnomalousCommunityDetector.load).
+		host: Optional; default '127.0.0.1'.
+		port: Optional; default 8765. 0 means an arbitrary free port (see the port property after starting).
+		label_thresh: Optional; default 0.5.
+			A float, or a list of floats, to determine the classification threshold(s) of the label-based
+			meta-features.
+		max_batch_size: Optional; default 32.
+			An int to determine the maximal number of requests scored together.
+		max_batch_delay: Optional; default 0.01.
+			A float to determine the maximal number of seconds to wait for more requests before scoring a batch.
+		max_queue_size: Optional; default 256.
+			An int to determine the maximal number of pending requests, before backpressure is applied.
+		request_timeout: Optional; default 30.0.
+			A float to determine the maximal number of seconds a request may wait for its scores.
+		"""
+
+		self._detector = detector
+		self._host = host
+		self._port = port
+		self._label_thresh = label_thresh
+		self._max_batch_size = max_batch_size
+		self._max_batch_delay = max_batch_delay
+		self._max_queue_size = max_queue_size
+		self._request_timeout = request_timeout
+
+		self._queue = None
+		self._server = None
+		self._batch_loop_task = None
+		self._executor = None
+
+	@property
+	def port(self):
+		"""The port the server listens on (the actual port, once started)."""
+
+		if self._server is not None and self._server.sockets:
+			return self._server.sockets[0].getsockname()[1]
+		return self._port
+
+	##################################
+	# Scoring
+	##################################
+
+	def _score_batch(self, requests_communities: list):
+		"""
+		Scores a batch of requests' communities at once.
+
+		Returns a list of each request's scores, of form {meta-feature: {community: score}}.
+		"""
+
+		# disjoint union of the requests' communities
+		batch_partitions_map = {
+			_namespaced(request_idx, comm): [_namespaced(request_idx, vertex) for vertex in vertices]
+			for request_idx, communities in enumerate(requests_communities)
+			for comm, vertices in communities.items()}
+
+		ranked_df = self._detector.score([batch_partitions_map], label_thresh=self._label_thresh)[0]
+
+		# scores of each namespaced community, by meta-feature
+		batch_scores = {
+			col: dict(zip(ranked_df[col.replace('score', 'ranking')], ranked_df[col].astype(float)))
+			for col in ranked_df.columns if col.endswith('__score')}
+
+		# split scores back to requests (communities without vertices have no scores)
+		return [
+			{
+				col: {
+					comm: col_scores[_namespaced(request_idx, comm)]
+					for comm in communities if _namespaced(request_idx, comm) in col_scores}
+				for col, col_scores in batch_scores.items()}
+			for request_idx, communities in enumerate(requests_communities)]
+
+	def _score_batch_isolated(self, requests_communities: list):
+		"""
+		Scores a batch of requests' communities, isolating failures - if the batch fails, each request is scored
+		alone, so only the failing requests fail.
+
+		Returns a list of each request's scores, or the exception it failed with.
+		"""
+
+		try:
+			return self._score_batch(requests_communities)
+		except Exception as exception:
+			if len(requests_communities) == 1:
+				return [exception]
+
+		results = []
+		for communities in requests_communities:
+			try:
+				results.append(self._score_batch([communities])[0])
+			except Exception as exception:
+				results.append(exception)
+
+		return results
+
+	async def _next_batch(self):
+		"""Waits for a request, then collects more requests until the batch is full or its delay passed."""
+
+		loop = asyncio.get_running_loop()
+
+		batch = [await self._queue.get()]
+		deadline = loop.time() + self._max_batch_delay
+		while len(batch) < self._max_batch_size:
+			remaining = deadline - loop.time()
+			if remaining <= 0:
+				break
+			try:
+				batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+			except asyncio.TimeoutError:
+				break
+
+		# skip requests which already timed out
+		return [(communities, future) for communities, future in batch if not future.done()]
+
+	async def _batch_loop(self):
+		"""Scores micro-batches of pending requests, one at a time, off the event loop."""
+
+		loop = asyncio.get_running_loop()
+
+		while True:
+			batch = await self._next_batch()
+			if len(batch) == 0:
+				continue
+
+			results = await loop.run_in_executor(
+				self._executor, self._score_batch_isolated, [communities for communities, _ in batch])
+
+			for (_, future), result in zip(batch, results):
+				if future.done():
+					continue
+				if isinstance(result, Exception):
+					future.set_exception(result)
+				else:
+					future.set_result(result)
+
+	##################################
+	# Connections
+	##################################
+
+	async def _handle_request(self, line: bytes):
+		"""Parses a request line, waits for its scores, and returns the response."""
+
+		try:
+			request = json.loads(line)
+			request_id = request.get('id')
+			communities = request['communities']
+			if not isinstance(communities, dict):
+				raise ValueError('"communities" must be an object mapping communities to vertices lists.')
+		except (ValueError, KeyError, AttributeError) as exception:
+			return _error_response(None, f'Invalid request: {exception}')
+
+		future = asyncio.get_running_loop().create_future()
+		try:
+			# the whole request (queueing included) is bounded by the timeout
+			await asyncio.wait_for(
+				self._enqueue_and_wait(communities, future), timeout=self._request_timeout)
+		except asyncio.TimeoutError:
+			future.cancel()
+			return _error_response(request_id, f'Timed out after {self._request_timeout} seconds.')
+		except Exception as exception:
+			return _error_response(request_id, f'Scoring failed: {exception}')
+
+		return {'id': request_id, 'scores': future.result()}
+
+	async def _enqueue_and_wait(self, communities: dict, future):
+		await self._queue.put((communities, future))
+		await asyncio.shield(future)
+
+	async def _handle_connection(self, reader, writer):
+		"""Serves a connection's requests one at a time, in order."""
+
+		try:
+			while True:
+				line = await reader.readline()
+				if not line:
+					break
+				if not line.strip():
+					continue
+
+				response = await self._handle_request(line)
+				writer.write(json.dumps(response).encode() + b'\n')
+				await writer.drain()
+
+		except ConnectionError:
+			pass
+
+		finally:
+			writer.close()
+
+	##################################
+	# Main methods
+	##################################
+
+	async def start(self):
+		"""Starts listening and scoring (returns once the server is listening)."""
+
+		self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+		self._executor = ThreadPoolExecutor(max_workers=1)
+		self._batch_loop_task = asyncio.ensure_future(self._batch_loop())
+		self._server = await asyncio.start_server(self._handle_connection, self._host, self._port)
+
+	async def stop(self):
+		"""Stops listening and scoring."""
+
+		self._server.close()
+		await self._server.wait_closed()
+		self._batch_loop_task.cancel()
+
+		# wait for a batch being scored, off the event loop
+		await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+	async def serve_forever(self):
+		await self.start()
+		async with self._server:
+			await self._server.serve_forever()
+
+	def run(self):
+		"""Runs the server until interrupted (blocking)."""
+
+		try:
+			asyncio.run(self.serve_forever())
+		except KeyboardInterrupt:
+			pass
@@ -0,0 +1,132 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import os
+import sys
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+
+##################################
+# Stack Sampler
+##################################
+
+def _frame_name(frame):
+	code = frame.f_code
+	return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class _StackSampler:
+	"""
+	A thread sampling another thread's call stack at a fixed interval, and counting the sampled stacks.
+
+	Attributes:
+		_thread_id: Identifier of the sampled thread.
+		_interval: Seconds between samples.
+		_stack_counts: A Counter of the sampled stacks (tuples of frame names, outermost first).
+		_stop_event: An event stopping the sampling.
+		_sampler: The sampling thread.
+	"""
+
+	def __init__(self, thread_id: int, interval: float):
+		self._thread_id = thread_id
+		self._interval = interval
+		self._stack_counts = Counter()
+		self._stop_event = threading.Event()
+		self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+	def _sample(self):
+		while not self._stop_event.wait(self._interval):
+			frame = sys._current_frames().get(self._thread_id)
+
+			stack = []
+			while frame is not None:
+				stack.append(_frame_name(frame))
+				frame = frame.f_back
+
+			if stack:
+				self._stack_counts[tuple(reversed(stack))] += 1
+
+	def start(self):
+		self._sampler.start()
+
+	def stop(self):
+		self._stop_event.set()
+		self._sampler.join()
+		return self._stack_counts
+
+
+##################################
+# Stage Profiler
+##################################
+
+class StageProfiler:
+	"""
+	A class for profiling pipeline stages, each into its own files.
+
+	Each stage is profiled both deterministically (cProfile) and by sampling its call stack, and writes 2 files
+	to the profiles directory:
+		- '<number>_<stage>.pstats' - cProfile statistics (e.g. for pstats or snakeviz),
+		- '<number>_<stage>.collapsed' - sampled call stacks in collapsed format ('frame;frame;frame count' lines,
+			outermost frame first), e.g. for flamegraph.pl or speedscope.
+	Stages run by worker processes are suffixed by the worker's process id.
+
+	Attributes:
+		_dir_path: The profiles directory.
+		_sampling_interval: Seconds between call stack samples.
+		_num_stages: Number of stages profiled so far (by this process).
+		_pid: Process id of the process which created the profiler.
+	"""
+
+	def __init__(self, dir_path: str, sampling_interval: float = 0.005):
+		"""
+		Parameters
+		----------
+		dir_path: A string indicating the profiles directory (created if it does not exist).
+		sampling_interval: Optional; default 0.005.
+			A float to determine the number of seconds between call stack samples.
+		"""
+
+		self._dir_path = dir_path
+		self._sampling_interval = sampling_interval
+		self._num_stages = 0
+		self._pid = os.getpid()
+
+	def _file_path_prefix(self, stage: str):
+		self._num_stages += 1
+		worker_suffix = '' if os.getpid() == self._pid else f'_pid{os.getpid()}'
+		return os.path.join(self._dir_path, f'{self._num_stages:03d}_{stage}{worker_suffix}')
+
+	@staticmethod
+	def _write_collapsed_stacks(stack_counts: Counter, file_path: str):
+		with open(file_path, 'w') as file:
+			for stack, count in stack_counts.most_common():
+				file.write(f'{";".join(stack)} {count}\n')
+
+	@contextmanager
+	def profile(self, stage: str):
+		"""A context manager profiling a stage, and writing its profile files when it ends."""
+
+		os.makedirs(self._dir_path, exist_ok=True)
+		file_path_prefix = self._file_path_prefix(stage)
+
+		profiler = cProfile.Profile()
+		sampler = _StackSampler(threading.get_ident(), self._sampling_interval)
+
+		sampler.start()
+		profiler.enable()
+		try:
+			yield
+
+		finally:
+			profiler.disable()
+			stack_counts = sampler.stop()
+
+			profiler.dump_stats(f'{file_path_prefix}.pstats')
+			self._write_collapsed_stacks(stack_counts, f'{file_path_prefix}.collapsed')
@@ -0,0 +1,42 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import sys
+import importlib.util
+
+
+##################################
+# Lazy Imports
+##################################
+
+def lazy_import(name: str):
+	"""
+	Returns a module which is only imported on first attribute access (e.g. pd.DataFrame), instead of now.
+
+	Heavy dependencies (pandas, networkx) are imported lazily, so that importing the package - e.g. by short-lived
+	CLI invocations and worker processes - does not pay for them until they are used.
+	Returns the module itself if it is already imported.
+
+	Parameters
+	----------
+	name: A string indicating the module's absolute name.
+	"""
+
+	if name in sys.modules:
+		return sys.modules[name]
+
+	spec = importlib.util.find_spec(name)
+	if spec is None:
+		raise ModuleNotFoundError(f'No module named \'{name}\'', name=name)
+
+	loader = importlib.util.LazyLoader(spec.loader)
+	spec.loader = loader
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[name] = module
+	loader.exec_module(module)
+
+	return module
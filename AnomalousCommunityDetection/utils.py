@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 __author__ = 'Shay Lapid'
 __email__ = 'lapidshay@gmail.com'
 
@@ -6,22 +8,31 @@ __email__ = 'lapidshay@gmail.com'
 ##################################
 
 import os
+import json
+import pickle
+import zipfile
 import numpy as np
-import pandas as pd
 from copy import deepcopy
-import networkx as nx
-from sklearn.model_selection import train_test_split
-from sklearn import metrics
+from .lazy_imports import lazy_import
+
+nx = lazy_import('networkx')
+pd = lazy_import('pandas')
 
 
 ##################################
 # Anomalous Community Detector Utils
 ##################################
 
-def checkpoint_paths(dir_path: str = None, save: bool = False):
+def checkpoint_paths(dir_path: str = None, save: bool = False, file_format: str = 'npz'):
+	"""
+	Returns train and test topological features checkpoint file paths.
+
+	file_format is 'npz' (compressed binary checkpoint) or 'csv' (legacy checkpoint).
+	"""
+
 	# file names
-	train_path = 'Train_Topological_Features.csv'
-	test_path = 'Test_Topological_Features.csv'
+	train_path = f'Train_Topological_Features.{file_format}'
+	test_path = f'Test_Topological_Features.{file_format}'
 
 	# id save_dir_path is not given, use a default
 	if dir_path is None:
@@ -38,17 +49,343 @@ def checkpoint_paths(dir_path: str = None, save: bool = False):
 	return train_path, test_path
 
 
-def load_topological_features_df(dir_path: str):
+def checkpoint_fingerprint_path(dir_path: str = None):
+	"""Returns the path of the file holding the fingerprint of the partition maps a checkpoint was extracted from."""
+
+	train_path, _ = checkpoint_paths(dir_path=dir_path, save=False)
+	return os.path.join(os.path.dirname(train_path), 'Topological_Features_Fingerprint.json')
+
+
+# checkpoint arrays holding the index and the column names (all other arrays are feature columns)
+_CHECKPOINT_INDEX_KEYS = ['__community_levels__', '__community_codes__', '__vertex_levels__', '__vertex_codes__']
+_CHECKPOINT_COLUMNS_KEY = '__columns__'
+
+
+def _edge_index_components(index: pd.Index):
+	"""Returns 2 sequences - the first and second vertices of each edge in a features DataFrame index."""
+
+	if isinstance(index, pd.MultiIndex):
+		return index.get_level_values(0), index.get_level_values(1)
+
+	edges = index.tolist()
+	if len(edges) > 0 and type(edges[0]) == str:
+		# split literal tuple strings of form '(community, vertex)'
+		edges = [string[1:-1].split(', ', 1) for string in edges]
+
+	return [edge[0] for edge in edges], [edge[1] for edge in edges]
+
+
+def save_features_checkpoint(df: pd.DataFrame, file_path: str):
+	"""
+	Saves a topological features DataFrame as a compressed binary checkpoint (a NumPy .npz archive).
+
+	Each feature column is stored as a separate typed array, so columns can be loaded selectively.
+	The (community, vertex) index is stored interned - unique names (levels) and integer codes per edge -
+	instead of literal tuple strings.
+	"""
+
+	index_arrays = []
+	for component in _edge_index_components(df.index):
+		codes, levels = pd.factorize(pd.Series(component, dtype=object).astype(str))
+		index_arrays += [np.array(levels, dtype=str), codes.astype(np.int32)]
+
+	arrays = {
+		**dict(zip(_CHECKPOINT_INDEX_KEYS, index_arrays)),
+		_CHECKPOINT_COLUMNS_KEY: np.array(df.columns, dtype=str),
+		**{col: df[col].to_numpy() for col in df.columns}}
+
+	# write an .npz archive (readable by np.load), with fast compression
+	with zipfile.ZipFile(file_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+		for name, array in arrays.items():
+			with archive.open(f'{name}.npy', 'w', force_zip64=True) as file:
+				np.lib.format.write_array(file, np.asanyarray(array), allow_pickle=False)
+
+
+def load_features_checkpoint(file_path: str, columns: list = None):
+	"""
+	Loads a topological features DataFrame from a compressed binary checkpoint.
+
+	Only the given columns (default all) are decompressed. The index is a (community, vertex) MultiIndex.
+	"""
+
+	with np.load(file_path, allow_pickle=False) as checkpoint:
+		if columns is None:
+			columns = list(checkpoint[_CHECKPOINT_COLUMNS_KEY])
+
+		comm_levels, comm_codes, vertex_levels, vertex_codes = [checkpoint[key] for key in _CHECKPOINT_INDEX_KEYS]
+		index = pd.MultiIndex(
+			levels=[pd.Index(comm_levels, dtype=object), pd.Index(vertex_levels, dtype=object)],
+			codes=[comm_codes, vertex_codes],
+			verify_integrity=False)
+
+		return pd.DataFrame({col: checkpoint[col] for col in columns}, index=index)
+
+
+def _migrate_csv_checkpoint(csv_path: str, npz_path: str):
+	"""Converts a legacy CSV features checkpoint to a binary checkpoint (once; the CSV file is kept)."""
+
+	print(f'Migrating checkpoint "{csv_path}" to binary checkpoint "{npz_path}"...')
+	save_features_checkpoint(pd.read_csv(csv_path, index_col=0), npz_path)
+
+
+def save_topological_features_df(
+		train_df: pd.DataFrame, test_df: pd.DataFrame, dir_path: str = None, partitions_maps_fingerprint: str = None):
+	# get train and test file paths (and create directory)
+	train_path, test_path = checkpoint_paths(dir_path=dir_path, save=True)
+
+	# write DataFrames to binary checkpoint files
+	save_features_checkpoint(train_df, train_path)
+	save_features_checkpoint(test_df, test_path)
+
+	# write the fingerprint of the partition maps the features were extracted from
+	if partitions_maps_fingerprint is not None:
+		with open(checkpoint_fingerprint_path(dir_path), 'w') as file:
+			json.dump({'partitions_maps': partitions_maps_fingerprint}, file)
+
+
+def load_checkpoint_fingerprint(dir_path: str):
+	"""Returns the fingerprint of the partition maps a checkpoint was extracted from, or None if unknown."""
+
+	fingerprint_path = checkpoint_fingerprint_path(dir_path)
+	if not os.path.exists(fingerprint_path):
+		return None
+
+	with open(fingerprint_path, 'r') as file:
+		return json.load(file)['partitions_maps']
+
+
+def load_topological_features_df(dir_path: str, columns: list = None):
+	"""
+	Loads train and test topological features DataFrames from a checkpoint directory.
+
+	Legacy CSV checkpoints are migrated to binary checkpoints on first load.
+	columns optionally selects the loaded columns (the label column should be included for training).
+	"""
+
 	# get train and test file paths
 	train_path, test_path = checkpoint_paths(dir_path=dir_path, save=False)
+	csv_train_path, csv_test_path = checkpoint_paths(dir_path=dir_path, save=False, file_format='csv')
 
-	# read CSV files to DataFrames
-	train_df = pd.read_csv(train_path, index_col=0)
-	test_df = pd.read_csv(test_path, index_col=0)
+	# migrate legacy CSV files
+	for npz_path, csv_path in [(train_path, csv_train_path), (test_path, csv_test_path)]:
+		if not os.path.exists(npz_path) and os.path.exists(csv_path):
+			_migrate_csv_checkpoint(csv_path, npz_path)
+
+	# read binary checkpoint files to DataFrames
+	train_df = load_features_checkpoint(train_path, columns=columns)
+	test_df = load_features_checkpoint(test_path, columns=columns)
 
 	return train_df, test_df
 
 
+##################################
+# Fitted Detector Persistence Utils
+##################################
+
+# Files of a saved fitted detector directory
+_DETECTOR_CONFIG_FILE = 'config.json'
+_DETECTOR_MODEL_FILE = 'model.pkl'
+_DETECTOR_COMMUNITIES_FILE = 'communities.json'
+_DETECTOR_VERTICES_FILE = 'vertices.json'
+_DETECTOR_INDPTR_FILE = 'incidence_indptr.npy'
+_DETECTOR_INDICES_FILE = 'incidence_indices.npy'
+_DETECTOR_TRAIN_FEATURES_FILE = 'train_topological_features.npz'
+
+
+def partitions_map_to_incidence_arrays(partitions_map: dict):
+	"""
+	Interns a partitions map into integer arrays.
+
+	Returns the communities and vertices intern tables, and the communities-vertices incidence matrix in CSR form:
+	the vertices codes of community i are indices[indptr[i]:indptr[i + 1]].
+	"""
+
+	communities = list(partitions_map.keys())
+	indices, vertices = pd.factorize(
+		pd.Series([vertex for comm_vertices in partitions_map.values() for vertex in comm_vertices], dtype=object))
+	indptr = np.r_[0, np.cumsum([len(comm_vertices) for comm_vertices in partitions_map.values()])].astype(np.int64)
+
+	return communities, vertices.tolist(), indptr, indices.astype(np.int64)
+
+
+def incidence_arrays_to_partitions_map(communities: list, vertices: list, indptr: np.ndarray, indices: np.ndarray):
+	"""Rebuilds a partitions map from its intern tables and CSR incidence arrays."""
+
+	return {
+		comm: [vertices[code] for code in indices[indptr[idx]:indptr[idx + 1]]]
+		for idx, comm in enumerate(communities)}
+
+
+def save_fitted_detector(
+		dir_path: str, config: dict, model_state: dict, train_partitions_map: dict, train_df: pd.DataFrame = None):
+	"""
+	Saves a fitted detector's state to a directory.
+
+	Parameters
+	----------
+	dir_path: A string indicating the directory path (created if it does not exist).
+	config: A JSON-serializable dict of the detector's configuration.
+	model_state: A dict of the trained classifier's state (pickled).
+	train_partitions_map: The partitions map the classifier was trained on, stored as intern tables
+		and CSR incidence arrays.
+	train_df: Optional; the train topological features DataFrame (needed only to update the classifier).
+	"""
+
+	os.makedirs(dir_path, exist_ok=True)
+
+	with open(os.path.join(dir_path, _DETECTOR_CONFIG_FILE), 'w') as file:
+		json.dump(config, file)
+
+	with open(os.path.join(dir_path, _DETECTOR_MODEL_FILE), 'wb') as file:
+		pickle.dump(model_state, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+	# train-side intern tables and incidence arrays
+	communities, vertices, indptr, indices = partitions_map_to_incidence_arrays(train_partitions_map)
+	with open(os.path.join(dir_path, _DETECTOR_COMMUNITIES_FILE), 'w') as file:
+		json.dump(communities, file)
+	with open(os.path.join(dir_path, _DETECTOR_VERTICES_FILE), 'w') as file:
+		json.dump(vertices, file)
+	np.save(os.path.join(dir_path, _DETECTOR_INDPTR_FILE), indptr)
+	np.save(os.path.join(dir_path, _DETECTOR_INDICES_FILE), indices)
+
+	train_features_path = os.path.join(dir_path, _DETECTOR_TRAIN_FEATURES_FILE)
+	if train_df is not None:
+		save_features_checkpoint(train_df, train_features_path)
+	elif os.path.exists(train_features_path):
+		os.remove(train_features_path)
+
+
+def load_fitted_detector(dir_path: str):
+	"""
+	Loads a fitted detector's state from a directory written by save_fitted_detector.
+
+	The incidence arrays are memory-mapped (read-only), so processes loading the same directory share one copy.
+
+	Returns
+	-------
+	config dict, model state dict, and a dict of the train-side communities and vertices intern tables and
+	incidence arrays (keys 'communities', 'vertices', 'indptr', 'indices').
+	"""
+
+	with open(os.path.join(dir_path, _DETECTOR_CONFIG_FILE), 'r') as file:
+		config = json.load(file)
+
+	with open(os.path.join(dir_path, _DETECTOR_MODEL_FILE), 'rb') as file:
+		model_state = pickle.load(file)
+
+	with open(os.path.join(dir_path, _DETECTOR_COMMUNITIES_FILE), 'r') as file:
+		communities = json.load(file)
+	with open(os.path.join(dir_path, _DETECTOR_VERTICES_FILE), 'r') as file:
+		vertices = json.load(file)
+	train_incidence = {
+		'communities': communities,
+		'vertices': vertices,
+		'indptr': np.load(os.path.join(dir_path, _DETECTOR_INDPTR_FILE), mmap_mode='r'),
+		'indices': np.load(os.path.join(dir_path, _DETECTOR_INDICES_FILE), mmap_mode='r'),
+	}
+
+	return config, model_state, train_incidence
+
+
+def load_fitted_detector_train_df(dir_path: str):
+	"""
+	Loads a saved fitted detector's train topological features DataFrame, or None if it was not saved.
+
+	The index is converted back to literal tuple strings (as extracted by FeatureExtractor), so rows of newly
+	extracted features can replace its rows.
+	"""
+
+	train_features_path = os.path.join(dir_path, _DETECTOR_TRAIN_FEATURES_FILE)
+	if not os.path.exists(train_features_path):
+		return None
+
+	train_df = load_features_checkpoint(train_features_path)
+	train_df.index = pd.Index([f'({comm}, {vertex})' for comm, vertex in train_df.index.tolist()], dtype=object)
+	return train_df
+
+
+##################################
+# Delta Detection State Utils
+##################################
+
+# Files of a delta detection state directory
+_DELTA_STATE_FILE = 'state.json'
+_DELTA_TEST_MAP_FILE = 'test_partitions_map.pkl'
+_DELTA_EDGE_PROBS_FILE = 'edge_probs.pkl'
+_DELTA_META_FEATURES_FILE = 'meta_features.pkl'
+
+
+def save_delta_state(
+		dir_path: str, state: dict, test_partitions_map: dict, edge_probs: dict, meta_feats_df: pd.DataFrame):
+	"""
+	Saves a delta detection run's state to a directory (created if it does not exist).
+
+	Parameters
+	----------
+	dir_path: A string indicating the directory path.
+	state: A JSON-serializable dict identifying the run's settings (e.g. the model's fingerprint).
+	test_partitions_map: The test set partition map of the run.
+	edge_probs: A dict mapping each community to a dict of its vertices' edges existence probabilities.
+	meta_feats_df: The run's meta-features DataFrame.
+	"""
+
+	os.makedirs(dir_path, exist_ok=True)
+
+	# the partition map is pickled, so its communities' and vertices' types (e.g. int keys, sets) are kept
+	contents = {
+		_DELTA_TEST_MAP_FILE: lambda file: pickle.dump(test_partitions_map, file, protocol=pickle.HIGHEST_PROTOCOL),
+		_DELTA_EDGE_PROBS_FILE: lambda file: pickle.dump(edge_probs, file, protocol=pickle.HIGHEST_PROTOCOL),
+		_DELTA_META_FEATURES_FILE: lambda file: pickle.dump(meta_feats_df, file, protocol=pickle.HIGHEST_PROTOCOL),
+		_DELTA_STATE_FILE: lambda file: file.write(json.dumps(state).encode()),
+	}
+
+	# write the new state to temporary files first, so a failing write leaves the previous state intact
+	try:
+		for file_name, write in contents.items():
+			with open(os.path.join(dir_path, f'{file_name}.tmp'), 'wb') as file:
+				write(file)
+	except Exception:
+		for file_name in contents:
+			if os.path.exists(os.path.join(dir_path, f'{file_name}.tmp')):
+				os.remove(os.path.join(dir_path, f'{file_name}.tmp'))
+		raise
+
+	# invalidate the previous state while its files are replaced, and replace the state file last,
+	# so a directory with a state file holds a complete state
+	state_path = os.path.join(dir_path, _DELTA_STATE_FILE)
+	if os.path.exists(state_path):
+		os.remove(state_path)
+	for file_name in contents:
+		os.replace(os.path.join(dir_path, f'{file_name}.tmp'), os.path.join(dir_path, file_name))
+
+
+def load_delta_state(dir_path: str):
+	"""
+	Loads a delta detection run's state saved with save_delta_state.
+
+	Returns the state dict, the test partition map, the edges existence probabilities dict and the meta-features
+	DataFrame, or None if the directory holds no state.
+	"""
+
+	# states saved before the partition map was pickled are not reused
+	state_path = os.path.join(dir_path, _DELTA_STATE_FILE)
+	if not os.path.exists(state_path) or not os.path.exists(os.path.join(dir_path, _DELTA_TEST_MAP_FILE)):
+		return None
+
+	with open(state_path, 'r') as file:
+		state = json.load(file)
+
+	with open(os.path.join(dir_path, _DELTA_TEST_MAP_FILE), 'rb') as file:
+		test_partitions_map = pickle.load(file)
+
+	with open(os.path.join(dir_path, _DELTA_EDGE_PROBS_FILE), 'rb') as file:
+		edge_probs = pickle.load(file)
+
+	meta_feats_df = pd.read_pickle(os.path.join(dir_path, _DELTA_META_FEATURES_FILE))
+
+	return state, test_partitions_map, edge_probs, meta_feats_df
+
+
 ##################################
 # BiPartite Creator Utils
 ##################################
@@ -104,6 +441,8 @@ def _get_partite_vertices(BPG, partite_label):
 
 def model_validation(model, X, y, val_size):
 	"""Model performance evaluation"""
+	from sklearn.model_selection import train_test_split
+
 	# split to train and validation sets, and split data and labels
 	train_X, val_X, train_y, val_y = train_test_split(X, y, test_size=val_size)
 
@@ -118,22 +457,49 @@ def model_validation(model, X, y, val_size):
 	return validation_scores
 
 
+def model_validation_auc(model, X, y, val_size, random_state: int = 0):
+	"""Returns the validation ROC AUC of a copy of the model, trained on the rest of the data."""
+	from sklearn.model_selection import train_test_split
+	from sklearn.metrics import roc_auc_score
+
+	# a stratified split, so small training sets are validated on both labels
+	train_X, val_X, train_y, val_y = train_test_split(
+		X, y, test_size=val_size, stratify=y, random_state=random_state)
+
+	model_copy = deepcopy(model)
+	model_copy.fit(train_X, train_y)
+	return roc_auc_score(val_y, model_copy.predict_proba(val_X)[:, 1])
+
+
+def geometric_sample_sizes(max_size: int, initial_size: int, growth: float = 2):
+	"""Returns geometrically growing sample sizes, from initial_size up to (and including) max_size."""
+
+	sizes = []
+	size = initial_size
+	while size < max_size:
+		sizes.append(int(size))
+		size *= growth
+
+	return sizes + [max_size]
+
+
 def get_classifier_scores(clf, X, y_true, data_name: str):
 	"""Returns dictionary with scores."""
+	from sklearn import metrics
 
 	# predict X using classifier
 	y_preds = clf.predict(X)
 
-	# scores
-	prc = metrics.precision_score(y_true, y_preds)
+	# scores (defined as 0 when nothing is predicted positive, e.g. a few test edges)
+	prc = metrics.precision_score(y_true, y_preds, zero_division=0)
 	acc = metrics.accuracy_score(y_true, y_preds)
-	f1 = metrics.f1_score(y_true, y_preds)
+	f1 = metrics.f1_score(y_true, y_preds, zero_division=0)
 	auc = None
 	if len(np.unique(y_true)) == 2:
 		auc = metrics.roc_auc_score(y_true, y_preds)
 
-	# confusion metrics
-	tn, fp, fn, tp = metrics.confusion_matrix(y_true, y_preds).ravel()
+	# confusion metrics (of both labels, even if all labels and predictions are the same)
+	tn, fp, fn, tp = metrics.confusion_matrix(y_true, y_preds, labels=[0, 1]).ravel()
 
 	# create a dictionary with all scores
 	output = {
@@ -199,6 +565,19 @@ def _index_tuple_literal_eval_with_ordering(string: str, comm_before_user: bool,
 	return (community, vertex) if comm_before_user else (vertex, community)
 
 
+def literal_tuple_strings_to_tuples(strings, comm_before_user: bool = True, vertex_to_int: bool = False):
+	"""Converts literal strings of form '(community, vertex)' to a list of tuples (community, vertex)."""
+
+	return [
+		_index_tuple_literal_eval_with_ordering(
+			string=string,
+			comm_before_user=comm_before_user,
+			vertex_to_int=vertex_to_int)
+		for string
+		in strings
+	]
+
+
 def convert_literal_tuple_string_index_to_tuple(
 		df: pd.DataFrame, comm_before_user: bool = True, vertex_to_int: bool = False):
 	"""
@@ -220,5 +599,6 @@ def convert_literal_tuple_string_index_to_tuple(
 		in df.itertuples()
 	]
 
-	# convert back to index
+	# convert back to index, and drop the literal string column
 	df.set_index('evaluated_index', inplace=True)
+	df.drop(columns='index', inplace=True)
@@ -11,7 +11,9 @@ import json
 from os import path
 from datetime import datetime
 from tqdm.autonotebook import tqdm
+from concurrent.futures import ProcessPoolExecutor
 from Baselines.UnAttributedAMEN import UnAttributedAMEN
+from AnomalousCommunityDetection.ResourceManager import ResourceManager
 
 
 ##################################
@@ -19,10 +21,21 @@ from Baselines.UnAttributedAMEN import UnAttributedAMEN
 ##################################
 
 class CommunityRanker:
-	def __init__(self, G: nx.Graph, file_name_prefix: str = None):
+	def __init__(self, G: nx.Graph, file_name_prefix: str = None, n_jobs: int = None, max_threads: int = None):
+		"""
+		Parameters
+		----------
+		G: nx.Graph, the network the communities belong to.
+		file_name_prefix: Optional; a string to prefix saved ranking files names.
+		n_jobs: Optional; default None (1 worker).
+			int, number of measures to rank concurrently, each in a separate process.
+		max_threads: Optional; default None (all available cores).
+			int, total number of threads the ranking may occupy.
+		"""
 		self._G = G
 		self._file_name_prefix = file_name_prefix
 		self._unattributed_amen = UnAttributedAMEN(G)
+		self._resources = ResourceManager(n_jobs=n_jobs, max_threads=max_threads)
 
 	##################################
 	# Measures scores
@@ -119,11 +132,12 @@ class CommunityRanker:
 
 		sort_reverse = False if by in ['avg_degree', 'unattr_amen'] else True
 
-		scores = [
-			(comm_name, score_func(comm_vertices))
-			for comm_name, comm_vertices
-			in tqdm(partitions_map.items())
-		]
+		with self._resources.limit_native_threads():
+			scores = [
+				(comm_name, score_func(comm_vertices))
+				for comm_name, comm_vertices
+				in tqdm(partitions_map.items())
+			]
 
 		scores.sort(key=lambda x: x[1], reverse=sort_reverse)
 
@@ -143,13 +157,26 @@ class CommunityRanker:
 		if rank_by is None:
 			rank_by = ['avg_degree', 'cut_ratio', 'conductance', 'flake_odf', 'avg_odf', 'unattr_amen']
 
+		if exclude_amen and 'unattr_amen' in rank_by:
+			print('Skipping AMEN\n')
+			rank_by = [measure for measure in rank_by if measure != 'unattr_amen']
+
+		# rank by each measure, concurrently if the threads budget allows more than one worker
+		if self._resources.n_jobs > 1 and len(rank_by) > 1:
+			with ProcessPoolExecutor(
+					max_workers=min(self._resources.n_jobs, len(rank_by)),
+					initializer=self._resources.worker_initializer) as executor:
+				measures_rankings = executor.map(
+					self.rank_communities_by, [partitions_map] * len(rank_by), rank_by)
+				measures_rankings = dict(zip(rank_by, measures_rankings))
+		else:
+			measures_rankings = {}
+			for measure in rank_by:
+				print(f'Ranking by "{measure}"...')
+				measures_rankings[measure] = self.rank_communities_by(partitions_map=partitions_map, by=measure)
+
 		output = {}
-		for measure in rank_by:
-			if exclude_amen and measure == 'unattr_amen':
-				print('Skipping AMEN\n')
-				continue
-			print(f'Ranking by "{measure}"...')
-			measure_ranking = self.rank_communities_by(partitions_map=partitions_map, by=measure)
+		for measure, measure_ranking in measures_rankings.items():
 			ranking, scores = zip(*measure_ranking)
 			output[f'{measure}__ranking'] = ranking
 			output[f'{measure}__score'] = scores
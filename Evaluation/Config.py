@@ -5,10 +5,17 @@ from xgboost import XGBClassifier
 # Anomaly Detector Config
 ##################################
 
+# Threads budget of a single experiment process - None means all available cores.
+# When running P experiment processes in parallel on an M-core host, set MAX_THREADS to M // P,
+# so that the processes do not oversubscribe the cores.
+MAX_THREADS = None
+
 DETECTOR_CONFIG = {
 	'community_partite_label': 'Community',
 	'vertex_partite_label': 'Vertex',
 	'classifer_obj': XGBClassifier(),
+	'n_jobs': 1,
+	'max_threads': MAX_THREADS,
 }
 
 DETECTION_CONFIG = {
@@ -8,6 +8,7 @@ __email__ = 'lapidshay@gmail.com'
 import os
 import json
 from datetime import datetime
+from contextlib import nullcontext
 import networkx as nx
 import pandas as pd
 from os.path import join
@@ -18,6 +19,7 @@ original_cur_dir = os.getcwd()
 os.chdir('..')
 #os.chdir('..')  # Comment this row if using jupyter notebook
 from AnomalousCommunityDetection.AnomalousCommunityDetector import AnomalousCommunityDetector
+from AnomalousCommunityDetection.StageProfiler import StageProfiler
 from BaselineComparison.CommunityRanker import CommunityRanker
 os.chdir(original_cur_dir)
 
@@ -27,7 +29,7 @@ os.chdir(original_cur_dir)
 ##################################
 
 class Experiment:
-	def __init__(self, experiment_main_dir_path, detector_config, detection_config):
+	def __init__(self, experiment_main_dir_path, detector_config, detection_config, profile: str = None):
 		"""
 		A class that perform a single experiment
 
@@ -36,6 +38,9 @@ class Experiment:
 		experiment_main_dir_path: directory path of specific experiment.
 		detector_config: a dict with detector configuration kwargs.
 		detection_config: a dict with detectoion configuration kwargs.
+		profile: optional; default None (no profiling).
+			directory path to write profiles of each experiment's pipeline stages and baselines to
+			(in a sub-directory per size group and experiment, see StageProfiler).
 		"""
 
 		# Paths
@@ -47,6 +52,9 @@ class Experiment:
 		self._detector_config = detector_config
 		self._detection_config = detection_config
 
+		# Profiles directory
+		self._profile_dir_path = profile
+
 	##################################
 	# Utility Functions
 	##################################
@@ -123,23 +131,42 @@ class Experiment:
 	# Main Experiment Functions
 	##################################
 
-	def _detect_anomalies(self, train_partitions_map, test_partitions_map):
+	def _experiment_profile_dir_path(self, size_group: str, enumeration: int):
+		if self._profile_dir_path is None:
+			return None
+		return join(self._profile_dir_path, size_group, str(enumeration))
+
+	def _detect_anomalies(self, train_partitions_map, test_partitions_map, profile_dir_path: str = None):
+		# the experiment's profile directory overrides a profile directory of the detector's configuration
+		detector_config = dict(self._detector_config)
+		if profile_dir_path is not None:
+			detector_config['profile'] = profile_dir_path
+
 		detector = AnomalousCommunityDetector(
 			train_partitions_map=train_partitions_map,
 			test_partitions_map=test_partitions_map,
-			**self._detector_config
+			**detector_config
 		)
 
 		results = detector.detect_anomalous_communities(**self._detection_config)
 		return results
 
-	@staticmethod
-	def _baseline_community_rank(G: nx.Graph, test_partitions_map: dict, rank_by: list, exclude_amen: bool):
+	def _baseline_community_rank(
+			self, G: nx.Graph, test_partitions_map: dict, rank_by: list, exclude_amen: bool,
+			profile_dir_path: str = None):
 		"""Ranks communities by baseline algorithms (including AMEN)"""
 
-		community_ranker = CommunityRanker(G)
-		ranking_scores = community_ranker.rank_communities_by_all_measures(
-			partitions_map=test_partitions_map, rank_by=rank_by, exclude_amen=exclude_amen)
+		# baselines share the detector's threads budget
+		community_ranker = CommunityRanker(
+			G,
+			n_jobs=self._detector_config.get('n_jobs'),
+			max_threads=self._detector_config.get('max_threads'))
+
+		# profile baselines as a single stage (of this process - measures ranked by worker processes are not profiled)
+		profiler = StageProfiler(profile_dir_path).profile('baselines') if profile_dir_path is not None else nullcontext()
+		with profiler:
+			ranking_scores = community_ranker.rank_communities_by_all_measures(
+				partitions_map=test_partitions_map, rank_by=rank_by, exclude_amen=exclude_amen)
 		return pd.DataFrame.from_dict(ranking_scores)
 
 	def perform_single_experiment(
@@ -171,7 +198,8 @@ class Experiment:
 		test_partitions_map = self._read_partition_map(test_partitions_maps_file_path)
 
 		# Detect anomalies (Our algorithm)
-		my_results = self._detect_anomalies(train_partitions_map, test_partitions_map)
+		profile_dir_path = self._experiment_profile_dir_path(size_group, enumeration)
+		my_results = self._detect_anomalies(train_partitions_map, test_partitions_map, profile_dir_path=profile_dir_path)
 
 		# Rank communities (Baseline algorithms)
 		G = self._read_edge_list(test_network_file_path)  # load network
@@ -179,7 +207,8 @@ class Experiment:
 			G=G,
 			test_partitions_map=test_partitions_map,
 			rank_by=rank_by,
-			exclude_amen=exclude_amen)
+			exclude_amen=exclude_amen,
+			profile_dir_path=profile_dir_path)
 
 		# Log experiment
 		log_dict = self._log_single_network(
@@ -251,7 +280,8 @@ def perform_all_experiments(
 		baselines: list = None,
 		exclude_amen: bool = False,
 		max_experiments: int = 10,
-		dir_idx_tuple: tuple = None):
+		dir_idx_tuple: tuple = None,
+		profile: str = None):
 
 	exp_dirs = [d for d in listdir(experiment_dir) if d != 'Raw_data']
 	if dir_idx_tuple:
@@ -261,8 +291,10 @@ def perform_all_experiments(
 	for exp_dir in exp_dirs:
 		print(f'\n################\n################\n\tBeginning "{exp_dir}" experiments directory...\n################\n################\n')
 		exp_dir_path = join(experiment_dir, exp_dir)
+		exp_profile = join(profile, exp_dir) if profile is not None else None
 		exp = Experiment(
-			experiment_main_dir_path=exp_dir_path, detector_config=detector_config, detection_config=detection_config)
+			experiment_main_dir_path=exp_dir_path, detector_config=detector_config, detection_config=detection_config,
+			profile=exp_profile)
 		exp.perform_all_size_groups_experiments(
 			num_anom_comms=num_anom_comms, rank_by=baselines, exclude_amen=exclude_amen, max_experiments=max_experiments)
 
@@ -270,10 +302,12 @@ def perform_all_experiments(
 def perform_specific_experiments(
 		exp_dir_path: str, size_groups: list,
 		detector_config: dict, detection_config: dict, num_anom_comms:int = 10,
-		baselines: list=None, exclude_amen:bool=False, max_experiments: int=10):
+		baselines: list=None, exclude_amen:bool=False, max_experiments: int=10, profile: str = None):
 
 	print(f'\n################\n################\n\tBeginning "{exp_dir_path}" experiments directory...\n################\n################\n')
-	exp = Experiment(experiment_main_dir_path=exp_dir_path, detector_config=detector_config, detection_config=detection_config)
+	exp = Experiment(
+		experiment_main_dir_path=exp_dir_path, detector_config=detector_config, detection_config=detection_config,
+		profile=profile)
 	for size_group in size_groups:
 		exp.perform_single_size_group_experiments(
 			size_group=size_group,
@@ -0,0 +1,108 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+##################################
+# Constants
+##################################
+
+# package modules whose import time is benchmarked
+_MODULES = [
+	'AnomalousCommunityDetection.AnomalousCommunityDetector',
+	'AnomalousCommunityDetection.ScoringServer',
+	'AnomalousCommunityDetection.MembershipStream',
+	'AnomalousCommunityDetection.CostEstimator',
+]
+
+# dependencies which should only be imported on first use
+_HEAVY_MODULES = ['xgboost', 'sklearn', 'networkx', 'pandas', 'tqdm', 'matplotlib', 'seaborn']
+
+# the package's root directory (modules are imported from it)
+_ROOT_DIR_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+##################################
+# Import Time Benchmark
+##################################
+
+def _import_module(module: str):
+	"""Imports a module in a fresh interpreter, and returns its import seconds and the heavy modules it imported."""
+
+	code = (
+		f'import sys, json, time\n'
+		f'start_time = time.perf_counter()\n'
+		f'import {module}\n'
+		f'seconds = time.perf_counter() - start_time\n'
+		f'heavy_modules = [name for name in {_HEAVY_MODULES!r} if name in sys.modules and '
+		f'not type(sys.modules[name]).__name__ == "_LazyModule"]\n'
+		f'print(json.dumps({{"seconds": seconds, "heavy_modules": heavy_modules}}))')
+
+	output = subprocess.run(
+		[sys.executable, '-c', code], cwd=_ROOT_DIR_PATH, capture_output=True, text=True, check=True).stdout
+	return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark_import_times(modules: list = None, repeats: int = 5):
+	"""
+	Benchmarks the import time of package modules, each imported in fresh interpreters.
+
+	Parameters
+	----------
+	modules: Optional; default None (the package's main modules).
+		A list of module names to import.
+	repeats: Optional; default 5. Number of fresh interpreters to import each module in.
+
+	Returns
+	-------
+	A dict of form {module: {'median_seconds': float, 'heavy_modules': list}}, where heavy_modules are the slow
+	dependencies the module imported eagerly (which should be empty).
+	"""
+
+	modules = modules if modules is not None else _MODULES
+
+	report = {}
+	for module in modules:
+		runs = [_import_module(module) for _ in range(repeats)]
+		report[module] = {
+			'median_seconds': statistics.median(run['seconds'] for run in runs),
+			'heavy_modules': sorted({name for run in runs for name in run['heavy_modules']})}
+
+	return report
+
+
+def print_import_times_report(report: dict):
+	for module, module_report in report.items():
+		heavy_modules = ', '.join(module_report['heavy_modules']) or 'none'
+		print(f'{module}: {module_report["median_seconds"] * 1000:.1f} ms (eagerly imported: {heavy_modules})')
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmarks the package modules\' import time.')
+	parser.add_argument('modules', nargs='*', default=None, help='Modules to import (default the main modules).')
+	parser.add_argument('--repeats', type=int, default=5)
+	parser.add_argument(
+		'--max-seconds', type=float, default=None,
+		help='Fail (exit code 1) if a module\'s median import time exceeds this.')
+	args = parser.parse_args()
+
+	report = benchmark_import_times(modules=args.modules or None, repeats=args.repeats)
+	print_import_times_report(report)
+
+	# a regression - a slow import, or a heavy dependency imported eagerly
+	regressions = [
+		module for module, module_report in report.items()
+		if module_report['heavy_modules'] or (
+			args.max_seconds is not None and module_report['median_seconds'] > args.max_seconds)]
+	if regressions:
+		print(f'Import time regressions: {", ".join(regressions)}')
+		sys.exit(1)
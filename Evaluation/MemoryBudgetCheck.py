@@ -0,0 +1,134 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+##################################
+# Memory Budget Check
+##################################
+
+def _seeded(seed: int, run):
+	"""Runs a function with the random generators seeded, so that both runs sample the same edges."""
+
+	random.seed(seed)
+	np.random.seed(seed)
+	return run()
+
+
+def _scores_by_community(ranked: pd.DataFrame):
+	"""Returns each meta-feature's scores, as a DataFrame indexed by community."""
+
+	meta_features = [col[:-len('__score')] for col in ranked.columns if col.endswith('__score')]
+	return pd.DataFrame({
+		meta_feature: pd.Series(
+			ranked[f'{meta_feature}__score'].to_numpy(dtype=float), index=ranked[f'{meta_feature}__ranking'])
+		for meta_feature in meta_features})
+
+
+def compare_rankings(ranked: pd.DataFrame, reference_ranked: pd.DataFrame, atol: float = 1e-9):
+	"""
+	Compares a ranking with a reference ranking of the same communities, community by community.
+
+	Returns
+	-------
+	A DataFrame with a row per meta-feature - the maximal absolute difference of a community's score
+	('max_score_diff'), and whether all scores match within atol ('match').
+	"""
+
+	scores_df = _scores_by_community(ranked)
+	reference_scores_df = _scores_by_community(reference_ranked).reindex(scores_df.index)
+	score_diffs = (scores_df - reference_scores_df).abs()
+
+	return pd.DataFrame({
+		'max_score_diff': score_diffs.max(),
+		'match': (score_diffs <= atol).all() & (scores_df.isna() == reference_scores_df.isna()).all()})
+
+
+def check_memory_budget(
+		train_partitions_map: dict,
+		test_partitions_map: dict,
+		memory_budget: int = 10 ** 6,
+		val_size: float = 0.1,
+		seed: int = 0,
+		atol: float = 1e-9):
+	"""
+	Runs the detector in memory and memory-budgeted (out-of-core, see AnomalousCommunityDetector), on the same
+	sampled edges, and compares the rankings - of detect_anomalous_communities, and of fit and score.
+
+	The in-memory run accumulates meta-features chunk by chunk, as the memory-budgeted run does, so that both
+	rankings have the same (approximate) medians.
+
+	Parameters
+	----------
+	train_partitions_map: dict, Train set partition map indicating each community's belonging vertices.
+	test_partitions_map: dict, Test set partition map indicating each community's belonging vertices.
+	memory_budget: Optional; default 10 ** 6. Number of bytes of the memory-budgeted runs.
+	val_size: Optional; default 0.1. Train/validation split of the link-prediction classifier evaluation.
+	seed: Optional; default 0. Random seed of both runs' edges sampling.
+	atol: Optional; default 1e-9. Absolute tolerance of matching scores.
+
+	Returns
+	-------
+	A DataFrame with a row per run ('detect' and 'fit_score') and meta-feature (see compare_rankings).
+	"""
+
+	from AnomalousCommunityDetection.AnomalousCommunityDetector import AnomalousCommunityDetector
+
+	prob_chunk_size = sys.maxsize
+	comparisons = {}
+
+	with tempfile.TemporaryDirectory() as scratch_dir_path:
+
+		def detect(**detector_kwargs):
+			detector = AnomalousCommunityDetector(train_partitions_map, test_partitions_map, **detector_kwargs)
+			return detector.detect_anomalous_communities(val_size=val_size, prob_chunk_size=prob_chunk_size)
+
+		def fit_score(**detector_kwargs):
+			detector = AnomalousCommunityDetector(**detector_kwargs).fit(train_partitions_map, val_size=val_size)
+			return detector.score([test_partitions_map], prob_chunk_size=prob_chunk_size)[0]
+
+		budget_kwargs = {'memory_budget': memory_budget, 'scratch_dir_path': scratch_dir_path}
+		for run_name, run in [('detect', detect), ('fit_score', fit_score)]:
+			reference_ranked = _seeded(seed, run)
+			ranked = _seeded(seed, lambda: run(**budget_kwargs))
+			comparisons[run_name] = compare_rankings(ranked, reference_ranked, atol=atol)
+
+	return pd.concat(comparisons, names=['run', 'meta_feature'])
+
+
+if __name__ == '__main__':
+	# run as a script (python Evaluation/MemoryBudgetCheck.py), import the package from the parent directory
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+	parser = argparse.ArgumentParser(
+		description='Checks that a memory-budgeted detection ranks communities as an in-memory detection does.')
+	parser.add_argument('train_partitions_map_path', help='JSON train partition map.')
+	parser.add_argument('test_partitions_map_path', help='JSON test partition map.')
+	parser.add_argument('--memory-budget', type=int, default=10 ** 6, help='Bytes of the memory-budgeted runs.')
+	parser.add_argument('--val-size', type=float, default=0.1)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+
+	with open(args.train_partitions_map_path, 'r') as file:
+		train_partitions_map = json.load(file)
+	with open(args.test_partitions_map_path, 'r') as file:
+		test_partitions_map = json.load(file)
+
+	comparison_df = check_memory_budget(
+		train_partitions_map, test_partitions_map, memory_budget=args.memory_budget, val_size=args.val_size,
+		seed=args.seed)
+	print(comparison_df)
+
+	sys.exit(0 if comparison_df['match'].all() else 1)
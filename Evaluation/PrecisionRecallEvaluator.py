@@ -5,8 +5,7 @@ __email__ = 'lapidshay@gmail.com'
 # Imports
 ##################################
 
-from sklearn.metrics import precision_recall_curve, average_precision_score
-import matplotlib.pyplot as plt
+# sklearn and matplotlib are slow to import, so they are imported on first use
 
 
 class PrecisionRecallEvaluator:
@@ -33,6 +32,7 @@ class PrecisionRecallEvaluator:
 
 	def get_avg_precision(self, reverse=False):
 		"""Return average precision."""
+		from sklearn.metrics import average_precision_score
 
 		if reverse:
 			self._df[self._score_column] = - self._df[self._score_column]
@@ -40,6 +40,8 @@ class PrecisionRecallEvaluator:
 
 	def plot_precision_recall(self, reverse=False):
 		"""Plots precision-recall curve."""
+		from sklearn.metrics import precision_recall_curve
+		import matplotlib.pyplot as plt
 
 		if reverse:
 			self._df[self._score_column] = - self._df[self._score_column]
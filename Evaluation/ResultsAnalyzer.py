@@ -11,17 +11,30 @@ import json
 import numpy as np
 from os.path import join
 from os import listdir
+from functools import lru_cache
 from PrecisionRecallEvaluator import PrecisionRecallEvaluator as Evaluator
-import seaborn as sns
-import matplotlib.pyplot as plt
-import matplotlib
 
 ##################################
-# Constants
+# Plotting Libraries
 ##################################
 
-matplotlib.rcParams['legend.loc'] = 'lower right'
-matplotlib.rcParams['legend.fontsize'] = 9
+@lru_cache(maxsize=None)
+def _plotting_modules():
+	"""Imports the plotting libraries on first plot (they are slow to import), and returns pyplot and seaborn."""
+
+	import matplotlib
+	import matplotlib.pyplot as plt
+	import seaborn as sns
+
+	matplotlib.rcParams['legend.loc'] = 'lower right'
+	matplotlib.rcParams['legend.fontsize'] = 9
+
+	return plt, sns
+
+
+##################################
+# Constants
+##################################
 
 _ALL_SIZE_GROUPS = ['min', 'quantile10', 'quartile1', 'median', 'random']
 
@@ -270,6 +283,7 @@ class ResultsAnalyzer:
 
 	@staticmethod
 	def plot_meta_features_comparison_single_p_diff_size_groups(comp_df, p):
+		plt, sns = _plotting_modules()
 
 		# Dirty fix to drop median meta-feature
 		if 'normality_prob_median' in comp_df.columns:
@@ -362,6 +376,8 @@ class ResultsAnalyzer:
 
 	@staticmethod
 	def plot_single_p_diff_ms_and_size_groups(comp_df, p):
+		plt, sns = _plotting_modules()
+
 		fig, axes = plt.subplots(1, 2, figsize=(17, 6), tight_layout=True)
 		sns.lineplot(data=comp_df.T, ax=axes[0], dashes=False)
 		sns.lineplot(data=comp_df, ax=axes[1], dashes=False)
@@ -434,6 +450,8 @@ class ResultsAnalyzer:
 
 	@staticmethod
 	def plot_single_m_diff_ps_and_size_groups(comp_df, m):
+		plt, sns = _plotting_modules()
+
 		fig, axes = plt.subplots(1, 2, figsize=(17, 6), tight_layout=True)
 		sns.lineplot(data=comp_df.T, ax=axes[0], dashes=False)
 		sns.lineplot(data=comp_df, ax=axes[1], dashes=False)
@@ -506,6 +524,8 @@ class ResultsAnalyzer:
 
 	@staticmethod
 	def plot_single_size_group_diff_ps_and_ms(comp_df, size_group):
+		plt, sns = _plotting_modules()
+
 		fig, axes = plt.subplots(1, 2, figsize=(17, 6), tight_layout=True)
 		sns.lineplot(data=comp_df.T, ax=axes[0], dashes=False)
 		sns.lineplot(data=comp_df, ax=axes[1], dashes=False)
@@ -578,6 +598,8 @@ class ResultsAnalyzer:
 		return comp_df
 
 	def plot_baseline_comparison(self, meta_feature: str, reverse: bool = False):
+		plt, sns = _plotting_modules()
+
 		# create horizontal line of subplots, using with len(size_groups) subplots
 		fig, axes = plt.subplots(
 			len(self._ALL_MS), len(_ALL_SIZE_GROUPS),
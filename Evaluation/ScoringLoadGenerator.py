@@ -0,0 +1,150 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import numpy as np
+
+
+##################################
+# Load Generator
+##################################
+
+def _create_requests(partitions_map: dict, num_requests: int, communities_per_request: int, seed: int = 0):
+	"""Creates scoring requests, each of a random sample of the partitions map's communities."""
+
+	rand = random.Random(seed)
+	communities = list(partitions_map.keys())
+	num_sampled = min(communities_per_request, len(communities))
+
+	return [
+		{'id': request_idx, 'communities': {comm: partitions_map[comm] for comm in rand.sample(communities, num_sampled)}}
+		for request_idx in range(num_requests)]
+
+
+async def _client(host: str, port: int, requests: list, latencies: list, errors: list):
+	"""Sends requests over a single connection, one at a time, and records each request's latency."""
+
+	reader, writer = await asyncio.open_connection(host, port)
+
+	try:
+		for request in requests:
+			start_time = time.perf_counter()
+			writer.write(json.dumps(request).encode() + b'\n')
+			await writer.drain()
+			response = json.loads(await reader.readline())
+			latencies.append(time.perf_counter() - start_time)
+
+			if 'error' in response:
+				errors.append(response['error'])
+
+	finally:
+		writer.close()
+
+
+async def generate_load(
+		host: str,
+		port: int,
+		partitions_map: dict,
+		num_clients: int = 8,
+		requests_per_client: int = 50,
+		communities_per_request: int = 5,
+		seed: int = 0):
+	"""
+	Sends scoring requests from concurrent clients to a ScoringServer, and reports latency and throughput.
+
+	Parameters
+	----------
+	host: The server's host address.
+	port: The server's port.
+	partitions_map: dict, a partition map to sample the requests' communities from.
+	num_clients: Optional; default 8. Number of concurrent connections.
+	requests_per_client: Optional; default 50. Number of requests each connection sends, one at a time.
+	communities_per_request: Optional; default 5. Number of communities in each request.
+	seed: Optional; default 0. Random seed of the requests' communities sampling.
+
+	Returns
+	-------
+	A dict of the number of requests and errors, p50 and p99 latencies (seconds) and throughput (requests per second).
+	"""
+
+	requests = _create_requests(partitions_map, num_clients * requests_per_client, communities_per_request, seed)
+	latencies, errors = [], []
+
+	start_time = time.perf_counter()
+	await asyncio.gather(*[
+		_client(host, port, requests[idx::num_clients], latencies, errors) for idx in range(num_clients)])
+	elapsed_time = time.perf_counter() - start_time
+
+	return {
+		'requests': len(latencies),
+		'errors': len(errors),
+		'p50_latency': float(np.percentile(latencies, 50)),
+		'p99_latency': float(np.percentile(latencies, 99)),
+		'throughput': len(latencies) / elapsed_time,
+	}
+
+
+async def _serve_and_generate_load(detector_dir_path: str, server_kwargs: dict, load_kwargs: dict):
+	"""Starts a ScoringServer of a saved detector (on a free local port), and generates load against it."""
+
+	from AnomalousCommunityDetection.AnomalousCommunityDetector import AnomalousCommunityDetector
+	from AnomalousCommunityDetection.ScoringServer import ScoringServer
+
+	server = ScoringServer(AnomalousCommunityDetector.load(detector_dir_path), port=0, **server_kwargs)
+	await server.start()
+	try:
+		return await generate_load(host='127.0.0.1', port=server.port, **load_kwargs)
+	finally:
+		await server.stop()
+
+
+def print_load_report(report: dict):
+	print(
+		f'{report["requests"]} requests ({report["errors"]} errors)\n'
+		f'p50 latency: {report["p50_latency"] * 1000:.1f} ms\n'
+		f'p99 latency: {report["p99_latency"] * 1000:.1f} ms\n'
+		f'throughput: {report["throughput"]:.1f} requests/s')
+
+
+if __name__ == '__main__':
+	# run as a script (python Evaluation/ScoringLoadGenerator.py), import the package from the parent directory
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+	parser = argparse.ArgumentParser(description='Generates scoring load against a local ScoringServer.')
+	parser.add_argument('partitions_map_path', help='JSON partition map to sample the requests\' communities from.')
+	parser.add_argument('--detector-dir', default=None, help='Serve this saved detector in-process (instead of --port).')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--clients', type=int, default=8)
+	parser.add_argument('--requests', type=int, default=50, help='Requests per client.')
+	parser.add_argument('--communities', type=int, default=5, help='Communities per request.')
+	parser.add_argument('--max-batch-size', type=int, default=32)
+	parser.add_argument('--max-batch-delay', type=float, default=0.01)
+	args = parser.parse_args()
+
+	with open(args.partitions_map_path, 'r') as file:
+		partitions_map = json.load(file)
+
+	load_kwargs = {
+		'partitions_map': partitions_map,
+		'num_clients': args.clients,
+		'requests_per_client': args.requests,
+		'communities_per_request': args.communities}
+
+	if args.detector_dir is not None:
+		server_kwargs = {'max_batch_size': args.max_batch_size, 'max_batch_delay': args.max_batch_delay}
+		report = asyncio.run(_serve_and_generate_load(args.detector_dir, server_kwargs, load_kwargs))
+	else:
+		report = asyncio.run(generate_load(host=args.host, port=args.port, **load_kwargs))
+
+	print_load_report(report)
@@ -0,0 +1,111 @@
+__author__ = 'Shay Lapid'
+__email__ = 'lapidshay@gmail.com'
+
+##################################
+# Imports
+##################################
+
+import os
+import sys
+import json
+import argparse
+from os import listdir
+from os.path import join
+import pandas as pd
+
+# default fractions of test communities to shortlist
+_FRACTIONS = [0.05, 0.1, 0.2, 0.3, 0.5]
+_SIZE_GROUPS = ['min', 'quantile10', 'quartile1', 'median', 'random']
+
+
+##################################
+# Screening Recall
+##################################
+
+def screening_recall(
+		train_partitions_map: dict, test_partitions_map: dict, anom_comm_names: list, fractions: list = None):
+	"""
+	Returns the recall of the anomalous communities kept by the detector's screening stage (see CommunityScreener),
+	as a DataFrame with a row per shortlisted fraction - the number of communities, shortlisted communities and
+	anomalous communities, and the fraction of anomalous communities shortlisted ('recall').
+	"""
+
+	from AnomalousCommunityDetection.CommunityScreener import CommunityScreener
+
+	fractions = fractions if fractions is not None else _FRACTIONS
+	screener = CommunityScreener(train_partitions_map)
+	anom_comm_names = set(anom_comm_names)
+
+	rows = []
+	for fraction in fractions:
+		shortlist = screener.shortlist(test_partitions_map, fraction)
+		rows.append({
+			'fraction': fraction,
+			'communities': len(test_partitions_map),
+			'shortlisted': len(shortlist),
+			'anomalous': len(anom_comm_names),
+			'recall': len(anom_comm_names.intersection(shortlist)) / len(anom_comm_names)})
+
+	return pd.DataFrame(rows)
+
+
+def experiment_screening_recall(
+		experiment_main_dir_path: str, size_groups: list = None, num_anom_comms: int = 10, fractions: list = None,
+		max_experiments: int = 10):
+	"""
+	Returns the screening recall (see screening_recall) of each experiment of an experiment directory, as a DataFrame
+	with a row per size group, experiment and fraction.
+
+	Train and test partitions maps are read as in Experiment - each test map's anomalous communities are its last
+	num_anom_comms communities (see AnomalyInfuser).
+	"""
+
+	size_groups = size_groups if size_groups is not None else _SIZE_GROUPS
+	recall_dfs = []
+
+	for size_group in size_groups:
+		size_group_dir_path = join(experiment_main_dir_path, 'Data', 'PartitionMaps', size_group)
+		file_names = listdir(size_group_dir_path)
+		train_file_paths = [join(size_group_dir_path, fn) for fn in file_names if 'train' in fn]
+		test_file_paths = [join(size_group_dir_path, fn) for fn in file_names if 'test' in fn]
+
+		for idx, (train_file_path, test_file_path) in enumerate(zip(train_file_paths, test_file_paths)):
+			if idx == max_experiments:
+				break
+
+			with open(train_file_path, 'r') as file:
+				train_partitions_map = json.load(file)
+			with open(test_file_path, 'r') as file:
+				test_partitions_map = json.load(file)
+
+			anom_comm_names = list(test_partitions_map.keys())[-num_anom_comms:]
+			recall_df = screening_recall(train_partitions_map, test_partitions_map, anom_comm_names, fractions)
+			recall_dfs.append(recall_df.assign(size_group=size_group, experiment=idx))
+
+	return pd.concat(recall_dfs, ignore_index=True)
+
+
+def summarize_screening_recall(recall_df: pd.DataFrame):
+	"""Returns the mean and minimal recall of each size group and fraction."""
+
+	return recall_df.groupby(['size_group', 'fraction'], sort=False)['recall'].agg(['mean', 'min'])
+
+
+if __name__ == '__main__':
+	# run as a script (python Evaluation/ScreeningRecallEvaluator.py), import the package from the parent directory
+	sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+	parser = argparse.ArgumentParser(
+		description='Reports the recall of anomalous communities kept by the detector\'s screening stage.')
+	parser.add_argument('experiment_dirs', nargs='+', help='Experiment directories (each holding Data/PartitionMaps).')
+	parser.add_argument('--size-groups', nargs='+', default=None)
+	parser.add_argument('--fractions', nargs='+', type=float, default=None)
+	parser.add_argument('--num-anom-comms', type=int, default=10)
+	parser.add_argument('--max-experiments', type=int, default=10)
+	args = parser.parse_args()
+
+	for experiment_dir in args.experiment_dirs:
+		print(f'\n{experiment_dir}')
+		print(summarize_screening_recall(experiment_screening_recall(
+			experiment_dir, size_groups=args.size_groups, num_anom_comms=args.num_anom_comms,
+			fractions=args.fractions, max_experiments=args.max_experiments)))